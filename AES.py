@@ -1,16 +1,120 @@
+import os
+import threading
 from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
-from Crypto.Random import get_random_bytes
-
-def encrypt_message(message, key):
-    iv = get_random_bytes(16)  # Generate a random IV
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    padded_data = pad(message.encode(), AES.block_size)
-    return iv + cipher.encrypt(padded_data)  # Prepend IV to the ciphertext
-
-def decrypt_message(ciphertext, key):
-    iv = ciphertext[:16]  # Extract the IV from the beginning
-    ciphertext = ciphertext[16:]  # Extract the actual ciphertext
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    padded_data = cipher.decrypt(ciphertext)
-    return unpad(padded_data, AES.block_size).decode()
\ No newline at end of file
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # Fall back to pycryptodome, which sets up a new GCM context per message
+    AESGCM = None
+
+# Each side of a connection seals with its own nonce prefix, so the two directions never share a nonce
+SERVER = 0
+CLIENT = 1
+
+COUNTER_SIZE = 8
+NONCE_SIZE = 12
+TAG_SIZE = 16
+MAX_COUNTER = 2**64 - 1
+
+class SessionCipher:
+    """AES-GCM bound to one shared key, with counter nonces for one side of a session.
+
+    A sealed message is the 8-byte counter followed by the ciphertext and the 16-byte
+    tag. The nonce is the sender's 4-byte role followed by the counter, so no RNG call
+    or padding is needed. open() only accepts counters above the last one it opened,
+    which rejects replayed and reordered messages but tolerates dropped ones.
+    """
+
+    def __init__(self, key, role):
+        self.key = bytes(key)
+        self.send_prefix = role.to_bytes(4, "big")
+        self.receive_prefix = (1 - role).to_bytes(4, "big")
+        self.aead = AESGCM(self.key) if AESGCM is not None else None  # Key schedule and GHASH tables built once
+        self.lock = threading.Lock()
+        self.send_counter = 0
+        self.receive_counter = -1
+
+    # Reserve count consecutive counters; several threads may seal for the same session
+    def _reserve(self, count):
+        with self.lock:
+            first = self.send_counter
+            if first + count - 1 > MAX_COUNTER:
+                raise OverflowError("Session nonce counter exhausted")
+            self.send_counter += count
+        return first
+
+    def _seal(self, counter, data, associated_data):
+        counter_bytes = counter.to_bytes(COUNTER_SIZE, "big")
+        nonce = self.send_prefix + counter_bytes
+        if self.aead is not None:
+            return counter_bytes + self.aead.encrypt(nonce, data, associated_data)
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(associated_data)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return counter_bytes + ciphertext + tag
+
+    def seal(self, data, associated_data=b""):
+        """Encrypts and authenticates bytes or a memoryview."""
+        return self._seal(self._reserve(1), data, associated_data)
+
+    def seal_many(self, messages, associated_data=b""):
+        """Seals a batch of messages with one counter reservation; returns them in order.
+
+        associated_data is either bytes for every message or a list with one entry per message.
+        """
+        if isinstance(associated_data, (bytes, bytearray, memoryview)):
+            associated_data = [associated_data] * len(messages)
+        first = self._reserve(len(messages))
+        return [self._seal(first + i, data, ad) for i, (data, ad) in enumerate(zip(messages, associated_data))]
+
+    def open(self, sealed, associated_data=b""):
+        """Verifies and decrypts a sealed message from the other side.
+
+        Raises:
+            ValueError: If the message was tampered with, replayed or reordered.
+        """
+        sealed = memoryview(sealed)
+        if len(sealed) < COUNTER_SIZE + TAG_SIZE:
+            raise ValueError("Sealed message is too short")
+        counter = int.from_bytes(sealed[:COUNTER_SIZE], "big")
+        if counter <= self.receive_counter:
+            raise ValueError("Replayed or reordered message")
+        nonce = self.receive_prefix + bytes(sealed[:COUNTER_SIZE])
+        if self.aead is not None:
+            try:
+                data = self.aead.decrypt(nonce, sealed[COUNTER_SIZE:], associated_data)
+            except InvalidTag:
+                raise ValueError("Message authentication failed") from None
+        else:
+            cipher = AES.new(self.key, AES.MODE_GCM, nonce=nonce)
+            cipher.update(associated_data)
+            data = cipher.decrypt_and_verify(sealed[COUNTER_SIZE:-TAG_SIZE], sealed[-TAG_SIZE:])
+        self.receive_counter = counter
+        return data
+
+# One-off sealing under a long-lived key, e.g. resumption tickets, where no counter can be kept in step
+def seal_random_nonce(key, data):
+    """Seals data as a random 12-byte nonce, the ciphertext and the tag."""
+    nonce = os.urandom(NONCE_SIZE)
+    if AESGCM is not None:
+        return nonce + AESGCM(key).encrypt(nonce, data, None)
+    ciphertext, tag = AES.new(key, AES.MODE_GCM, nonce=nonce).encrypt_and_digest(data)
+    return nonce + ciphertext + tag
+
+def open_random_nonce(key, sealed):
+    """Opens the output of seal_random_nonce.
+
+    Raises:
+        ValueError: If the message is too short or was tampered with.
+    """
+    if len(sealed) < NONCE_SIZE + TAG_SIZE:
+        raise ValueError("Sealed message is too short")
+    nonce = bytes(sealed[:NONCE_SIZE])
+    if AESGCM is not None:
+        try:
+            return AESGCM(key).decrypt(nonce, bytes(sealed[NONCE_SIZE:]), None)
+        except InvalidTag:
+            raise ValueError("Message authentication failed") from None
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    return cipher.decrypt_and_verify(sealed[NONCE_SIZE:-TAG_SIZE], sealed[-TAG_SIZE:])
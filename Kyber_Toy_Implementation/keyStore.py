@@ -0,0 +1,97 @@
+import os
+import struct
+import sys
+from array import array
+from .kyberKEM import prepareKey
+
+# magic, format version, k, n, q, public key length, secret key length
+_HEADER = struct.Struct("<8sBHHHII")
+_MAGIC = b"KYBERKEY"
+_VERSION = 1
+
+def _flatten(values):
+    """Flattens nested coefficient lists, or a NumPy array, into one list."""
+    if hasattr(values, "tolist"):  # NumPy backend
+        values = values.tolist()
+    if values and isinstance(values[0], list):
+        return [c for item in values for c in _flatten(item)]
+    return list(values)
+
+def saveKeyPair(path, params, pk, sk, key=None):
+    """Writes a Kyber-KEM key pair and its precomputed expansion to a file.
+
+    Besides the serialized keys the file holds A and the NTT forms of A, t and
+    s as 16-bit little-endian coefficients, so loadKeyPair neither expands A
+    nor runs any NTT. The file is created with owner-only permissions and
+    replaced atomically.
+
+    Args:
+        path (str): The file to write.
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
+        pk (bytes): The public key.
+        sk (bytes): The matching secret key.
+        key (PreparedKey, optional): The prepared key pair, if already at hand.
+    """
+    if key is None:
+        key = prepareKey(params, pk, sk)
+    k = params["k"]
+    A = key.publicKey.A
+    coefficients = array("H", [c for i in range(k) for p in A[i] for c in p.coefficients])
+    coefficients.extend(_flatten(A.nttForm()))
+    coefficients.extend(_flatten(key.publicKey.t.nttForm()))
+    coefficients.extend(_flatten(key.privateKey.s.nttForm()))
+    if sys.byteorder == "big":
+        coefficients.byteswap()
+
+    header = _HEADER.pack(_MAGIC, _VERSION, k, params["n"], params["q"], len(pk), len(sk))
+    tmpPath = path + ".tmp"
+    fd = os.open(tmpPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(header + pk + sk + coefficients.tobytes())
+    os.replace(tmpPath, path)
+
+def loadKeyPair(path, params):
+    """Reads a key pair written by saveKeyPair and prepares it without recomputation.
+
+    Args:
+        path (str): The file to read.
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
+
+    Returns:
+        tuple: (pk, sk, PreparedKey).
+
+    Raises:
+        ValueError: If the file is not a key store for these parameters.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    k = params["k"]
+    n = params["n"]
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{path} is not a Kyber key store")
+    magic, version, fileK, fileN, fileQ, pkLen, skLen = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"{path} is not a Kyber key store")
+    if (fileK, fileN, fileQ) != (k, n, params["q"]):
+        raise ValueError(f"{path} holds a key for k={fileK}, n={fileN}, q={fileQ}")
+    matrixLen = k * k * n
+    vectorLen = k * n
+    if len(data) != _HEADER.size + pkLen + skLen + 2 * (2 * matrixLen + 2 * vectorLen):
+        raise ValueError(f"{path} is truncated or corrupt")
+
+    offset = _HEADER.size
+    pk = data[offset:offset + pkLen]
+    sk = data[offset + pkLen:offset + pkLen + skLen]
+    coefficients = array("H")
+    coefficients.frombytes(data[offset + pkLen + skLen:])
+    if sys.byteorder == "big":
+        coefficients.byteswap()
+
+    precomputed = {
+        "A": coefficients[:matrixLen],
+        "AHat": coefficients[matrixLen:2 * matrixLen],
+        "tHat": coefficients[2 * matrixLen:2 * matrixLen + vectorLen],
+        "sHat": coefficients[2 * matrixLen + vectorLen:],
+    }
+    return pk, sk, prepareKey(params, pk, sk, precomputed)
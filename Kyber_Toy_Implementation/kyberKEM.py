@@ -1,7 +1,81 @@
 import os
-from .kyberPKE import keygenPKE, encryptPKE, decryptPKE
+from .kyberPKE import keygenPKEBatch, encryptPKEBatch, decryptPKEBatch, PreparedPublicKey, PreparedPrivateKey
 from .utils import bytesToBitList, bitListToBytes
 from .optimization import H, G, KDF
+from .profiling import stage
+
+class PreparedKey:
+    """A Kyber-KEM key pair (or public key alone) parsed once for repeated use.
+
+    Holds the prepared PKE keys together with H(pk) and, for a key pair, z.
+    """
+
+    def __init__(self, params, pk, sk=None, precomputed=None):
+        self.params = params
+        self.pk = bytes(pk)
+        self.hPk = H(self.pk)
+        self.publicKey = PreparedPublicKey(params, self.pk, precomputed)
+        self.privateKey = None
+        self.z = None
+        if sk is not None:
+            sk0, skPk, h, z = splitSecretKey(sk, params)
+            if skPk != self.pk:
+                raise ValueError("Secret key does not match the public key")
+            self.privateKey = PreparedPrivateKey(params, sk0, precomputed)
+            self.hPk = h
+            self.z = z
+
+def prepareKey(params, pk, sk=None, precomputed=None):
+    """Prepares a public key, or a key pair, for repeated encapsulation or decapsulation.
+
+    Args:
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
+        pk (bytes): The public key.
+        sk (bytes, optional): The matching secret key. Required for decapsulation.
+        precomputed (dict, optional): Flattened A, AHat, tHat and sHat coefficients of
+            this key pair, as stored by keyStore, so nothing is expanded or transformed.
+
+    Returns:
+        PreparedKey: The prepared key.
+    """
+    return PreparedKey(params, pk, sk, precomputed)
+
+def splitSecretKey(sk, params):
+    """Splits a Kyber-KEM secret key into its components.
+
+    Args:
+        sk (bytes): The secret key.
+        params (dict): Dictionary containing parameter k.
+
+    Returns:
+        tuple: (sk0, pk, h, z).
+    """
+    k = params["k"]
+
+    sk0Len = 12 * k * 256 // 8
+    pkLen = sk0Len + 32
+    hLen = 32
+    zLen = 32
+
+    # Extract sk0 from sk
+    sk0 = sk[:sk0Len]
+
+    # Extract pk from sk
+    pkStart = sk0Len
+    pkEnd = pkStart + pkLen
+    pk = sk[pkStart:pkEnd]
+
+    # Extract h from sk
+    hStart = pkEnd
+    hEnd = hStart + hLen
+    h = sk[hStart:hEnd]
+
+    # Extract z from sk
+    zStart = hEnd
+    zEnd = zStart + zLen
+    z = sk[zStart:zEnd]
+
+    return sk0, pk, h, z
 
 def keygenKEM(params):
     """Generates a key pair for Kyber-KEM.
@@ -12,104 +86,162 @@ def keygenKEM(params):
     Returns:
         tuple: A tuple containing the public key (pk) and the secret key (sk).
     """
-    # Select z at random in {0,1}^256
-    z = os.urandom(32)
+    return keygenKEMBatch(params, 1)[0]
 
-    # Use the Kyber-PKE key generation algorithm to select a Kyber-PKE encryption key (pk) and decryption key (sk0)
-    pk, sk0 = keygenPKE(params)
+def keygenKEMBatch(params, count):
+    """Generates several key pairs for Kyber-KEM, sharing the polynomial arithmetic.
 
-    # Compute H(pk)
-    hPk = H(pk)
+    Args:
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2.
+        count (int): The number of key pairs.
+
+    Returns:
+        list: One (pk, sk) tuple per key pair.
+    """
+    zs, seeds = [], []
+    for _ in range(count):
+        # Select z at random in {0,1}^256
+        zs.append(os.urandom(32))
+        # Select the Kyber-PKE seed d at random in {0,1}^256
+        seeds.append(os.urandom(32))
 
-    # The secret key is sk = (sk0 || pk || H(pk) || z)
-    sk = sk0 + pk + hPk + z
+    # Use the Kyber-PKE key generation algorithm to select Kyber-PKE encryption keys (pk) and decryption keys (sk0)
+    keyPairs = []
+    for (pk, sk0), z in zip(keygenPKEBatch(params, seeds), zs):
+        # Compute H(pk)
+        hPk = H(pk)
 
-    # print("pk:", len(pk))
-    # print("sk0:", len(sk0))
+        # The secret key is sk = (sk0 || pk || H(pk) || z)
+        sk = sk0 + pk + hPk + z
 
-    return pk, sk
+        keyPairs.append((pk, sk))
+    return keyPairs
 
 def encapsulate(pk, params):
     """Encapsulates a shared secret using the public key.
 
     Args:
-        pk (bytes): The public key.
+        pk (bytes or PreparedKey): The public key, or a prepared key.
         params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
 
     Returns:
         tuple: The ciphertext and the shared secret.
     """
-    # Select m at random in {0,1}^256
-    m = os.urandom(32)
-    m = H(m)
+    return encapsulateBatch([pk], params)[0]
 
-    # Compute (K, r) = G(m || H(pk))
-    hPk = H(pk)
-    gInput = m + hPk
-    kHat, r = G(gInput)[:32], G(gInput)[32:]
+def encapsulateBatch(pks, params):
+    """Encapsulates one shared secret per public key, sharing the polynomial arithmetic.
 
-    mBitList = bytesToBitList(m, params["n"])
+    Equal public keys are only hashed and prepared once.
 
-    # Encrypt m using Kyber-PKE
-    c = encryptPKE(params, pk, mBitList, r)
+    Args:
+        pks (list): The public keys, as bytes or PreparedKey.
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
 
-    # Hash the ciphertext with H
-    serializedCiphertext = c
-    hashedCiphertext = H(serializedCiphertext)
+    Returns:
+        list: One (ciphertext, shared secret) tuple per public key.
+    """
+    hashes = {}
+    publicKeys, kHats, rs, mBitLists = [], [], [], []
+    for pk in pks:
+        if isinstance(pk, PreparedKey):
+            hPk = pk.hPk
+            publicKeys.append(pk.publicKey)
+        else:
+            if pk not in hashes:
+                hashes[pk] = H(pk)
+            hPk = hashes[pk]
+            publicKeys.append(pk)
+
+        # Select m at random in {0,1}^256
+        m = os.urandom(32)
+        m = H(m)
+
+        # Compute (K, r) = G(m || H(pk))
+        gOutput = G(m + hPk)
+        kHats.append(gOutput[:32])
+        rs.append(gOutput[32:])
+
+        mBitLists.append(bytesToBitList(m, params["n"]))
+
+    # Encrypt every m using Kyber-PKE
+    ciphertexts = encryptPKEBatch(params, publicKeys, mBitLists, rs)
+
+    results = []
+    for c, kHat in zip(ciphertexts, kHats):
+        # Hash the ciphertext with H
+        hashedCiphertext = H(c)
+
+        # Compute the shared secret ss = KDF(K || H(c))
+        results.append((c, KDF(kHat + hashedCiphertext, 32)))
+    return results
+
+def ciphertextSize(params):
+    """Returns the length of a Kyber-KEM ciphertext.
 
-    # Compute the shared secret ss = KDF(K || H(c))
-    K = KDF(kHat + hashedCiphertext, 32)
+    Args:
+        params (dict): Dictionary containing parameters k, n, du, dv.
 
-    return serializedCiphertext, K
+    Returns:
+        int: The ciphertext length in bytes.
+    """
+    return (params["k"] * params["du"] + params["dv"]) * params["n"] // 8
 
 def decapsulate(c, sk, params):
     """Decapsulates a shared secret using the secret key.
 
     Args:
         c (bytes): The ciphertext.
-        sk (bytes): The secret key.
+        sk (bytes or PreparedKey): The secret key, or a prepared key pair.
         params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
 
     Returns:
         bytes: The shared secret.
     """
-    k = params["k"]
+    return decapsulateBatch([c], sk, params)[0]
 
-    sk0Len = 12 * k * 256 // 8
-    pkLen = sk0Len + 32
-    hLen = 32
-    zLen = 32
-
-    # Extract sk0 from sk
-    sk0 = sk[:sk0Len]
+def decapsulateBatch(ciphertexts, sk, params):
+    """Decapsulates several ciphertexts under one secret key, sharing the polynomial arithmetic.
 
-    # Extract pk from sk
-    pkStart = sk0Len
-    pkEnd = pkStart + pkLen
-    pk = sk[pkStart:pkEnd]
-
-    # Extract h from sk
-    hStart = pkEnd
-    hEnd = hStart + hLen
-    h = sk[hStart:hEnd]
+    Args:
+        ciphertexts (list): The ciphertexts.
+        sk (bytes or PreparedKey): The secret key, or a prepared key pair.
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
 
-    # Extract z from sk
-    zStart = hEnd
-    zEnd = zStart + zLen
-    z = sk[zStart:zEnd]
+    Returns:
+        list: The shared secrets, in the order of the ciphertexts.
+    """
+    if isinstance(sk, PreparedKey):
+        if sk.privateKey is None:
+            raise ValueError("Prepared key has no secret key")
+        sk0, pk, h, z = sk.privateKey, sk.publicKey, sk.hPk, sk.z
+    else:
+        sk0, pk, h, z = splitSecretKey(sk, params)
+        sk0 = PreparedPrivateKey(params, sk0)
+        pk = PreparedPublicKey(params, pk)
 
-    # Decrypt the ciphertext using Kyber-PKE
-    mPrime = decryptPKE(params, sk0, c)
+    # Decrypt the ciphertexts using Kyber-PKE
+    with stage("decapsulate.decrypt"):
+        mPrimes = decryptPKEBatch(params, sk0, ciphertexts)
 
     # Compute (K', r') = G(m' || h)
-    gInput = bitListToBytes(mPrime) + h
-    kPrime, rPrime = G(gInput)[:32], G(gInput)[32:]
-
-    # Encrypt m' using Kyber-PKE
-    cPrime = encryptPKE(params, pk, mPrime, rPrime)
-
-    # Compare c and c'
-    if c == cPrime:
-        return KDF(kPrime + H(c), 32)
-    else:
-        return KDF(z + H(c), 32)
\ No newline at end of file
+    kPrimes, rPrimes = [], []
+    with stage("decapsulate.hash"):
+        for mPrime in mPrimes:
+            gOutput = G(bitListToBytes(mPrime) + h)
+            kPrimes.append(gOutput[:32])
+            rPrimes.append(gOutput[32:])
+
+    # Encrypt every m' using Kyber-PKE
+    with stage("decapsulate.reencrypt"):
+        cPrimes = encryptPKEBatch(params, [pk] * len(mPrimes), mPrimes, rPrimes)
+
+    sharedSecrets = []
+    with stage("decapsulate.derive"):
+        for c, cPrime, kPrime in zip(ciphertexts, cPrimes, kPrimes):
+            # Compare c and c'
+            if c == cPrime:
+                sharedSecrets.append(KDF(kPrime + H(c), 32))
+            else:
+                sharedSecrets.append(KDF(z + H(c), 32))
+    return sharedSecrets
@@ -1,7 +1,88 @@
 import os
-from .poly import Polynomial, PolynomialVector
+from . import poly
+from .poly import PolynomialVector
 from .utils import preprocessMessage, postprocessMessage, encode, decode
-from .optimization import roundUpTies, roundQ, randomPolyVector, randomPoly, expand, compress, decompress, G
+from .optimization import roundUpTiesFraction, roundQPoly, randomPolyBatch, expand, compressPoly, decompressPoly, G
+from .profiling import stage
+
+try:
+    from . import polyArray
+except ImportError:  # NumPy is not installed
+    polyArray = None
+
+_BACKENDS = {"python": poly, "numpy": polyArray}
+_backend = poly
+
+def setBackend(name):
+    """Selects the polynomial arithmetic backend used by Kyber-PKE.
+
+    Args:
+        name (str): Either "python" (list-based) or "numpy" (array-based).
+    """
+    global _backend
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    if _BACKENDS[name] is None:
+        raise ValueError(f"Backend {name} is not available")
+    _backend = _BACKENDS[name]
+
+def getBackend():
+    """Returns the name of the polynomial arithmetic backend in use."""
+    return next(name for name, module in _BACKENDS.items() if module is _backend)
+
+class PreparedPublicKey:
+    """A deserialized public key with A expanded and both A and t in NTT form.
+
+    The backend selected when the key is prepared is used for every operation with it.
+    If precomputed values are given (see keyStore), they are used instead of expanding
+    A and transforming A and t, and must belong to this public key.
+    """
+
+    def __init__(self, params, serializedPublicKey, precomputed=None):
+        k = params["k"]
+        n = params["n"]
+        q = params["q"]
+
+        self.backend = _backend
+        self.serialized = bytes(serializedPublicKey)
+
+        # Deserialize the public key
+        self.rho = self.serialized[:32]
+        self.t = self.backend.PolynomialVector(decode(self.serialized[32:], q, n, 12, k).polynomials)
+
+        if precomputed is not None:
+            A = precomputed["A"]
+            Polynomial = self.backend.Polynomial
+            self.A = self.backend.PolynomialMatrix([[Polynomial(A[(i * k + j) * n:(i * k + j + 1) * n], q)
+                                                     for j in range(k)] for i in range(k)])
+            self.A.setNttForm(precomputed["AHat"])
+            self.t.setNttForm(precomputed["tHat"])
+            return
+
+        # Compute A from rho
+        with stage("publicKey.expand"):
+            self.A = self.backend.PolynomialMatrix(expand(self.rho, k, q, n))
+
+        # Transform A and t once so encryption only transforms r
+        with stage("publicKey.ntt"):
+            self.A.nttForm()
+            self.t.nttForm()
+
+class PreparedPrivateKey:
+    """A deserialized private key with s in NTT form.
+
+    The backend selected when the key is prepared is used for every operation with it.
+    If precomputed values are given (see keyStore), s is not transformed again.
+    """
+
+    def __init__(self, params, serializedPrivateKey, precomputed=None):
+        self.backend = _backend
+        self.s = self.backend.PolynomialVector(decode(serializedPrivateKey, params["q"], params["n"], 12, params["k"]).polynomials)
+        if precomputed is not None:
+            self.s.setNttForm(precomputed["sHat"])
+        else:
+            with stage("privateKey.ntt"):
+                self.s.nttForm()
 
 def keygenPKE(params):
     """Generates a public and private key pair.
@@ -12,6 +93,21 @@ def keygenPKE(params):
     Returns:
         tuple: A tuple containing the serialized public key and the serialized private key.
     """
+    # Generate random 256-bit seed d
+    d = os.urandom(32)
+
+    return keygenPKEBatch(params, [d])[0]
+
+def keygenPKEBatch(params, seeds):
+    """Generates one key pair per seed, sharing the polynomial arithmetic.
+
+    Args:
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2.
+        seeds (list): The 256-bit seeds d, one per key pair.
+
+    Returns:
+        list: One (serialized public key, serialized private key) tuple per seed.
+    """
     k = params["k"]
     n = params["n"]
     q = params["q"]
@@ -19,38 +115,42 @@ def keygenPKE(params):
     eta2 = params["eta2"]
 
     N = 0
+    backend = _backend
 
-    # Generate random 256-bit seed d
-    d = os.urandom(32)
-
-    # Compute (rho, sigma) = G(d)
-    gOutput = G(d)
-    rho, sigma = gOutput[:32], gOutput[32:]
-
-    # Generate matrix A ∈ Rq^k×k
-    A = expand(rho, k, q, n)
+    rhos, matrices, secrets, errors = [], [], [], []
+    for d in seeds:
+        # Compute (rho, sigma) = G(d)
+        gOutput = G(d)
+        rho, sigma = gOutput[:32], gOutput[32:]
+        rhos.append(rho)
 
-    # Sample s ∈ Rq^k from Bη1
-    s = randomPolyVector(k, N, q, eta1, sigma)
+        # Generate matrix A ∈ Rq^k×k
+        with stage("keygen.expand"):
+            matrices.append(backend.PolynomialMatrix(expand(rho, k, q, n)))
 
-    # Sample e ∈ Rq^k from Bη2
-    e = randomPolyVector(k, N, q, eta2, sigma)
+        # Sample s ∈ Rq^k from Bη1 and e ∈ Rq^k from Bη2
+        with stage("keygen.sample"):
+            noise = randomPolyBatch(q, sigma, [(eta1, N + i) for i in range(k)] + [(eta2, N + i) for i in range(k)])
+            secrets.append(backend.PolynomialVector(noise[:k]))
+            errors.append(PolynomialVector(noise[k:]))
 
     # Compute t = A * s + e
-    As = PolynomialVector([Polynomial([0] * n, q) for _ in range(k)])
-    for i in range(k):
-        for j in range(k):
-            As.polynomials[i] = As.polynomials[i] + A[i][j].mulRq(s.polynomials[j], n)
+    with stage("keygen.multiply"):
+        products = backend.matrixVectorMulRqBatch(matrices, secrets)
 
-    t = PolynomialVector([As.polynomials[i] + e.polynomials[i] for i in range(k)])
+    keyPairs = []
+    for rho, As, e, s in zip(rhos, products, errors, secrets):
+        t = As + e
 
-    # Serialize the public key
-    serializedPublicKey = rho + encode(t, n, 12)
+        with stage("keygen.encode"):
+            # Serialize the public key
+            serializedPublicKey = rho + encode(t, n, 12)
 
-    # Serialize the private key
-    serializedPrivateKey = encode(s, n, 12)
+            # Serialize the private key
+            serializedPrivateKey = encode(s, n, 12)
 
-    return serializedPublicKey, serializedPrivateKey
+        keyPairs.append((serializedPublicKey, serializedPrivateKey))
+    return keyPairs
 
 def encrypt(params, publicKey, message, r=None):
     if r is None:
@@ -62,13 +162,29 @@ def encryptPKE(params, serializedPublicKey, message, r=None):
 
     Args:
         params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
-        serializedPublicKey (bytes): The serialized public key.
+        serializedPublicKey (bytes or PreparedPublicKey): The serialized or prepared public key.
         message (list): The preprocessed message to be encrypted.
         r (PolynomialVector, optional): Random polynomial vector. If None, a new one is generated.
 
     Returns:
         bytes: The serialized ciphertext.
     """
+    return encryptPKEBatch(params, [serializedPublicKey], [message], [r])[0]
+
+def encryptPKEBatch(params, serializedPublicKeys, messages, rs):
+    """Encrypts several preprocessed messages, sharing the polynomial arithmetic.
+
+    Equal public keys are only prepared once.
+
+    Args:
+        params (dict): Dictionary containing parameters k, n, q, eta1, eta2, du, dv.
+        serializedPublicKeys (list): One serialized or prepared public key per message.
+        messages (list): The preprocessed messages to be encrypted.
+        rs (list): One random seed (or None) per message.
+
+    Returns:
+        list: The serialized ciphertexts.
+    """
     k = params["k"]
     n = params["n"]
     q = params["q"]
@@ -79,52 +195,62 @@ def encryptPKE(params, serializedPublicKey, message, r=None):
 
     N = 0
 
-    # Deserialize the public key
-    rho = serializedPublicKey[:32]
-    serializedT = serializedPublicKey[32:]
-    t = decode(serializedT, q, n, 12, k)
-
-    # Compute A from rho
-    A = expand(rho, k, q, n)
+    # Deserialize the public keys and compute A from rho
+    prepared = {}
+    publicKeys = []
+    for serializedPublicKey in serializedPublicKeys:
+        if isinstance(serializedPublicKey, PreparedPublicKey):
+            publicKeys.append(serializedPublicKey)
+        else:
+            if serializedPublicKey not in prepared:
+                prepared[serializedPublicKey] = PreparedPublicKey(params, serializedPublicKey)
+            publicKeys.append(prepared[serializedPublicKey])
+    backend = publicKeys[0].backend
 
     # Select r ∈_CBD (S_eta1)^k, e_1 ∈_CBD (S_eta2)^k, e_2 ∈_CBD S_eta2
-    if r is None:
-        r = os.urandom(32)
-    else:
-        r = bytes(r)
-
-    rPoly = randomPolyVector(k, N, q, eta1, r)
-    e1 = randomPolyVector(k, N, q, eta2, r)
-    e2 = randomPoly(q, eta2, r, N)
-
-    # Compute u = A^T*r + e_1
-    u = PolynomialVector([Polynomial([0] * n, q) for _ in range(k)])
-    for i in range(k):
-        for j in range(k):
-            u.polynomials[i] = u.polynomials[i] + A[j][i].mulRq(rPoly.polynomials[j], n)
-        u.polynomials[i] = u.polynomials[i] + e1.polynomials[i]
-
-    # Compute v = t^T*r + e_2 + ⌈q/2⌋*m
-    v = Polynomial([0] * n, q)
-    for i in range(k):
-        v = v + t.polynomials[i].mulRq(rPoly.polynomials[i], n)
-    v = v + e2
-
-    # Add ⌈q/2⌋*m to v (the same as decompress(m,1))
-    qHalf = roundUpTies(q / 2)
-    mPoly = Polynomial([m * qHalf for m in message], q)
-    v = v + mPoly
-
-    # Compute c1 = compressPoly(u, du) and c2 = compressPoly(v, dv)
-    c1 = PolynomialVector([Polynomial([compress(c, q, du) for c in poly.coefficients], 2**du) for poly in u.polynomials])
-    c2 = Polynomial([compress(c, q, dv) for c in v.coefficients], 2**dv)
-
-    # Serialize the ciphertext
-    serializedC1 = encode(c1, n, du)
-    serializedC2 = encode(c2, n, dv)
-    serializedCiphertext = serializedC1 + serializedC2
-
-    return serializedCiphertext
+    rPolys, e1s, e2s = [], [], []
+    with stage("encrypt.sample"):
+        for r in rs:
+            if r is None:
+                r = os.urandom(32)
+            else:
+                r = bytes(r)
+
+            noise = randomPolyBatch(q, r, [(eta1, N + i) for i in range(k)] + [(eta2, N + i) for i in range(k)] + [(eta2, N)])
+            rPolys.append(backend.PolynomialVector(noise[:k]))
+            e1s.append(PolynomialVector(noise[k:2 * k]))
+            e2s.append(noise[2 * k])
+
+    # Compute A^T*r and t^T*r for every message at once
+    with stage("encrypt.multiply"):
+        ATrs = backend.matrixVectorMulRqBatch([key.A for key in publicKeys], rPolys, transpose=True)
+        tTrs = backend.innerProductBatch([key.t for key in publicKeys], rPolys)
+
+    qHalf = roundUpTiesFraction(q, 2)
+    ciphertexts = []
+    for message, ATr, tTr, e1, e2 in zip(messages, ATrs, tTrs, e1s, e2s):
+        # Compute u = A^T*r + e_1
+        u = ATr + e1
+
+        # Compute v = t^T*r + e_2 + ⌈q/2⌋*m
+        v = tTr + e2
+
+        # Add ⌈q/2⌋*m to v (the same as decompress(m,1))
+        mPoly = backend.Polynomial([m * qHalf for m in message], q)
+        v = v + mPoly
+
+        # Compute c1 = compressPoly(u, du) and c2 = compressPoly(v, dv)
+        with stage("encrypt.compress"):
+            c1 = compressPoly(u, q, du)
+            c2 = compressPoly(v, q, dv)
+
+        # Serialize the ciphertext
+        with stage("encrypt.encode"):
+            serializedC1 = encode(c1, n, du)
+            serializedC2 = encode(c2, n, dv)
+        ciphertexts.append(serializedC1 + serializedC2)
+
+    return ciphertexts
 
 def decrypt(params, privateKey, ciphertext):
     return postprocessMessage(decryptPKE(params, privateKey, ciphertext), params["n"])
@@ -134,12 +260,25 @@ def decryptPKE(params, serializedPrivateKey, serializedCiphertext):
 
     Args:
         params (dict): Dictionary containing parameters k, n, q, du, dv.
-        serializedPrivateKey (bytes): The serialized private key.
+        serializedPrivateKey (bytes or PreparedPrivateKey): The serialized or prepared private key.
         serializedCiphertext (bytes): The serialized ciphertext.
 
     Returns:
         list: The decrypted message.
     """
+    return decryptPKEBatch(params, serializedPrivateKey, [serializedCiphertext])[0]
+
+def decryptPKEBatch(params, serializedPrivateKey, serializedCiphertexts):
+    """Decrypts several serialized ciphertexts under one private key.
+
+    Args:
+        params (dict): Dictionary containing parameters k, n, q, du, dv.
+        serializedPrivateKey (bytes or PreparedPrivateKey): The serialized or prepared private key.
+        serializedCiphertexts (list): The serialized ciphertexts.
+
+    Returns:
+        list: The decrypted messages.
+    """
     k = params["k"]
     n = params["n"]
     q = params["q"]
@@ -147,16 +286,17 @@ def decryptPKE(params, serializedPrivateKey, serializedCiphertext):
     dv = params["dv"]
 
     # Deserialize the private key
-    s = decode(serializedPrivateKey, q, n, 12, k)
+    if isinstance(serializedPrivateKey, PreparedPrivateKey):
+        privateKey = serializedPrivateKey
+    else:
+        privateKey = PreparedPrivateKey(params, serializedPrivateKey)
+    backend = privateKey.backend
+    s = privateKey.s
 
     # Calculate the sizes of c1 and c2
     c1Size = k * n * du // 8
     c2Size = n * dv // 8
 
-    # Deserialize the ciphertext
-    serializedC1 = serializedCiphertext[:c1Size]
-    serializedC2 = serializedCiphertext[c1Size:c1Size + c2Size]
-
     if k == 4:
         qC1 = 2048
         qC2 = 32
@@ -164,17 +304,21 @@ def decryptPKE(params, serializedPrivateKey, serializedCiphertext):
         qC1 = 1024
         qC2 = 16
 
-    c1 = decode(serializedC1, qC1, n, du, k)
-    c2 = decode(serializedC2, qC2, n, dv)
+    us, vs = [], []
+    with stage("decrypt.decode"):
+        for serializedCiphertext in serializedCiphertexts:
+            # Deserialize the ciphertext
+            serializedC1 = serializedCiphertext[:c1Size]
+            serializedC2 = serializedCiphertext[c1Size:c1Size + c2Size]
 
-    u = PolynomialVector([Polynomial([decompress(c, q, du) for c in poly.coefficients], q) for poly in c1.polynomials])
-    v = Polynomial([decompress(c, q, dv) for c in c2.coefficients], q)
+            c1 = decode(serializedC1, qC1, n, du, k)
+            c2 = decode(serializedC2, qC2, n, dv)
 
-    # Compute m = Round_q(v - s^T * u)
-    sU = Polynomial([0] * n, q)
-    for i in range(k):
-        sU = sU + s.polynomials[i].mulRq(u.polynomials[i], n)
-    mPoly = v - sU
-    message = [roundQ(c, q) for c in mPoly.coefficients]
+            us.append(decompressPoly(backend.PolynomialVector(c1.polynomials), q, du))
+            vs.append(decompressPoly(backend.Polynomial(c2.coefficients, qC2), q, dv))
 
-    return message
\ No newline at end of file
+    # Compute m = Round_q(v - s^T * u)
+    with stage("decrypt.multiply"):
+        sUs = backend.innerProductBatch([s] * len(us), us)
+    with stage("decrypt.round"):
+        return [roundQPoly(v - sU, q) for v, sU in zip(vs, sUs)]
@@ -0,0 +1,160 @@
+from .kyberParams import KYBER_PARAMS
+
+_TABLES = {}
+
+def bitReverse(value, bits):
+    """Reverses the lowest `bits` bits of an integer.
+
+    Args:
+        value (int): The value to be reversed.
+        bits (int): The number of bits to consider.
+
+    Returns:
+        int: The bit-reversed value.
+    """
+    result = 0
+    for _ in range(bits):
+        result = (result << 1) | (value & 1)
+        value >>= 1
+    return result
+
+def findRootOfUnity(n, q):
+    """Finds a primitive n-th root of unity modulo q.
+
+    Args:
+        n (int): The order of the root (a power of two).
+        q (int): The prime modulus.
+
+    Returns:
+        int or None: The root of unity, or None if q - 1 is not divisible by n.
+    """
+    if n < 2 or n & (n - 1) or (q - 1) % n:
+        return None
+    for g in range(2, q):
+        zeta = pow(g, (q - 1) // n, q)
+        # zeta has order exactly n iff zeta^(n/2) = -1
+        if pow(zeta, n // 2, q) == q - 1:
+            return zeta
+    return None
+
+def nttTables(n, q):
+    """Returns the precomputed NTT tables for the ring Z_q[X]/(X^n + 1).
+
+    The transform is the incomplete Kyber NTT: Rq is split into n/2 quadratic
+    factors X^2 - gamma_i, so only an n-th (not 2n-th) root of unity is needed.
+
+    Args:
+        n (int): The degree of the polynomials.
+        q (int): The modulus.
+
+    Returns:
+        tuple or None: (zetas, gammas, nInv), or None if no NTT exists for (n, q).
+    """
+    key = (n, q)
+    if key not in _TABLES:
+        zeta = findRootOfUnity(n, q)
+        if zeta is None:
+            _TABLES[key] = None
+        else:
+            half = n // 2
+            bits = half.bit_length() - 1
+            zetas = [pow(zeta, bitReverse(i, bits), q) for i in range(half)]
+            gammas = [pow(zeta, 2 * bitReverse(i, bits) + 1, q) for i in range(half)]
+            nInv = pow(half, -1, q)
+            _TABLES[key] = (zetas, gammas, nInv)
+    return _TABLES[key]
+
+def ntt(coefficients, q):
+    """Computes the forward NTT of a polynomial.
+
+    Args:
+        coefficients (list): The polynomial coefficients (length n).
+        q (int): The modulus.
+
+    Returns:
+        list: The polynomial in the NTT domain.
+    """
+    n = len(coefficients)
+    zetas = nttTables(n, q)[0]
+    f = list(coefficients)
+    k = 1
+    length = n // 2
+    while length >= 2:
+        for start in range(0, n, 2 * length):
+            z = zetas[k]
+            k += 1
+            for j in range(start, start + length):
+                t = z * f[j + length] % q
+                f[j + length] = (f[j] - t) % q
+                f[j] = (f[j] + t) % q
+        length //= 2
+    return f
+
+def invNtt(coefficients, q):
+    """Computes the inverse NTT of a polynomial in the NTT domain.
+
+    Args:
+        coefficients (list): The polynomial in the NTT domain (length n).
+        q (int): The modulus.
+
+    Returns:
+        list: The polynomial coefficients.
+    """
+    n = len(coefficients)
+    zetas, _, nInv = nttTables(n, q)
+    f = list(coefficients)
+    k = n // 2 - 1
+    length = 2
+    while length <= n // 2:
+        for start in range(0, n, 2 * length):
+            z = zetas[k]
+            k -= 1
+            for j in range(start, start + length):
+                t = f[j]
+                f[j] = (t + f[j + length]) % q
+                f[j + length] = z * (f[j + length] - t) % q
+        length *= 2
+    return [c * nInv % q for c in f]
+
+def baseMul(aHat, bHat, q):
+    """Multiplies two polynomials in the NTT domain.
+
+    Args:
+        aHat (list): The first polynomial in the NTT domain.
+        bHat (list): The second polynomial in the NTT domain.
+        q (int): The modulus.
+
+    Returns:
+        list: The product in the NTT domain.
+    """
+    gammas = nttTables(len(aHat), q)[1]
+    result = [0] * len(aHat)
+    for i, gamma in enumerate(gammas):
+        a0, a1 = aHat[2 * i], aHat[2 * i + 1]
+        b0, b1 = bHat[2 * i], bHat[2 * i + 1]
+        result[2 * i] = (a0 * b0 + a1 * b1 % q * gamma) % q
+        result[2 * i + 1] = (a0 * b1 + a1 * b0) % q
+    return result
+
+def baseMulAcc(pairs, q):
+    """Computes the sum of products of polynomial pairs in the NTT domain.
+
+    Args:
+        pairs (iterable): Pairs (aHat, bHat) of polynomials in the NTT domain.
+        q (int): The modulus.
+
+    Returns:
+        list: The accumulated product in the NTT domain.
+    """
+    result = None
+    for aHat, bHat in pairs:
+        product = baseMul(aHat, bHat, q)
+        if result is None:
+            result = product
+        else:
+            result = [(x + y) % q for x, y in zip(result, product)]
+    return result
+
+# Precompute the tables for every parameter set
+for _params in KYBER_PARAMS.values():
+    nttTables(_params["n"], _params["q"])
@@ -1,6 +1,9 @@
 import hashlib
 import math
 from .poly import Polynomial, PolynomialVector
+from .utils import bytesToBitstring
+
+_CBD_TABLES = {}
 
 def roundUpTies(x):
     """Rounds up ties (e.g., 2.5, -3.5) to the nearest integer.
@@ -15,6 +18,20 @@ def roundUpTies(x):
         return math.ceil(x)
     return round(x)
 
+def roundUpTiesFraction(numerator, denominator):
+    """Rounds numerator / denominator to the nearest integer, rounding ties up.
+
+    Integer-only counterpart of roundUpTies(numerator / denominator).
+
+    Args:
+        numerator (int): The numerator.
+        denominator (int): The denominator (positive).
+
+    Returns:
+        int: The rounded integer.
+    """
+    return (2 * numerator + denominator) // (2 * denominator)
+
 def mods(value, q):
     """Computes the symmetric modulo operation.
 
@@ -38,11 +55,26 @@ def roundQ(value, q):
         int: The rounded value (0 or 1).
     """
     symValue = mods(value, q)
-    if -q / 4 < symValue < q / 4:
+    if -q < 4 * symValue < q:
         return 0
     else:
         return 1
 
+def roundQPoly(poly, q):
+    """Applies roundQ to every coefficient of a polynomial.
+
+    Args:
+        poly (Polynomial): The polynomial, from either backend.
+        q (int): The modulus.
+
+    Returns:
+        list: The rounded coefficients (0 or 1).
+    """
+    if hasattr(poly, "array"):
+        symValues = 4 * ((poly.array + q // 2) % q - q // 2)
+        return ((symValues <= -q) | (symValues >= q)).astype(int).tolist()
+    return [roundQ(c, q) for c in poly.coefficients]
+
 def H(data):
     return hashlib.sha3_256(data).digest()
 
@@ -94,20 +126,36 @@ def cbd(inputBytes, eta):
         list: The polynomial coefficients.
     """
     assert 64 * eta == len(inputBytes)
-    
-    # Convert bytes to bits
-    bits = []
-    for byte in inputBytes:
-        bits.extend([int(bit) for bit in format(byte, '08b')])
-    
-    coefficients = [0 for _ in range(256)]
-    
-    for i in range(256):
-        a = sum(bits[2 * i * eta + j] for j in range(eta))
-        b = sum(bits[2 * i * eta + eta + j] for j in range(eta))
-        coefficients[i] = (a - b) % 3329
-    
-    return coefficients
+    return cbdBatch(inputBytes, eta)[0]
+
+def _cbdTable(eta):
+    """Maps every 2*eta-bit string to its centered binomial coefficient."""
+    if eta not in _CBD_TABLES:
+        table = {}
+        for value in range(2**(2 * eta)):
+            bits = format(value, '0{}b'.format(2 * eta))
+            table[bits] = (bits[:eta].count('1') - bits[eta:].count('1')) % 3329
+        _CBD_TABLES[eta] = table
+    return _CBD_TABLES[eta]
+
+def cbdBatch(inputBytes, eta):
+    """Samples several polynomials from consecutive 64*eta-byte blocks at once.
+
+    Args:
+        inputBytes (bytes): The input bytes, a multiple of 64 * eta long.
+        eta (int): The parameter eta.
+
+    Returns:
+        list: The coefficients of each polynomial, one list per block.
+    """
+    assert len(inputBytes) % (64 * eta) == 0
+
+    # Every coefficient is (sum of eta bits) - (sum of the next eta bits)
+    bits = bytesToBitstring(inputBytes)
+    table = _cbdTable(eta)
+    step = 2 * eta
+    coefficients = [table[bits[i:i + step]] for i in range(0, len(bits), step)]
+    return [coefficients[i:i + 256] for i in range(0, len(coefficients), 256)]
 
 def randomPolyVector(k, N, q, eta, seed):
     """Generates a random polynomial vector.
@@ -146,6 +194,28 @@ def randomPoly(q, eta, seed, N):
     coefficients = cbd(prfOutput, eta)
     return Polynomial(coefficients, q)
 
+def randomPolyBatch(q, seed, specs):
+    """Generates several random polynomials from one sampling buffer.
+
+    Each polynomial is identical to randomPoly(q, eta, seed, N) for its (eta, N).
+    PRF outputs are computed once per distinct (eta, N) and sampled together.
+
+    Args:
+        q (int): The modulus.
+        seed (bytes): The seed for the PRF.
+        specs (list): One (eta, N) pair per polynomial.
+
+    Returns:
+        list: The random polynomials, in the order of specs.
+    """
+    samples = {}
+    for eta in set(eta for eta, _ in specs):
+        nonces = sorted(set(N for e, N in specs if e == eta))
+        buffer = b''.join(PRF(seed, N, 64 * eta) for N in nonces)
+        for N, coefficients in zip(nonces, cbdBatch(buffer, eta)):
+            samples[(eta, N)] = coefficients
+    return [Polynomial(samples[spec], q) for spec in specs]
+
 def expand(rho, k, q, n):
     """Expands a seed into a matrix of polynomials.
 
@@ -180,7 +250,7 @@ def compress(x, q, d):
     Returns:
         int: The compressed value.
     """
-    return roundUpTies((2**d / q) * x) % (2**d)
+    return ((x << (d + 1)) + q) // (2 * q) % (1 << d)
 
 def decompress(y, q, d):
     """Decompresses a value.
@@ -193,4 +263,38 @@ def decompress(y, q, d):
     Returns:
         int: The decompressed value.
     """
-    return roundUpTies((q / 2**d) * y) % q
\ No newline at end of file
+    return ((2 * q * y + (1 << d)) >> (d + 1)) % q
+
+def compressPoly(poly, q, d):
+    """Compresses every coefficient of a Polynomial or PolynomialVector.
+
+    Args:
+        poly (Polynomial or PolynomialVector): The input, from either backend.
+        q (int): The modulus.
+        d (int): The compression parameter.
+
+    Returns:
+        Polynomial or PolynomialVector: The compressed input, with modulus 2^d.
+    """
+    if hasattr(poly, "polynomials"):
+        return type(poly)([compressPoly(p, q, d) for p in poly.polynomials])
+    if hasattr(poly, "array"):
+        return type(poly)(((poly.array << (d + 1)) + q) // (2 * q), 1 << d)
+    return Polynomial([((x << (d + 1)) + q) // (2 * q) for x in poly.coefficients], 1 << d)
+
+def decompressPoly(poly, q, d):
+    """Decompresses every coefficient of a Polynomial or PolynomialVector.
+
+    Args:
+        poly (Polynomial or PolynomialVector): The input, from either backend.
+        q (int): The modulus.
+        d (int): The compression parameter.
+
+    Returns:
+        Polynomial or PolynomialVector: The decompressed input, with modulus q.
+    """
+    if hasattr(poly, "polynomials"):
+        return type(poly)([decompressPoly(p, q, d) for p in poly.polynomials])
+    if hasattr(poly, "array"):
+        return type(poly)((2 * q * poly.array + (1 << d)) >> (d + 1), q)
+    return Polynomial([(2 * q * y + (1 << d)) >> (d + 1) for y in poly.coefficients], q)
\ No newline at end of file
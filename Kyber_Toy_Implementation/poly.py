@@ -1,3 +1,5 @@
+from .ntt import nttTables, ntt, invNtt, baseMul, baseMulAcc
+
 class Polynomial:
     def __init__(self, coefficients, q):
         self.coefficients = [c % q for c in coefficients]
@@ -34,7 +36,11 @@ class Polynomial:
     def mulRq(self, other, n):
         if self.q != other.q:
             raise ValueError("Polynomials must have the same modulus")
-        # Use the __mul__ method to multiply the polynomials
+        # Multiply in the NTT domain when Rq supports it
+        if len(self.coefficients) == len(other.coefficients) == n and nttTables(n, self.q) is not None:
+            productHat = baseMul(ntt(self.coefficients, self.q), ntt(other.coefficients, self.q), self.q)
+            return Polynomial(invNtt(productHat, self.q), self.q)
+        # Otherwise use the __mul__ method to multiply the polynomials
         product = self * other
         # Reduce modulo x^n + 1
         reduced_result = [0] * n
@@ -54,6 +60,7 @@ class PolynomialVector:
         self.polynomials = polynomials
         self.q = polynomials[0].q
         self.n = len(polynomials[0].coefficients)
+        self._nttForm = None
 
     def __add__(self, other):
         if len(self.polynomials) != len(other.polynomials):
@@ -67,13 +74,128 @@ class PolynomialVector:
         result = [self.polynomials[i] - other.polynomials[i] for i in range(len(self.polynomials))]
         return PolynomialVector(result)
 
+    def nttForm(self):
+        """Returns the NTT-domain coefficients of each polynomial, computed once.
+
+        Returns:
+            list or None: One coefficient list per polynomial, or None if Rq has no NTT.
+        """
+        if self._nttForm is None and nttTables(self.n, self.q) is not None:
+            self._nttForm = [ntt(p.coefficients, self.q) for p in self.polynomials]
+        return self._nttForm
+
+    def setNttForm(self, values):
+        """Sets the cached NTT form, e.g. from coefficients stored on disk.
+
+        Args:
+            values (sequence): The NTT-domain coefficients of every polynomial, in order.
+        """
+        n = self.n
+        self._nttForm = [list(values[i:i + n]) for i in range(0, len(values), n)]
+
     def inner_product(self, other):
         if len(self.polynomials) != len(other.polynomials):
             raise ValueError("Vectors must have the same length")
+        if nttTables(self.n, self.q) is not None:
+            pairs = zip(self.nttForm(), other.nttForm())
+            return Polynomial(invNtt(baseMulAcc(pairs, self.q), self.q), self.q)
         result = Polynomial([0] * self.n, self.q)
         for i in range(len(self.polynomials)):
             result = result + self.polynomials[i].mulRq(other.polynomials[i], self.n)
         return result
 
     def __repr__(self):
-        return "PolynomialVector({})".format(self.polynomials)
\ No newline at end of file
+        return "PolynomialVector({})".format(self.polynomials)
+
+class PolynomialMatrix:
+    def __init__(self, rows):
+        self.rows = rows
+        self.q = rows[0][0].q
+        self.n = len(rows[0][0].coefficients)
+        self._nttForm = None
+
+    def __getitem__(self, i):
+        return self.rows[i]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def nttForm(self):
+        """Returns the NTT-domain coefficients of each entry, computed once.
+
+        Returns:
+            list or None: A k x k list of coefficient lists, or None if Rq has no NTT.
+        """
+        if self._nttForm is None and nttTables(self.n, self.q) is not None:
+            self._nttForm = [[ntt(p.coefficients, self.q) for p in row] for row in self.rows]
+        return self._nttForm
+
+    def setNttForm(self, values):
+        """Sets the cached NTT form, e.g. from coefficients stored on disk.
+
+        Args:
+            values (sequence): The NTT-domain coefficients of every entry, row by row.
+        """
+        n = self.n
+        k = len(self.rows[0])
+        self._nttForm = [[list(values[(i * k + j) * n:(i * k + j + 1) * n]) for j in range(k)]
+                         for i in range(len(self.rows))]
+
+    def __repr__(self):
+        return "PolynomialMatrix({})".format(self.rows)
+
+def matrixVectorMulRq(A, v, transpose=False):
+    """Multiplies a matrix of polynomials by a polynomial vector in Rq.
+
+    Each operand is transformed to the NTT domain once and the products are
+    accumulated there, so only one inverse NTT is needed per output entry.
+    The NTT forms are cached on the matrix and the vector for later calls.
+
+    Args:
+        A (PolynomialMatrix or list): The k x k matrix of polynomials.
+        v (PolynomialVector): The polynomial vector.
+        transpose (bool): If True, computes A^T * v instead of A * v.
+
+    Returns:
+        PolynomialVector: The resulting polynomial vector.
+    """
+    if not isinstance(A, PolynomialMatrix):
+        A = PolynomialMatrix(A)
+    k = len(v.polynomials)
+    q = v.q
+    if nttTables(v.n, q) is None:
+        rows = [[A[j][i] if transpose else A[i][j] for j in range(k)] for i in range(k)]
+        return PolynomialVector([PolynomialVector(row).inner_product(v) for row in rows])
+
+    vHat = v.nttForm()
+    AHat = A.nttForm()
+    result = []
+    for i in range(k):
+        pairs = ((AHat[j][i] if transpose else AHat[i][j], vHat[j]) for j in range(k))
+        result.append(Polynomial(invNtt(baseMulAcc(pairs, q), q), q))
+    return PolynomialVector(result)
+
+def matrixVectorMulRqBatch(matrices, vectors, transpose=False):
+    """Computes matrixVectorMulRq for each (matrix, vector) pair.
+
+    Args:
+        matrices (list): One PolynomialMatrix (or k x k list) per vector.
+        vectors (list): The polynomial vectors.
+        transpose (bool): If True, computes A^T * v instead of A * v.
+
+    Returns:
+        list: The resulting polynomial vectors.
+    """
+    return [matrixVectorMulRq(A, v, transpose) for A, v in zip(matrices, vectors)]
+
+def innerProductBatch(lefts, rights):
+    """Computes the inner product of each (left, right) pair of vectors.
+
+    Args:
+        lefts (list): The left polynomial vectors.
+        rights (list): The right polynomial vectors.
+
+    Returns:
+        list: The resulting polynomials.
+    """
+    return [a.inner_product(b) for a, b in zip(lefts, rights)]
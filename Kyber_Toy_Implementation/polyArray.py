@@ -0,0 +1,360 @@
+import numpy as np
+from .ntt import nttTables
+
+_ARRAY_TABLES = {}
+
+def _tables(n, q):
+    """Returns the NTT tables for (n, q) as NumPy arrays, or None if no NTT exists."""
+    key = (n, q)
+    if key not in _ARRAY_TABLES:
+        tables = nttTables(n, q)
+        if tables is None:
+            _ARRAY_TABLES[key] = None
+        else:
+            zetas, gammas, nInv = tables
+            _ARRAY_TABLES[key] = (np.array(zetas, dtype=np.int64), np.array(gammas, dtype=np.int64), nInv)
+    return _ARRAY_TABLES[key]
+
+def _asArray(poly):
+    """Returns the coefficients of a polynomial of either backend as an int64 array."""
+    if isinstance(poly, Polynomial):
+        return poly.array
+    return np.asarray(poly.coefficients, dtype=np.int64)
+
+def nttArray(f, q):
+    """Computes the forward NTT over the last axis of an array of polynomials.
+
+    Args:
+        f (numpy.ndarray): Coefficients with shape (..., n).
+        q (int): The modulus.
+
+    Returns:
+        numpy.ndarray: The polynomials in the NTT domain.
+    """
+    n = f.shape[-1]
+    zetas = _tables(n, q)[0]
+    f = np.array(f, dtype=np.int64)
+    k = 1
+    length = n // 2
+    while length >= 2:
+        blocks = n // (2 * length)
+        g = f.reshape(f.shape[:-1] + (blocks, 2, length))
+        z = zetas[k:k + blocks].reshape(blocks, 1)
+        t = z * g[..., 1, :] % q
+        low = g[..., 0, :].copy()
+        g[..., 0, :] = (low + t) % q
+        g[..., 1, :] = (low - t) % q
+        k += blocks
+        length //= 2
+    return f
+
+def invNttArray(f, q):
+    """Computes the inverse NTT over the last axis of an array of polynomials.
+
+    Args:
+        f (numpy.ndarray): Polynomials in the NTT domain with shape (..., n).
+        q (int): The modulus.
+
+    Returns:
+        numpy.ndarray: The polynomial coefficients.
+    """
+    n = f.shape[-1]
+    zetas, _, nInv = _tables(n, q)
+    f = np.array(f, dtype=np.int64)
+    k = n // 2 - 1
+    length = 2
+    while length <= n // 2:
+        blocks = n // (2 * length)
+        g = f.reshape(f.shape[:-1] + (blocks, 2, length))
+        z = zetas[k - blocks + 1:k + 1][::-1].reshape(blocks, 1)
+        low = g[..., 0, :].copy()
+        high = g[..., 1, :].copy()
+        g[..., 0, :] = (low + high) % q
+        g[..., 1, :] = z * (high - low) % q
+        k -= blocks
+        length *= 2
+    return f * nInv % q
+
+def baseMulArray(aHat, bHat, q):
+    """Multiplies polynomials in the NTT domain, broadcasting over leading axes.
+
+    Args:
+        aHat (numpy.ndarray): Polynomials in the NTT domain with shape (..., n).
+        bHat (numpy.ndarray): Polynomials in the NTT domain with shape (..., n).
+        q (int): The modulus.
+
+    Returns:
+        numpy.ndarray: The products in the NTT domain.
+    """
+    gammas = _tables(aHat.shape[-1], q)[1]
+    a0, a1 = aHat[..., 0::2], aHat[..., 1::2]
+    b0, b1 = bHat[..., 0::2], bHat[..., 1::2]
+    shape = np.broadcast_shapes(aHat.shape, bHat.shape)
+    result = np.empty(shape, dtype=np.int64)
+    result[..., 0::2] = (a0 * b0 + a1 * b1 % q * gammas) % q
+    result[..., 1::2] = (a0 * b1 + a1 * b0) % q
+    return result
+
+def _mulRqArray(a, b, q):
+    """Multiplies arrays of polynomials in Rq, broadcasting over leading axes."""
+    n = a.shape[-1]
+    if _tables(n, q) is not None:
+        return invNttArray(baseMulArray(nttArray(a, q), nttArray(b, q), q), q)
+    # Schoolbook negacyclic product for rings without an NTT
+    a, b = np.broadcast_arrays(a, b)
+    result = np.zeros(a.shape, dtype=np.int64)
+    for i in range(n):
+        term = a[..., i:i + 1] * b
+        result[..., i:] += term[..., :n - i]
+        result[..., :i] -= term[..., n - i:]
+        result %= q
+    return result
+
+class Polynomial:
+    def __init__(self, coefficients, q):
+        self.array = np.asarray(coefficients, dtype=np.int64) % q
+        self.q = q
+
+    @property
+    def coefficients(self):
+        return self.array.tolist()
+
+    def __add__(self, other):
+        if self.q != other.q:
+            raise ValueError("Polynomials must have the same modulus")
+        a, b = self.array, _asArray(other)
+        if len(a) < len(b):
+            a, b = b, a
+        result = a.copy()
+        result[:len(b)] += b
+        return Polynomial(result, self.q)
+
+    def __sub__(self, other):
+        if self.q != other.q:
+            raise ValueError("Polynomials must have the same modulus")
+        a, b = self.array, _asArray(other)
+        result = np.zeros(max(len(a), len(b)), dtype=np.int64)
+        result[:len(a)] += a
+        result[:len(b)] -= b
+        return Polynomial(result, self.q)
+
+    def __mul__(self, other):
+        if self.q != other.q:
+            raise ValueError("Polynomials must have the same modulus")
+        return Polynomial(np.convolve(self.array, _asArray(other)), self.q)
+
+    def mulRq(self, other, n):
+        if self.q != other.q:
+            raise ValueError("Polynomials must have the same modulus")
+        b = _asArray(other)
+        if len(self.array) == len(b) == n:
+            return Polynomial(_mulRqArray(self.array, b, self.q), self.q)
+        # Reduce the plain product modulo x^n + 1
+        product = np.convolve(self.array, b)
+        result = np.zeros(n, dtype=np.int64)
+        for start in range(0, len(product), n):
+            chunk = product[start:start + n]
+            if (start // n) % 2:
+                result[:len(chunk)] -= chunk
+            else:
+                result[:len(chunk)] += chunk
+        return Polynomial(result, self.q)
+
+    def __repr__(self):
+        return "Polynomial({}, q={})".format(self.coefficients, self.q)
+
+class PolynomialVector:
+    def __init__(self, polynomials):
+        self.q = polynomials[0].q
+        self.array = np.array([_asArray(p) for p in polynomials], dtype=np.int64)
+        self.n = self.array.shape[1]
+        self._nttForm = None
+
+    @classmethod
+    def fromArray(cls, array, q):
+        """Builds a vector directly from a (k, n) coefficient array."""
+        vector = cls.__new__(cls)
+        vector.array = np.asarray(array, dtype=np.int64) % q
+        vector.q = q
+        vector.n = vector.array.shape[1]
+        vector._nttForm = None
+        return vector
+
+    @property
+    def polynomials(self):
+        return [Polynomial(row, self.q) for row in self.array]
+
+    def __add__(self, other):
+        b = _vectorArray(other)
+        if len(self.array) != len(b):
+            raise ValueError("Vectors must have the same length")
+        return PolynomialVector.fromArray(self.array + b, self.q)
+
+    def __sub__(self, other):
+        b = _vectorArray(other)
+        if len(self.array) != len(b):
+            raise ValueError("Vectors must have the same length")
+        return PolynomialVector.fromArray(self.array - b, self.q)
+
+    def nttForm(self):
+        """Returns the (k, n) NTT-domain array of the vector, computed once.
+
+        Returns:
+            numpy.ndarray or None: The NTT-domain coefficients, or None if Rq has no NTT.
+        """
+        if self._nttForm is None and _tables(self.n, self.q) is not None:
+            self._nttForm = nttArray(self.array, self.q)
+        return self._nttForm
+
+    def setNttForm(self, values):
+        """Sets the cached NTT form, e.g. from coefficients stored on disk.
+
+        Args:
+            values (sequence): The NTT-domain coefficients, flattened in array order.
+        """
+        self._nttForm = np.asarray(values, dtype=np.int64).reshape(self.array.shape)
+
+    def inner_product(self, other):
+        other = _asVector(other)
+        if len(self.array) != len(other.array):
+            raise ValueError("Vectors must have the same length")
+        q = self.q
+        if _tables(self.n, q) is not None:
+            productsHat = baseMulArray(self.nttForm(), other.nttForm(), q)
+            return Polynomial(invNttArray(productsHat.sum(axis=0) % q, q), q)
+        return Polynomial(_mulRqArray(self.array, other.array, q).sum(axis=0), q)
+
+    def __repr__(self):
+        return "PolynomialVector({})".format(self.polynomials)
+
+class PolynomialMatrix:
+    def __init__(self, rows):
+        self.q = rows[0][0].q
+        self.array = np.array([[_asArray(p) for p in row] for row in rows], dtype=np.int64)
+        self._nttForm = None
+
+    def __getitem__(self, i):
+        return [Polynomial(p, self.q) for p in self.array[i]]
+
+    def __len__(self):
+        return len(self.array)
+
+    def nttForm(self):
+        """Returns the (k, k, n) NTT-domain array of the matrix, computed once.
+
+        Returns:
+            numpy.ndarray or None: The NTT-domain coefficients, or None if Rq has no NTT.
+        """
+        if self._nttForm is None and _tables(self.array.shape[-1], self.q) is not None:
+            self._nttForm = nttArray(self.array, self.q)
+        return self._nttForm
+
+    def setNttForm(self, values):
+        """Sets the cached NTT form, e.g. from coefficients stored on disk.
+
+        Args:
+            values (sequence): The NTT-domain coefficients, flattened in array order.
+        """
+        self._nttForm = np.asarray(values, dtype=np.int64).reshape(self.array.shape)
+
+def _vectorArray(vector):
+    """Returns the coefficients of a vector of either backend as a (k, n) array."""
+    if isinstance(vector, PolynomialVector):
+        return vector.array
+    return np.array([_asArray(p) for p in vector.polynomials], dtype=np.int64)
+
+def _asVector(vector):
+    """Returns a vector of either backend as an array-backed PolynomialVector."""
+    if isinstance(vector, PolynomialVector):
+        return vector
+    return PolynomialVector(vector.polynomials)
+
+def matrixVectorMulRq(A, v, transpose=False):
+    """Multiplies a matrix of polynomials by a polynomial vector in Rq.
+
+    All k x k products are computed as one batched operation. The NTT forms
+    are cached on the matrix and the vector for later calls.
+
+    Args:
+        A (PolynomialMatrix or list): The k x k matrix of polynomials.
+        v (PolynomialVector): The polynomial vector.
+        transpose (bool): If True, computes A^T * v instead of A * v.
+
+    Returns:
+        PolynomialVector: The resulting polynomial vector.
+    """
+    if not isinstance(A, PolynomialMatrix):
+        A = PolynomialMatrix(A)
+    v = _asVector(v)
+    q = A.q
+    if _tables(v.n, q) is not None:
+        AHat = A.nttForm()
+        if transpose:
+            AHat = AHat.transpose(1, 0, 2)
+        productsHat = baseMulArray(AHat, v.nttForm()[np.newaxis], q)
+        return PolynomialVector.fromArray(invNttArray(productsHat.sum(axis=1) % q, q), q)
+    matrix = A.array.transpose(1, 0, 2) if transpose else A.array
+    return PolynomialVector.fromArray(_mulRqArray(matrix, v.array[np.newaxis], q).sum(axis=1), q)
+
+def _stackNtt(items, q):
+    """Stacks the NTT forms of matrices or vectors, broadcasting a shared one."""
+    if all(item is items[0] for item in items):
+        return items[0].nttForm()[np.newaxis]
+    return np.stack([item.nttForm() for item in items])
+
+def _batchNtt(vectors, q):
+    """Stacks the NTT forms of vectors, transforming all uncached ones in one call."""
+    missing = [v for v in vectors if v._nttForm is None]
+    if missing:
+        hats = nttArray(np.stack([v.array for v in missing]), q)
+        for v, hat in zip(missing, hats):
+            v._nttForm = hat
+    return np.stack([v._nttForm for v in vectors])
+
+def matrixVectorMulRqBatch(matrices, vectors, transpose=False):
+    """Computes matrixVectorMulRq for each (matrix, vector) pair as one stacked operation.
+
+    A matrix shared by every pair is transformed once and broadcast.
+
+    Args:
+        matrices (list): One PolynomialMatrix (or k x k list) per vector.
+        vectors (list): The polynomial vectors.
+        transpose (bool): If True, computes A^T * v instead of A * v.
+
+    Returns:
+        list: The resulting polynomial vectors.
+    """
+    matrices = [A if isinstance(A, PolynomialMatrix) else PolynomialMatrix(A) for A in matrices]
+    vectors = [_asVector(v) for v in vectors]
+    q = matrices[0].q
+    if _tables(vectors[0].n, q) is None:
+        return [matrixVectorMulRq(A, v, transpose) for A, v in zip(matrices, vectors)]
+    AHat = _stackNtt(matrices, q)
+    if transpose:
+        AHat = AHat.transpose(0, 2, 1, 3)
+    VHat = _batchNtt(vectors, q)
+    productsHat = baseMulArray(AHat, VHat[:, np.newaxis], q)
+    results = invNttArray(productsHat.sum(axis=2) % q, q)
+    return [PolynomialVector.fromArray(result, q) for result in results]
+
+def innerProductBatch(lefts, rights):
+    """Computes the inner product of each (left, right) pair as one stacked operation.
+
+    A left vector shared by every pair is transformed once and broadcast.
+
+    Args:
+        lefts (list): The left polynomial vectors.
+        rights (list): The right polynomial vectors.
+
+    Returns:
+        list: The resulting polynomials.
+    """
+    lefts = [_asVector(v) for v in lefts]
+    rights = [_asVector(v) for v in rights]
+    q = lefts[0].q
+    if _tables(lefts[0].n, q) is None:
+        return [a.inner_product(b) for a, b in zip(lefts, rights)]
+    LHat = _stackNtt(lefts, q)
+    RHat = _batchNtt(rights, q)
+    results = invNttArray(baseMulArray(LHat, RHat, q).sum(axis=1) % q, q)
+    return [Polynomial(result, q) for result in results]
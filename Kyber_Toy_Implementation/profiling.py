@@ -0,0 +1,65 @@
+import threading
+import time
+from contextlib import nullcontext
+
+# Totals per stage name while profiling is on, None while it is off
+_timings = None
+_lock = threading.Lock()
+_OFF = nullcontext()
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            if _timings is not None:  # Profiling may have been switched off meanwhile
+                entry = _timings.setdefault(self.name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+def stage(name):
+    """Returns a context manager timing one stage of a Kyber operation.
+
+    While profiling is off this is a shared no-op, so the hooks cost one call and
+    one global lookup each.
+
+    Args:
+        name (str): The stage name, e.g. "encrypt.multiply".
+    """
+    if _timings is None:
+        return _OFF
+    return _Stage(name)
+
+def enableProfiling():
+    """Starts collecting stage timings in this process."""
+    global _timings
+    with _lock:
+        if _timings is None:
+            _timings = {}
+
+def disableProfiling():
+    """Stops collecting stage timings and discards those collected."""
+    global _timings
+    with _lock:
+        _timings = None
+
+def profilingEnabled():
+    return _timings is not None
+
+def stageTimings():
+    """Returns the calls, total time and mean time of every stage timed so far.
+
+    Returns:
+        dict: Maps each stage name to a dict with calls, total_ms and mean_us.
+    """
+    with _lock:
+        entries = dict(_timings or {})
+        return {name: {"calls": calls, "total_ms": seconds * 1e3, "mean_us": seconds / calls * 1e6}
+                for name, (calls, seconds) in sorted(entries.items())}
@@ -39,16 +39,11 @@ def bytesToBitList(byteData, n):
     Returns:
         list: The bit list of length n.
     """
-    # Convert the byte string to a bit string
-    bitString = ''.join(format(byte, '08b') for byte in byteData)
-    
-    # Ensure the bit string has the desired length n
-    bitStringPadded = bitString.ljust(n, '0')
-    
-    # Convert the bit string to a list of integers
-    bitList = [int(bit) for bit in bitStringPadded[:n]]
-    
-    return bitList
+    # Convert the byte string to a bit string, padded or truncated to length n
+    bitString = bytesToBitstring(byteData).ljust(n, '0')[:n]
+
+    # Map the characters '0'/'1' straight to the integers 0/1
+    return list(bitString.encode().translate(_ASCII_TO_BIT))
 
 def bitListToBytes(bitList):
     """Converts a bit list to a byte string.
@@ -59,16 +54,51 @@ def bitListToBytes(bitList):
     Returns:
         bytes: The byte string.
     """
-    # Group the bits into groups of 8
-    byteList = []
-    for i in range(0, len(bitList), 8):
-        byte = 0
-        for j in range(8):
-            if i + j < len(bitList):
-                byte |= bitList[i + j] << (7 - j)
-        byteList.append(byte)
-    
-    return bytes(byteList)
+    return bitstringToBytes(bytes(bitList).translate(_BIT_TO_ASCII).decode())
+
+_ASCII_TO_BIT = bytes.maketrans(b"01", b"\x00\x01")
+_BIT_TO_ASCII = bytes.maketrans(b"\x00\x01", b"01")
+_BIT_STRINGS = {}
+_BIT_VALUES = {}
+
+def bytesToBitstring(byteData):
+    """Converts a byte string to its bitstring, most significant bit of each byte first.
+
+    Args:
+        byteData (bytes): The input byte string.
+
+    Returns:
+        str: The bitstring of length 8 * len(byteData).
+    """
+    if not byteData:
+        return ''
+    return format(int.from_bytes(byteData, 'big'), '0{}b'.format(8 * len(byteData)))
+
+def bitstringToBytes(bitString):
+    """Converts a bitstring to a byte string, zero-padding the last byte.
+
+    Args:
+        bitString (str): The input bitstring, most significant bit of each byte first.
+
+    Returns:
+        bytes: The byte string.
+    """
+    byteLength = (len(bitString) + 7) // 8
+    if byteLength == 0:
+        return b''
+    return int(bitString.ljust(8 * byteLength, '0'), 2).to_bytes(byteLength, 'big')
+
+def _bitStrings(l):
+    """Returns the l-bit strings, least significant bit first, of all values below 2^l."""
+    if l not in _BIT_STRINGS:
+        _BIT_STRINGS[l] = [format(value, '0{}b'.format(l))[::-1] for value in range(2**l)]
+    return _BIT_STRINGS[l]
+
+def _bitValues(l):
+    """Returns the inverse of _bitStrings(l) as a dictionary."""
+    if l not in _BIT_VALUES:
+        _BIT_VALUES[l] = {bits: value for value, bits in enumerate(_bitStrings(l))}
+    return _BIT_VALUES[l]
 
 def stringToBitstring(s):
     """Converts a string to a bitstring.
@@ -106,40 +136,21 @@ def decode(byteArray, q, n, l, k=None):
     Returns:
         Polynomial or PolynomialVector: The resulting polynomial or polynomial vector.
     """
-    bitArray = []
-    for byte in byteArray:
-        for i in range(8):
-            bitArray.append((byte >> (7 - i)) & 1)
+    count = n if k is None else n * k
+    requiredBits = count * l
+    bitString = bytesToBitstring(byteArray)
+    if len(bitString) < requiredBits:
+        bitString = bitString.ljust(requiredBits, '0')
+
+    # Each coefficient is l bits, least significant bit first
+    values = _bitValues(l)
+    coefficients = [values[bitString[i:i + l]] % q for i in range(0, requiredBits, l)]
 
     if k is None:
         # Decode a single polynomial
-        coefficients = []
-        requiredBits = n * l
-        if len(bitArray) < requiredBits:
-            bitArray.extend([0] * (requiredBits - len(bitArray)))
-
-        for i in range(n):
-            coeff = 0
-            for j in range(l):
-                coeff += bitArray[i * l + j] << j
-            coefficients.append(coeff % q)
         return Polynomial(coefficients, q)
-    else:
-        # Decode a polynomial vector
-        polynomials = []
-        requiredBits = n * l * k
-        if len(bitArray) < requiredBits:
-            bitArray.extend([0] * (requiredBits - len(bitArray)))
-
-        for i in range(k):
-            coefficients = []
-            for j in range(n):
-                coeff = 0
-                for m in range(l):
-                    coeff += bitArray[(i * n + j) * l + m] << m
-                coefficients.append(coeff % q)
-            polynomials.append(Polynomial(coefficients, q))
-        return PolynomialVector(polynomials)
+    # Decode a polynomial vector
+    return PolynomialVector([Polynomial(coefficients[i * n:(i + 1) * n], q) for i in range(k)])
 
 def encode(poly, n, l):
     """Serializes a Polynomial or PolynomialVector into an array of bytes.
@@ -152,28 +163,9 @@ def encode(poly, n, l):
     Returns:
         bytes: The resulting byte array.
     """
-    byteArray = bytearray()
-    if isinstance(poly, PolynomialVector):
-        for p in poly.polynomials:
-            bitArray = []
-            for coeff in p.coefficients:
-                for j in range(l):
-                    bitArray.append((coeff >> j) & 1)
-            for i in range(0, len(bitArray), 8):
-                byte = 0
-                for j in range(8):
-                    if i + j < len(bitArray):
-                        byte |= bitArray[i + j] << (7 - j)
-                byteArray.append(byte)
-    elif isinstance(poly, Polynomial):
-        bitArray = []
-        for coeff in poly.coefficients:
-            for j in range(l):
-                bitArray.append((coeff >> j) & 1)
-        for i in range(0, len(bitArray), 8):
-            byte = 0
-            for j in range(8):
-                if i + j < len(bitArray):
-                    byte |= bitArray[i + j] << (7 - j)
-            byteArray.append(byte)
-    return bytes(byteArray)
\ No newline at end of file
+    polynomials = poly.polynomials if hasattr(poly, "polynomials") else [poly]
+    strings = _bitStrings(l)
+    mask = 2**l - 1
+    # Each polynomial is packed separately, so a partial last byte is padded per polynomial
+    return b''.join(bitstringToBytes(''.join([strings[c & mask] for c in p.coefficients]))
+                    for p in polynomials)
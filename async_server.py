@@ -0,0 +1,398 @@
+import asyncio
+import itertools
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from AES import SERVER, SessionCipher
+from compression import (DEFAULT_DICTIONARY, Codec, accept_offer, load_dictionary, open_body, seal_record,
+                         seal_records)
+from framing import (COMPRESSED, HEADER, HELLO_COMPRESS, HELLO_KEM, HELLO_RESUME, MSG_CHAT, MSG_FILE, MSG_HISTORY,
+                     MSG_TICKET, encode_frame, encode_record, read_frame, split_record)
+from group_key import GroupKey
+from history import CATCH_UP_READS, History
+from outbound import COALESCE_BYTES, DROP_OLDEST, MAX_QUEUE_BYTES, AsyncOutboundQueue
+from handshake import HandshakeBatcher, HandshakePool
+from metrics import Metrics, client_queue_gauges, queue_gauges, start_reporting
+from resumption import TicketIssuer
+from rooms import DEFAULT_ROOM, RoomIndex, room_command, valid_room
+from sharding import decode_bus_message, encode_bus_message, lost_bus
+from server_keys import KeyPool, load_server_key
+from transfer import FILE_CHUNK, TransferRelay
+from Kyber_Toy_Implementation.kyberKEM import ciphertextSize, decapsulate
+from Kyber_Toy_Implementation.kyberPKE import setBackend
+from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
+from Kyber_Toy_Implementation.profiling import enableProfiling, stageTimings
+
+class AsyncServer:
+    """Single-threaded asyncio engine with the same wire behavior as Server."""
+
+    def __init__(self, host="192.168.20.29", port=5555, handshake_workers=0, backlog=1024, group_key=False,
+                 max_queue=1024, slow_client_policy=DROP_OLDEST, key_file=None, rotate_key_every=0, key_pool=4,
+                 coalesce_window=0, coalesce_bytes=COALESCE_BYTES, ticket_lifetime=3600, ticket_cache=10000,
+                 metrics_port=None, metrics_interval=0, reuse_port=False, bus_path=None, ticket_key=None,
+                 history_dir=None, history_messages=100, history_age=0, compress=False, compress_dictionary=None,
+                 batch_handshakes=False, backend="python", max_queue_bytes=MAX_QUEUE_BYTES):
+        if rotate_key_every and (batch_handshakes or handshake_workers):
+            raise ValueError("Server key rotation needs in-process handshakes; batcher and workers hold a fixed key")
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.reuse_port = reuse_port  # Sharded workers share the port
+        self.clients = {}  # Maps each writer to its session cipher
+        self.client_codecs = {}  # Each writer's compression codec, or None if it sends and receives raw
+        self.rooms = RoomIndex()  # The room each writer is in
+        # Each client gets a bounded send queue and writer task so a slow socket never stalls a broadcast
+        self.outbound = {}
+        self.max_queue = max_queue
+        self.max_queue_bytes = max_queue_bytes
+        self.slow_client_policy = slow_client_policy
+        # Optionally hold each client's records for up to coalesce_window seconds and send them as one batch
+        self.coalesce_window = coalesce_window
+        self.coalesce_bytes = coalesce_bytes
+        self.params = KYBER_PARAMS["kyber1024"]
+        # Every key below is prepared with the polynomial backend selected here, so select it before loading one
+        setBackend(backend)
+        # Loaded already prepared from key_file if it exists, so restarts keep the key clients know
+        self.serverPublicKey, self.serverPrivateKey, self.serverKey = load_server_key(self.params, key_file)
+        # Optionally switch to a pre-generated key every rotate_key_every handshakes (1 for per-session keys)
+        self.rotate_key_every = rotate_key_every
+        self.key_pool = KeyPool(self.params, key_pool) if rotate_key_every else None
+        self.handshakes = itertools.count(1)
+        # Decapsulation runs in worker processes or batches on one thread if enabled, otherwise in the default pool
+        self.handshake_pool = None
+        if handshake_workers:
+            self.handshake_pool = HandshakePool(self.serverPublicKey, self.serverPrivateKey, self.params,
+                                                workers=handshake_workers)
+        self.handshake_batcher = HandshakeBatcher(self.serverKey, self.params) if batch_handshakes else None
+        # Optionally encrypt each broadcast once under its room's key, which rotates whenever someone enters or leaves
+        self.group_keys = {} if group_key else None
+        # Tickets let a reconnecting client skip Kyber for ticket_lifetime seconds after its full handshake
+        self.tickets = TicketIssuer(ticket_lifetime, ticket_cache, ticket_key) if ticket_lifetime else None
+        # As a sharded worker, broadcasts are also published to the other workers over the bus at bus_path
+        self.bus_path = bus_path
+        self.bus = None
+        # Optionally log every broadcast under history_dir and replay a room's latest messages to whoever enters it
+        self.history = History(history_dir, history_messages, history_age) if history_dir else None
+        # Logging runs on one thread of its own, so broadcasts are logged, and then sent, in the order they were made
+        self.history_writer = ThreadPoolExecutor(1) if history_dir else None
+        self.replayed = {}  # Client -> the history positions (first, end) its replay of its room covered
+        self.sent_live = {}  # Room -> the history position after the last broadcast sent out live in it
+        # Optionally deflate chat for clients offering the same preset dictionary in their hello
+        self.codec = None
+        if compress or compress_dictionary:
+            self.codec = Codec(load_dictionary(compress_dictionary) if compress_dictionary else DEFAULT_DICTIONARY)
+        # File transfers between connected users, relayed a chunk at a time under credit from the recipient
+        self.transfers = TransferRelay()
+        # Counters, histograms and Kyber stage timings, only collected if something reports them
+        self.metrics = None
+        self.metrics_port = metrics_port
+        self.metrics_interval = metrics_interval
+        if metrics_port is not None or metrics_interval:
+            self.metrics = Metrics()
+            enableProfiling()
+
+    # Broadcast a message (text or UTF-8 bytes) to a room, including other workers' clients unless it came from them
+    def broadcast_message(self, message, sender=None, room=DEFAULT_ROOM, relay=True):
+        start = time.perf_counter()
+        if isinstance(message, str):
+            message = message.encode()  # Once, not per recipient
+        if relay and self.bus is not None:
+            self.bus.write(encode_frame(encode_bus_message(room, message)))
+        packed = self.codec.compress(message) if self.codec is not None else None  # Also once, for every member
+        if self.history is None:
+            self.send_live(room, message, packed, sender, start)
+            return
+
+        # Sent once logged off the loop; a client that entered the room in between with the message in its replay
+        # is skipped
+        def logged(future):
+            if not future.cancelled():
+                self.send_live(room, message, packed, sender, start, future.result())
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(self.history_writer, self.history.append, room, message).add_done_callback(logged)
+
+    # Send a broadcast to its room's members, after logging it at position if there is history
+    def send_live(self, room, message, packed, sender, start, position=None):
+        if position is not None:
+            self.sent_live[room] = max(self.sent_live.get(room, 0), position + 1)
+        group_records = None
+        if self.group_keys is not None and room in self.group_keys:
+            group_key = self.group_keys[room]  # One encryption for every member, and one more if compressed
+            raw = group_key.seal(message)
+            group_records = (raw, group_key.seal(packed, compressed=True) if packed is not None else raw)
+        for writer in list(self.rooms.room_members(room)):
+            if writer is not sender and not (position is not None and self.was_replayed(writer, position)):
+                compressing = self.client_codecs[writer] is not None
+                if group_records is not None:
+                    record = group_records[compressing]
+                else:
+                    record = seal_record(MSG_CHAT, self.clients[writer], message, packed if compressing else None)
+                self.outbound[writer].put(record)  # Only enqueues; the client's writer task sends it
+        if self.metrics is not None:
+            self.metrics.observe("broadcast", time.perf_counter() - start)
+
+    # Add a client that finished its handshake to the lobby
+    def add_client(self, writer, username, cipher, codec=None):
+        self.clients[writer] = cipher  # Store the session cipher
+        self.client_codecs[writer] = codec
+        self.rooms.add(writer)
+        self.transfers.join(writer, username)
+        self.outbound[writer] = AsyncOutboundQueue(writer, self.max_queue, self.slow_client_policy,
+                                                   self.coalesce_window, self.coalesce_bytes, self.metrics,
+                                                   self.max_queue_bytes)
+        if self.group_keys is not None:
+            self.rotate_group_key(DEFAULT_ROOM)
+
+    # Remove a client and its session cipher; returns the room it was in
+    def remove_client(self, writer):
+        if self.clients.pop(writer, None) is None:
+            return None
+        del self.client_codecs[writer]
+        self.replayed.pop(writer, None)
+        room = self.rooms.remove(writer)
+        self.outbound.pop(writer).close()
+        for peer, message in self.transfers.leave(writer):
+            self.send_file_message(peer, message)
+        if self.group_keys is not None:
+            self.rotate_group_key(room)
+        return room
+
+    # Move a client to another room and announce it in both
+    async def change_room(self, writer, username, room):
+        if not valid_room(room):
+            self.send_notice(writer, "Room names are 1 to 32 letters, digits, - or _")
+            return
+        old = self.rooms.room_of[writer]
+        if room == old:
+            return
+        backlog = await self.prepare_backlog(room, self.client_codecs[writer])
+        self.rooms.move(writer, room)
+        if self.group_keys is not None:
+            self.rotate_group_key(old)
+            self.rotate_group_key(room)
+        self.send_backlog(writer, backlog)
+        self.broadcast_message(f"{username} has left {old}.", room=old)
+        self.broadcast_message(f"{username} has joined {room}.", room=room)
+
+    # Send a line to one client only
+    def send_notice(self, writer, text):
+        self.outbound[writer].put(encode_record(MSG_CHAT, self.clients[writer].seal(text.encode())), droppable=False)
+
+    # A room's backlog as ((slice, compressed slice or None) pairs, first position, end position). Given an earlier
+    # backlog, tops it up with what was logged since, or replaces it if that alone fills the limits
+    def read_backlog(self, room, codec, backlog=None):
+        chunks, first, end = self.history.backlog(room, backlog[2] if backlog is not None else None)
+        pairs = [(chunk, codec.compress(chunk) if codec is not None else None) for chunk in chunks]
+        if backlog is not None and first == backlog[2]:
+            return backlog[0] + pairs, backlog[1], end
+        return pairs, first, end
+
+    # read_backlog on the default thread pool, so a long replay never blocks the loop; None without history. Topped
+    # up until no broadcast logged since has been sent out live, so the client misses none of them as long as it
+    # enters the room before the next await
+    async def prepare_backlog(self, room, codec):
+        if self.history is None:
+            return None
+        loop = asyncio.get_running_loop()
+        backlog = await loop.run_in_executor(None, self.read_backlog, room, codec)
+        for _ in range(CATCH_UP_READS):
+            if backlog[2] >= self.sent_live.get(room, 0):
+                return backlog
+            backlog = await loop.run_in_executor(None, self.read_backlog, room, codec, backlog)
+        return self.read_backlog(room, codec, backlog)  # Still behind a busy room; catch up on the loop
+
+    # Queue a backlog for a client that just entered its room
+    def send_backlog(self, writer, backlog):
+        if backlog is None:
+            return
+        pairs, first, end = backlog
+        self.replayed[writer] = (first, end)
+        for record in seal_records(MSG_HISTORY, self.clients[writer], pairs):
+            self.outbound[writer].put(record)
+
+    # Whether a client already got the broadcast logged at position in its replay
+    def was_replayed(self, writer, position):
+        first, end = self.replayed.get(writer, (0, 0))
+        return first <= position < end
+
+    # Pass a file transfer message from a client on to the other end, resealed for it; no file data stays behind
+    def relay_file(self, writer, message):
+        for peer, forward in self.transfers.route(writer, message):
+            self.send_file_message(peer, forward)
+
+    # Queue a file transfer message for a client; only chunks may be dropped for a slow client, which its end
+    # notices from the offsets and can resume from
+    def send_file_message(self, writer, message):
+        record = encode_record(MSG_FILE, self.clients[writer].seal(message))
+        self.outbound[writer].put(record, droppable=message[0] == FILE_CHUNK)
+
+    # Rotate a room's key and hand it to every member over its session cipher
+    def rotate_group_key(self, room):
+        members = self.rooms.room_members(room)
+        if not members:
+            self.group_keys.pop(room, None)
+            return
+        group_key = self.group_keys.get(room)
+        if group_key is None:
+            group_key = self.group_keys[room] = GroupKey()
+        else:
+            group_key.rotate()
+        for writer in members:
+            # Key records are never dropped, or the client could not read what follows
+            self.outbound[writer].put(group_key.key_record(self.clients[writer]), droppable=False)
+
+    # Handle each client in its own task
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        print(f"Client {addr} connected.")
+        username = None
+
+        try:
+            start = time.perf_counter()
+            sessionKey, expiry, codec = await self.key_exchange(reader, writer)
+            if self.metrics is not None:
+                # Only resumed sessions carry their ticket's expiry over
+                name = "handshake_full" if expiry is None else "handshake_resumed"
+                self.metrics.observe(name, time.perf_counter() - start)
+            cipher = SessionCipher(sessionKey, SERVER)  # One cipher for the whole session
+            if self.tickets is not None:
+                writer.write(encode_record(MSG_TICKET, cipher.seal(self.tickets.issue(sessionKey, expiry))))
+
+            writer.write(encode_record(MSG_CHAT, cipher.seal(b"Enter your username: ")))
+            kind, body = split_record(await read_frame(reader))
+            username = open_body(kind, body, cipher.open, codec).decode()
+            backlog = await self.prepare_backlog(DEFAULT_ROOM, codec)
+            self.add_client(writer, username, cipher, codec)
+            self.send_backlog(writer, backlog)
+            print(f"{username} has joined the chat.")
+            self.broadcast_message(f"{username} has joined the chat!")
+
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                if self.metrics is not None:
+                    self.metrics.count("bytes_in", HEADER.size + len(frame))
+                kind, encrypted_message = split_record(frame)
+                if kind == MSG_FILE:
+                    self.relay_file(writer, cipher.open(encrypted_message))
+                    continue
+                if kind & ~COMPRESSED != MSG_CHAT:
+                    continue
+                message = open_body(kind, encrypted_message, cipher.open, codec).decode()
+                room = room_command(message)
+                if room is not None:
+                    await self.change_room(writer, username, room)
+                    continue
+                print(f"{username}: {message}")  # Debug print
+                self.broadcast_message(f"{username}: {message}", sender=writer, room=self.rooms.room_of[writer])
+        except asyncio.CancelledError:
+            pass  # The server is stopping; end like any other disconnect rather than as a cancelled task
+        except Exception as e:
+            print(f"Error with client {username or addr}: {e}")
+            if self.metrics is not None:
+                self.metrics.count("client_errors")
+
+        room = self.remove_client(writer)
+        if room is not None:
+            print(f"{username} has left the chat.")
+            self.broadcast_message(f"{username} has left the chat.", room=room)
+        writer.close()
+
+    # Resume from the client's ticket if it has a valid one, otherwise run Kyber, and settle on compression;
+    # returns (session key, ticket expiry, codec or None)
+    async def key_exchange(self, reader, writer):
+        kind, hello = split_record(await read_frame(reader))
+        kind, hello, codec = accept_offer(kind, hello, self.codec)
+        compressed = HELLO_COMPRESS if codec is not None else 0  # Tells the client its offer was taken
+        if kind == HELLO_RESUME and self.tickets is not None:
+            resumed = self.tickets.redeem(hello)  # Only a hash and an AES-GCM open, so it runs inline
+            if resumed is not None:
+                serverNonce, sessionKey, expiry = resumed
+                writer.write(encode_frame(bytes([HELLO_RESUME | compressed]) + serverNonce))
+                return sessionKey, expiry, codec
+
+        key = self.serverKey  # The key this handshake uses even if it is rotated meanwhile
+        writer.write(encode_frame(bytes([HELLO_KEM | compressed]) + key.pk))
+        if self.key_pool is not None and next(self.handshakes) % self.rotate_key_every == 0:
+            self.rotate_server_key()
+        await writer.drain()
+        ciphertext = await read_frame(reader)
+        if ciphertext is None or len(ciphertext) != ciphertextSize(self.params):
+            raise ValueError("Client hung up or sent a malformed Kyber ciphertext")  # Before it reaches a batch
+        if self.handshake_pool is not None:
+            return await asyncio.wrap_future(self.handshake_pool.submit(ciphertext)), None, codec
+        if self.handshake_batcher is not None:
+            return await asyncio.wrap_future(self.handshake_batcher.submit(ciphertext)), None, codec
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, decapsulate, ciphertext, key, self.params), None, codec
+
+    # Switch to the next pre-generated key pair; keeps the current one if the pool has run dry
+    def rotate_server_key(self):
+        fresh = self.key_pool.take()
+        if fresh is None:
+            print("Server key pool is empty; keeping the current key")
+            return
+        self.serverPublicKey, self.serverPrivateKey, self.serverKey = fresh
+
+    # Handshake latency and queue depth of the process pool, if enabled
+    def handshake_stats(self):
+        if self.handshake_pool is None:
+            return None
+        return self.handshake_pool.stats()
+
+    # Counters and histograms so far plus current gauges; only available with metrics enabled
+    def metrics_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        snapshot["gauges"] = queue_gauges(list(self.outbound.values()))
+        snapshot["client_queues"] = client_queue_gauges([(self.transfers.usernames[writer], queue)
+                                                         for writer, queue in self.outbound.items()])
+        snapshot["gauges"]["rooms"] = len(self.rooms.members)
+        if self.key_pool is not None:
+            snapshot["gauges"]["key_pool_available"] = self.key_pool.available()
+        snapshot["handshake_pool"] = self.handshake_stats()
+        snapshot["kem_stages"] = stageTimings()  # Decapsulations in the default thread pool; workers time their own
+        return snapshot
+
+    # Deliver broadcasts published by the other workers to this worker's clients in the same room
+    async def relay_bus(self, reader):
+        while True:
+            try:
+                frame = await read_frame(reader)
+            except OSError:
+                frame = None
+            if frame is None:
+                lost_bus(self.shutdown)
+            room, message = decode_bus_message(frame)
+            self.broadcast_message(message, room=room, relay=False)
+
+    async def serve(self):
+        if self.bus_path is not None:
+            reader, self.bus = await asyncio.open_unix_connection(self.bus_path)
+            asyncio.get_running_loop().create_task(self.relay_bus(reader))
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=self.backlog,
+                                            reuse_port=self.reuse_port)
+        # SIGTERM ends serving from inside the loop, rather than as SystemExit raised in whatever task is running
+        stopping = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+        except NotImplementedError:
+            pass  # No loop signal handlers on Windows
+        print(f"Server is listening on {self.host}:{self.port}...")
+        async with server:
+            await stopping.wait()
+
+    def start(self):
+        if self.metrics is not None:
+            start_reporting(self.metrics_snapshot, self.metrics_port, self.metrics_interval)
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.shutdown()
+
+    # Stop the handshake worker processes, so none are left behind, and finish logging
+    def shutdown(self):
+        if self.history_writer is not None:
+            self.history_writer.shutdown()
+        if self.handshake_pool is not None:
+            self.handshake_pool.shutdown()
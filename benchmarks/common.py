@@ -0,0 +1,75 @@
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Describe the machine and code version so result files can be compared later
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": None,
+    }
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    try:
+        import numpy
+        info["numpy"] = numpy.__version__
+    except ImportError:
+        pass
+    return info
+
+# Time fn and return per-call statistics in microseconds
+def time_call(fn, repeat=5, min_time=0.2):
+    timer = timeit.Timer(fn)
+    loops = 1
+    while True:
+        if timer.timeit(loops) >= min_time:
+            break
+        loops *= 2
+    samples = [t / loops * 1e6 for t in timer.repeat(repeat, loops)]
+    return {"median_us": statistics.median(samples), "min_us": min(samples), "loops": loops}
+
+# Summarize latencies given in seconds as milliseconds
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(50),
+        "p90_ms": pick(90),
+        "p99_ms": pick(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+# Allow as many sockets as the hard limit permits; child processes such as the server inherit it
+def raise_open_files_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def write_results(results, path=None):
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if path is None:
+        sys.stdout.write(text + "\n")
+        return
+    Path(path).write_text(text + "\n")
+    print(f"Wrote {path}", file=sys.stderr)
@@ -0,0 +1,38 @@
+import argparse
+import json
+
+# Flatten nested results into {"name/field": number} so two files can be lined up
+def flatten(results, prefix=""):
+    values = {}
+    if isinstance(results, dict):
+        items = results.items()
+    elif isinstance(results, list):
+        # Runs are identified by engine and client count rather than position
+        items = ((f"{run.get('engine')}-{run.get('clients')}" if isinstance(run, dict) else str(i), run)
+                 for i, run in enumerate(results))
+    else:
+        return {prefix: results} if isinstance(results, (int, float)) and not isinstance(results, bool) else {}
+    for key, value in items:
+        values.update(flatten(value, f"{prefix}/{key}" if prefix else str(key)))
+    return values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--filter", default="", help="only show entries containing this text, e.g. median_us")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    section = "results" if "results" in new else "runs"
+    old_values = flatten(old.get(section, {}))
+    new_values = flatten(new.get(section, {}))
+    for name in sorted(old_values.keys() & new_values.keys()):
+        if args.filter not in name:
+            continue
+        before, after = old_values[name], new_values[name]
+        change = f"{after / before:8.2f}x" if before else "       -"
+        print(f"{name:60} {before:14.2f} {after:14.2f} {change}")
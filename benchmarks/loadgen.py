@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import random
+import sys
+import time
+from chat_client import AsyncChatClient
+from benchmarks.common import environment, percentiles, raise_open_files_limit, write_results
+
+# Load messages read "load <send time> <padding>"; wall-clock time so several generator processes can be combined
+LOAD_PREFIX = "load "
+
+class LoadStats:
+    def __init__(self):
+        self.handshakes = []
+        self.latencies = []
+        self.active = 0
+        self.failed = 0
+        self.disconnected = 0
+        self.sent = 0
+        self.received = 0
+
+def load_message(size):
+    message = f"{LOAD_PREFIX}{time.time()!r} "
+    return message + "x" * max(0, size - len(message))
+
+# The send time embedded in a chat line, or None for other traffic such as join announcements
+def sent_at(message):
+    text = message.split(": ", 1)[-1]
+    if not text.startswith(LOAD_PREFIX):
+        return None
+    return float(text.split(" ", 2)[1])
+
+async def receive_all(client, stats):
+    try:
+        while True:
+            message = await client.receive_message()
+            if message is None:
+                break
+            stats.received += 1
+            sent = sent_at(message)
+            if sent is not None:
+                stats.latencies.append(time.time() - sent)
+    except Exception:  # Connection reset, or a record that failed to decrypt
+        pass
+    stats.disconnected += 1
+
+async def session(i, args, stats, server_keys, stop, sender):
+    client = AsyncChatClient(args.host, args.port, server_keys)
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(client.connect(), args.handshake_timeout)
+    except (OSError, asyncio.TimeoutError):
+        stats.failed += 1
+        client.close()
+        return
+    stats.handshakes.append(time.perf_counter() - start)
+    stats.active += 1
+    client.join(f"{args.name_prefix}{i}")
+    receiver = asyncio.get_running_loop().create_task(receive_all(client, stats))
+
+    interval = 1 / args.message_rate if sender and args.message_rate else None
+    try:
+        if interval is not None:
+            await asyncio.sleep(random.uniform(0, interval))  # Spread senders out instead of firing in lockstep
+            while not stop.is_set() and not receiver.done():
+                client.send_message(load_message(args.message_size))
+                stats.sent += 1
+                await client.drain()
+                await asyncio.sleep(interval)
+        await stop.wait()
+    except OSError:
+        pass
+    finally:
+        receiver.cancel()
+        stats.active -= 1
+        client.close()
+
+async def report_progress(stats, stop):
+    while not stop.is_set():
+        await asyncio.sleep(1)
+        print(f"active {stats.active:6}  failed {stats.failed:5}  sent {stats.sent:8}  received {stats.received:10}",
+              file=sys.stderr)
+
+async def generate(args):
+    stats = LoadStats()
+    server_keys = {}  # One prepared server key shared by every session
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    progress = loop.create_task(report_progress(stats, stop))
+
+    # Open sessions at the requested join rate; the first --senders of them also send messages
+    start = time.perf_counter()
+    tasks = []
+    for i in range(args.sessions):
+        if args.join_rate:
+            # Keep to the schedule even when the loop falls behind, rather than adding up sleeps
+            delay = start + i / args.join_rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(loop.create_task(session(i, args, stats, server_keys, stop, sender=i < args.senders)))
+    join_seconds = time.perf_counter() - start
+
+    await asyncio.sleep(args.duration)
+    sent, received = stats.sent, stats.received
+    measured = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*tasks, progress)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "out"},
+        "join_seconds": join_seconds,
+        "measured_seconds": measured,
+        "sessions_failed": stats.failed,
+        "sessions_dropped": stats.disconnected,  # Closed by the server before the end
+        "sent": sent,
+        "received": received,
+        "sent_per_sec": sent / measured,
+        "received_per_sec": received / measured,
+        "handshake": percentiles(stats.handshakes),
+        "delivery_latency": percentiles(stats.latencies),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open many concurrent chat sessions against a running server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--join-rate", type=float, default=100, help="new sessions per second (0 for all at once)")
+    parser.add_argument("--senders", type=int, default=10, help="how many of the sessions send messages")
+    parser.add_argument("--message-rate", type=float, default=1, help="messages per second per sender")
+    parser.add_argument("--message-size", type=int, default=64, help="characters per message")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to keep going once every session is started")
+    parser.add_argument("--handshake-timeout", type=float, default=30)
+    parser.add_argument("--name-prefix", default="load", help="usernames are this prefix plus a number")
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    results = asyncio.run(generate(args))
+    write_results({"benchmark": "loadgen", "environment": environment(), "results": results}, args.out)
@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import collections
+import socket
+import subprocess
+import sys
+import time
+from chat_client import AsyncChatClient
+from benchmarks.common import ROOT, environment, percentiles, raise_open_files_limit, write_results
+
+BENCH_PREFIX = "bench "
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Resident set size of a process in KiB, from /proc (None where that is unavailable)
+def memory_kb(pid, field="VmRSS"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+# Start server.py on a free localhost port and wait until it accepts connections; returns (process, port)
+def start_server(engine, server_args):
+    port = free_port()
+    command = [sys.executable, str(ROOT / "server.py"), "--host", "127.0.0.1", "--port", str(port),
+               "--engine", engine, *server_args]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, port
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with status {server.returncode}")
+            time.sleep(0.05)
+
+class Stats:
+    """Everything the simulated clients observe, shared by all of them."""
+
+    def __init__(self):
+        self.handshakes = []
+        self.fanout = []
+        self.delivered = 0
+        self.last_receive = time.perf_counter()
+        self.errors = 0
+        self.disconnected = 0
+
+class BenchClient(AsyncChatClient):
+    """A scripted chat client that records handshake and delivery latency."""
+
+    def __init__(self, port, stats, server_keys):
+        super().__init__("127.0.0.1", port, server_keys)
+        self.stats = stats
+        self.task = None
+        self.room = None
+        self.lost = False
+
+    async def start(self, username):
+        start = time.perf_counter()
+        await self.connect()
+        self.stats.handshakes.append(time.perf_counter() - start)
+        self.join(username)
+        self.task = asyncio.get_running_loop().create_task(self.receive())
+
+    async def receive(self):
+        try:
+            while True:
+                message = await self.receive_message()
+                if message is None:
+                    self.disconnect()
+                    return
+                now = time.perf_counter()
+                self.stats.last_receive = now
+                # Chat lines arrive as "<username>: bench <send time>"
+                text = message.split(": ", 1)[-1]
+                if text.startswith(BENCH_PREFIX):
+                    self.stats.fanout.append(now - float(text[len(BENCH_PREFIX):]))
+                    self.stats.delivered += 1
+        except OSError:
+            self.disconnect()
+        except Exception:
+            self.stats.errors += 1
+
+    # Count a connection the server dropped (e.g. with --slow-client-policy disconnect) once, from either side
+    def disconnect(self):
+        if not self.lost:
+            self.lost = True
+            self.stats.disconnected += 1
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        super().close()
+
+# Wait until no message has arrived for quiet seconds since waiting began, or timeout passes
+async def settle(stats, quiet, timeout, done=lambda: False):
+    start = time.perf_counter()
+    deadline = start + timeout
+    while time.perf_counter() < deadline and not done():
+        if time.perf_counter() - max(stats.last_receive, start) >= quiet:
+            return
+        await asyncio.sleep(0.05)
+
+async def drive(port, clients, senders, messages, rate, concurrency, timeout, handshake_timeout, rooms=1):
+    stats = Stats()
+    server_keys = {}
+    gate = asyncio.Semaphore(concurrency)
+    connected = []
+
+    async def join(i):
+        async with gate:
+            client = BenchClient(port, stats, server_keys)
+            try:
+                # A connection the server never accepts would otherwise wait forever for the public key
+                await asyncio.wait_for(client.start(f"user{i}"), handshake_timeout)
+                if rooms > 1:
+                    client.room = f"room{i % rooms}"
+                    client.send_message(f"/join {client.room}")
+                connected.append(client)
+            except (OSError, asyncio.TimeoutError):
+                stats.errors += 1
+                client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(join(i) for i in range(clients)))
+    join_time = time.perf_counter() - start
+    await settle(stats, 0.5, timeout)  # Let the join announcements drain
+    yield "connected", stats, {"join_seconds": join_time, "connected": len(connected)}
+
+    # Every sender sends its share at the requested total rate (0 for as fast as possible)
+    senders = connected[:senders]
+    interval = len(senders) / rate if rate else 0
+    room_sizes = collections.Counter(client.room for client in connected)
+    expected = sum(messages * (room_sizes[client.room] - 1) for client in senders)
+
+    async def send_all(client):
+        try:
+            for _ in range(messages):
+                client.send_message(f"{BENCH_PREFIX}{time.perf_counter()!r}")
+                if interval:
+                    await asyncio.sleep(interval)
+                else:
+                    await client.drain()
+        except OSError:  # The server dropped this sender; the others carry on
+            client.disconnect()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send_all(client) for client in senders))
+    send_time = time.perf_counter() - start
+    await settle(stats, 2.0, timeout, lambda: stats.delivered >= expected)
+    elapsed = max(stats.last_receive - start, send_time, 1e-9)
+    yield "done", stats, {
+        "send_seconds": send_time,
+        "elapsed_seconds": elapsed,
+        "sent": len(senders) * messages,
+        "expected_deliveries": expected,
+        "rooms": len(room_sizes),
+    }
+    for client in connected:
+        client.close()
+
+def run(engine, clients, senders, messages, rate, concurrency, timeout, handshake_timeout, server_args, rooms=1):
+    start = time.perf_counter()
+    server, port = start_server(engine, server_args)
+    try:
+        result = {"engine": engine, "clients": clients, "server_args": server_args,
+                  "startup_seconds": time.perf_counter() - start, "rss_idle_kb": memory_kb(server.pid)}
+
+        async def main():
+            async for phase, stats, info in drive(port, clients, senders, messages, rate, concurrency, timeout,
+                                                  handshake_timeout, rooms):
+                result.update(info)
+                if phase == "connected":
+                    result["rss_connected_kb"] = memory_kb(server.pid)
+                    result["handshake"] = percentiles(stats.handshakes)
+                    result["failed_handshakes"] = stats.errors
+                else:
+                    result["rss_end_kb"] = memory_kb(server.pid)
+                    result["rss_peak_kb"] = memory_kb(server.pid, "VmHWM")
+                    result["delivered"] = stats.delivered
+                    result["messages_per_sec"] = info["sent"] / info["elapsed_seconds"]
+                    result["deliveries_per_sec"] = stats.delivered / info["elapsed_seconds"]
+                    result["fanout"] = percentiles(stats.fanout)
+                    result["client_errors"] = stats.errors
+                    result["disconnected_clients"] = stats.disconnected
+
+        asyncio.run(main())
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start the chat server on localhost and drive simulated clients",
+                                     epilog="Arguments after -- are passed to server.py, e.g. -- --group-key")
+    parser.add_argument("--engine", nargs="+", choices=["threaded", "async"], default=["threaded"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[50], help="client counts to run, e.g. 1000 10000")
+    parser.add_argument("--senders", type=int, default=10, help="clients that send messages")
+    parser.add_argument("--messages", type=int, default=100, help="messages per sender")
+    parser.add_argument("--rate", type=float, default=0, help="total messages per second (0 for as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=64, help="handshakes in flight at once")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for each phase to settle")
+    parser.add_argument("--handshake-timeout", type=float, default=30,
+                        help="seconds before a handshake counts as failed")
+    parser.add_argument("--rooms", type=int, default=1, help="spread the clients over this many rooms")
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args, server_args = parser.parse_known_args()
+    if server_args[:1] == ["--"]:
+        server_args = server_args[1:]
+
+    raise_open_files_limit()
+    runs = []
+    for engine in args.engine:
+        for clients in args.clients:
+            print(f"{engine} engine with {clients} clients...", file=sys.stderr)
+            runs.append(run(engine, clients, args.senders, args.messages, args.rate, args.concurrency,
+                            args.timeout, args.handshake_timeout, server_args, args.rooms))
+    write_results({"benchmark": "macro", "environment": environment(), "runs": runs}, args.out)
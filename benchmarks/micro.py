@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+from Kyber_Toy_Implementation import kyberPKE, poly
+from Kyber_Toy_Implementation.kyberKEM import keygenKEM, encapsulate, decapsulate, prepareKey
+from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
+from Kyber_Toy_Implementation.optimization import cbd, expand, compressPoly, decompressPoly
+from Kyber_Toy_Implementation.utils import encode, decode
+from benchmarks.common import environment, time_call, write_results
+
+try:
+    from Kyber_Toy_Implementation import polyArray
+except ImportError:  # NumPy is not installed
+    polyArray = None
+
+BACKEND_MODULES = {"python": poly, "numpy": polyArray}
+
+# The KEM operations for one parameter set on the selected backend
+def kem_benchmarks(params):
+    pk, sk = keygenKEM(params)
+    key = prepareKey(params, pk, sk)
+    c, _ = encapsulate(pk, params)
+    return {
+        "keygenKEM": lambda: keygenKEM(params),
+        "prepareKey": lambda: prepareKey(params, pk, sk),
+        "encapsulate": lambda: encapsulate(pk, params),
+        "encapsulate[prepared]": lambda: encapsulate(key, params),
+        "decapsulate": lambda: decapsulate(c, sk, params),
+        "decapsulate[prepared]": lambda: decapsulate(c, key, params),
+    }
+
+# The building blocks underneath, on the selected backend where they have one
+def primitive_benchmarks(params):
+    k, n, q = params["k"], params["n"], params["q"]
+    backend = BACKEND_MODULES[kyberPKE.getBackend()]
+    rho = os.urandom(32)
+    a = backend.Polynomial(list(range(n)), q)
+    b = backend.Polynomial(list(range(n, 0, -1)), q)
+    t = decode(os.urandom(12 * k * n // 8), q, n, 12, k)
+    serialized = encode(t, n, 12)
+    u = backend.PolynomialVector(t.polynomials)
+    compressed = compressPoly(u, q, params["du"])
+    noise = os.urandom(64 * params["eta1"])
+    return {
+        "mulRq": lambda: a.mulRq(b, n),
+        "expand": lambda: expand(rho, k, q, n),
+        "cbd": lambda: cbd(noise, params["eta1"]),
+        "encode": lambda: encode(t, n, 12),
+        "decode": lambda: decode(serialized, q, n, 12, k),
+        "compressPoly": lambda: compressPoly(u, q, params["du"]),
+        "decompressPoly": lambda: decompressPoly(compressed, q, params["du"]),
+    }
+
+def run(param_names, backend_names, repeat, min_time, only=None):
+    results = {}
+    for backend_name in backend_names:
+        kyberPKE.setBackend(backend_name)
+        for param_name in param_names:
+            params = KYBER_PARAMS[param_name]
+            benchmarks = {**kem_benchmarks(params), **primitive_benchmarks(params)}
+            for name, fn in benchmarks.items():
+                if only and name not in only:
+                    continue
+                label = f"{param_name}/{backend_name}/{name}"
+                results[label] = time_call(fn, repeat, min_time)
+                print(f"{label:45} {results[label]['median_us']:12.1f} us", file=sys.stderr)
+    kyberPKE.setBackend("python")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the Kyber primitives")
+    parser.add_argument("--params", nargs="+", choices=list(KYBER_PARAMS), default=list(KYBER_PARAMS))
+    parser.add_argument("--backend", nargs="+", choices=["python", "numpy"],
+                        default=[name for name, module in BACKEND_MODULES.items() if module is not None])
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks, e.g. encapsulate mulRq")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing sample")
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    results = run(args.params, args.backend, args.repeat, args.min_time, args.only)
+    write_results({"benchmark": "micro", "environment": environment(), "results": results}, args.out)
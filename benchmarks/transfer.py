@@ -0,0 +1,102 @@
+import argparse
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from chat_client import ChatClient
+from transfer import WINDOW, file_digest
+from benchmarks.common import environment, write_results
+from benchmarks.macro import memory_kb, start_server
+
+class TransferClient(ChatClient):
+    """A chat client whose receiving thread queues every line, so the benchmark can wait for transfer notices."""
+
+    def __init__(self, port, username, downloads=None):
+        super().__init__("127.0.0.1", port, downloads=downloads)
+        self.connect()
+        self.join(username)
+        self.lines = queue.SimpleQueue()
+        thread = threading.Thread(target=self.receive_lines, daemon=True)
+        thread.start()
+
+    def receive_lines(self):
+        while True:
+            line = self.receive_message()
+            if line is None:
+                return
+            self.lines.put(line)
+
+    # The next line starting with one of prefixes; earlier lines are skipped
+    def wait_for(self, prefixes, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+            if line.startswith(prefixes):
+                return line
+
+# Incompressible data, like the screenshots and archives people send, written a block at a time
+def make_file(path, size):
+    with open(path, "wb") as f:
+        for offset in range(0, size, 1024 * 1024):
+            f.write(os.urandom(min(1024 * 1024, size - offset)))
+
+def run(engine, path, repeat, window, timeout, server_args):
+    size = os.path.getsize(path)
+    digest = file_digest(path)
+    server, port = start_server(engine, server_args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="chat-downloads-") as downloads:
+            sender = TransferClient(port, "sender")
+            receiver = TransferClient(port, "receiver", downloads)
+            receiver.window = window
+            time.sleep(0.2)  # Let both joins settle so the receiver's name is known
+            result = {"engine": engine, "file_bytes": size, "window_bytes": window, "server_args": server_args,
+                      "rss_idle_kb": memory_kb(server.pid), "runs": []}
+            for _ in range(repeat):
+                start = time.perf_counter()
+                sender.send_file("receiver", path)  # Hashing the file first is part of the cost
+                saved = receiver.wait_for(("Saved", "Receiving"), timeout)
+                sent = sender.wait_for(("Sent", "Sending"), timeout)
+                elapsed = time.perf_counter() - start
+                if not saved.startswith("Saved") or not sent.startswith("Sent"):
+                    raise RuntimeError(f"Transfer failed: {saved} / {sent}")
+                saved_path = saved.rsplit(" as ", 1)[1]
+                if file_digest(saved_path) != digest:
+                    raise RuntimeError("The saved file differs from the one sent")
+                os.remove(saved_path)
+                result["runs"].append({"seconds": elapsed, "mb_per_sec": size / elapsed / 1e6})
+                print(f"{engine:9} {size / 1e6:.0f} MB in {elapsed:.2f} s ({size / elapsed / 1e6:.1f} MB/s)",
+                      file=sys.stderr)
+            result["rss_end_kb"] = memory_kb(server.pid)
+            result["rss_peak_kb"] = memory_kb(server.pid, "VmHWM")
+            result["best_mb_per_sec"] = max(run["mb_per_sec"] for run in result["runs"])
+            sender.close()
+            receiver.close()
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send a file between two local clients through the chat server",
+                                     epilog="Arguments after -- are passed to server.py, e.g. -- --coalesce-ms 5")
+    parser.add_argument("--engine", nargs="+", choices=["threaded", "async"], default=["threaded", "async"])
+    parser.add_argument("--size-mb", type=int, default=100, help="size of the random file sent")
+    parser.add_argument("--file", help="send this file instead of a random one")
+    parser.add_argument("--repeat", type=int, default=3, help="transfers per engine")
+    parser.add_argument("--window", type=int, default=WINDOW, help="credit the receiving client grants, in bytes")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for each transfer")
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args, server_args = parser.parse_known_args()
+    if server_args[:1] == ["--"]:
+        server_args = server_args[1:]
+
+    with tempfile.TemporaryDirectory(prefix="chat-transfer-") as directory:
+        path = args.file
+        if path is None:
+            path = os.path.join(directory, "random.bin")
+            make_file(path, args.size_mb * 1000 * 1000)
+        runs = [run(engine, path, args.repeat, args.window, args.timeout, server_args) for engine in args.engine]
+    write_results({"benchmark": "transfer", "environment": environment(), "runs": runs}, args.out)
@@ -0,0 +1,97 @@
+import argparse
+import os
+import random
+import sys
+import time
+from AES import CLIENT, SERVER, SessionCipher
+from compression import DEFAULT_DICTIONARY, DICTIONARY_SIZE, Codec, open_body, seal_record, train_dictionary
+from framing import HEADER, MSG_CHAT, split_record
+from history import read_messages
+from benchmarks.common import environment, write_results
+
+WORDS = ("i you the to a it is and that of in for on this we be have are was with just so but not what can do "
+         "get like know think yeah lol ok good time going now about one will all when out if there up no how see "
+         "me my your they he she would could should really actually maybe sure thanks please sorry today tomorrow "
+         "meeting work build test deploy release branch merge review fixed broken issue ticket server client "
+         "message chat room channel key handshake latency queue thread worker log history").split()
+
+# Seeded chat lines shaped like a busy room: Zipf-ish word choice, varied lengths and some join and leave notices
+def synthetic_messages(count, seed=1):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    users = [f"user{i}" for i in range(1, 41)]
+    messages = []
+    for _ in range(count):
+        user = rng.choice(users)
+        if rng.random() < 0.05:
+            messages.append(f"{user} has {rng.choice(('joined', 'left'))} the chat!".encode())
+            continue
+        words = rng.choices(WORDS, weights, k=rng.randint(1, 25))
+        messages.append(f"{user}: {' '.join(words)}".encode())
+    return messages
+
+# Every message in a server's --history-dir, or one worker's, oldest first within each room
+def history_messages(directory):
+    messages = []
+    for room in sorted(os.listdir(directory)):
+        if os.path.isdir(os.path.join(directory, room)):
+            messages.extend(read_messages(os.path.join(directory, room)))
+    return messages
+
+# Wire size and CPU cost per message of sending and receiving messages with one codec, or raw without one
+def measure(messages, codec, repeat):
+    key = os.urandom(32)
+    send_times, receive_times = [], []
+    for _ in range(repeat):
+        sender, receiver = SessionCipher(key, SERVER), SessionCipher(key, CLIENT)
+        start = time.perf_counter()
+        records = [seal_record(MSG_CHAT, sender, data, codec.compress(data) if codec is not None else None)
+                   for data in messages]
+        send_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for record in records:
+            kind, body = split_record(record[HEADER.size:])
+            open_body(kind, body, receiver.open, codec)
+        receive_times.append(time.perf_counter() - start)
+    plaintext = sum(map(len, messages))
+    wire = sum(map(len, records))
+    return {
+        "plaintext_bytes_per_message": plaintext / len(messages),
+        "wire_bytes_per_message": wire / len(messages),
+        "compressed_fraction": sum(1 for record in records if record[HEADER.size] != MSG_CHAT) / len(records),
+        "send_us_per_message": min(send_times) / len(messages) * 1e6,
+        "receive_us_per_message": min(receive_times) / len(messages) * 1e6,
+    }
+
+def run(messages, dictionary_size, repeat):
+    # Train on the first half and measure on the second, so the trained dictionary never sees the test messages
+    half = len(messages) // 2
+    training, test = messages[:half], messages[half:]
+    codecs = {
+        "off": None,
+        "deflate": Codec(b""),
+        "default_dictionary": Codec(DEFAULT_DICTIONARY),
+        "trained_dictionary": Codec(train_dictionary(training, dictionary_size)),
+    }
+    results = {}
+    for name, codec in codecs.items():
+        results[name] = measure(test, codec, repeat)
+        results[name]["wire_ratio"] = results[name]["wire_bytes_per_message"] / results["off"]["wire_bytes_per_message"]
+        print(f"{name:20} {results[name]['wire_bytes_per_message']:7.1f} B/msg ({results[name]['wire_ratio']:.2f}x)"
+              f"  send {results[name]['send_us_per_message']:6.1f} us"
+              f"  receive {results[name]['receive_us_per_message']:6.1f} us", file=sys.stderr)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes on the wire and CPU per chat message, compressed or not")
+    parser.add_argument("--history-dir", help="use the messages in this --history-dir instead of synthetic chat")
+    parser.add_argument("--messages", type=int, default=20000, help="synthetic messages to generate")
+    parser.add_argument("--dictionary-size", type=int, default=DICTIONARY_SIZE, help="bytes in the trained dictionary")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    messages = history_messages(args.history_dir) if args.history_dir else synthetic_messages(args.messages)
+    results = run(messages, args.dictionary_size, args.repeat)
+    write_results({"benchmark": "wire", "environment": environment(), "corpus": len(messages),
+                   "results": results}, args.out)
@@ -0,0 +1,284 @@
+import asyncio
+import itertools
+import os
+import socket
+import threading
+from collections import deque
+from AES import CLIENT, SessionCipher
+from compression import open_body, seal_record
+from framing import (COMPRESSED, HELLO_COMPRESS, HELLO_KEM, HELLO_RESUME, MSG_BATCH, MSG_CHAT, MSG_FILE,
+                     MSG_GROUP_KEY, MSG_GROUP_CHAT, MSG_HISTORY, MSG_TICKET, FrameReader, encode_frame, encode_record,
+                     read_frame, send_frame, split_batch, split_record)
+from group_key import GroupKeyring
+from resumption import NONCE_SIZE, resumed_session_key, resumption_secret
+from transfer import (FILE_ACCEPT, FILE_CANCEL, FILE_CHUNK, FILE_CREDIT, FILE_OFFER, WINDOW, IncomingFile,
+                      OutgoingFile, encode_close, file_digest, parse)
+from Kyber_Toy_Implementation.kyberKEM import encapsulate, prepareKey
+from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
+
+SERVER_KEYS_KEPT = 4
+
+class _Session:
+    """Handshake and record handling shared by the blocking and asyncio clients."""
+
+    def __init__(self, host, port, server_keys=None, ticket=None, codec=None, downloads=None):
+        self.host = host
+        self.port = port
+        self.cipher = None  # Session cipher for the shared key, set by the key exchange
+        # (ticket, resumption secret) from an earlier session; pass a closed client's ticket to resume without Kyber
+        self.ticket = ticket
+        self.client_nonce = None
+        self.resumed = False
+        # compression.Codec to offer the server; None after the handshake unless the server agreed to use it
+        self.codec = codec
+        self.group_keys = GroupKeyring(CLIENT)  # Room keys, if the server runs in group-key mode
+        self.params = KYBER_PARAMS["kyber1024"]
+        # Prepared server public keys by their bytes; pass one dict to many sessions to prepare each key once
+        self.server_keys = {} if server_keys is None else server_keys
+        self.inbox = deque()  # Messages opened but not yet returned, when a batch carried several
+        # Files offered by others are saved in downloads, or declined without it
+        self.downloads = downloads
+        self.window = WINDOW  # Credit granted to each sender, i.e. the most bytes of one file in flight
+        self.transfer_ids = itertools.count(1)
+        self.sending = {}  # Transfer id -> OutgoingFile
+        self.receiving = {}  # Transfer id the server gave -> IncomingFile
+
+    # The opening handshake frame: the dictionary to compress with and a ticket to resume with, if there are any
+    def _hello(self):
+        kind = HELLO_KEM if self.ticket is None else HELLO_RESUME
+        offer = b""
+        if self.codec is not None:
+            kind |= HELLO_COMPRESS
+            offer = self.codec.dictionary_id
+        if self.ticket is None:
+            return bytes([kind]) + offer
+        self.client_nonce = os.urandom(NONCE_SIZE)
+        return bytes([kind]) + offer + self.client_nonce + self.ticket[0]
+
+    # Act on the server's reply to the hello; returns the ciphertext to send back, or None if the session resumed
+    def _handshake(self, frame):
+        kind, body = split_record(frame)
+        if not kind & HELLO_COMPRESS:
+            self.codec = None
+        kind &= ~HELLO_COMPRESS
+        secret = self.ticket[1] if self.ticket is not None else None
+        self.ticket = None  # Tickets are single use; the server sends a new one either way
+        if kind == HELLO_RESUME:
+            self.cipher = SessionCipher(resumed_session_key(secret, self.client_nonce, bytes(body)), CLIENT)
+            self.resumed = True
+            return None
+        return self._encapsulate(bytes(body))
+
+    # Encapsulate to the server's public key and return the ciphertext to send back
+    def _encapsulate(self, serverPublicKey):
+        serverKey = self.server_keys.get(serverPublicKey)
+        if serverKey is None:
+            serverKey = self.server_keys[serverPublicKey] = prepareKey(self.params, serverPublicKey)
+            while len(self.server_keys) > SERVER_KEYS_KEPT:
+                del self.server_keys[next(iter(self.server_keys))]
+        ciphertext, sharedKey = encapsulate(serverKey, self.params)
+        self.cipher = SessionCipher(sharedKey, CLIENT)
+        return ciphertext
+
+    def _chat_record(self, message):
+        data = message.encode()
+        return seal_record(MSG_CHAT, self.cipher, data, self.codec.compress(data) if self.codec is not None else None)
+
+    def _file_record(self, message):
+        return encode_record(MSG_FILE, self.cipher.seal(message))
+
+    # Offer a file to another user; its chunks go out as the recipient grants credit, while messages are received
+    def _offer_file(self, username, path, digest):
+        transfer = OutgoingFile(next(self.transfer_ids), path, digest, username)
+        self.sending[transfer.id] = transfer
+        self._send(self._file_record, transfer.offer())
+        return transfer
+
+    # Act on a file transfer message; returns a line for the user when a transfer starts or ends, otherwise None
+    def _on_file(self, data):
+        kind, transfer_id, fields = parse(data)
+        if kind == FILE_OFFER:
+            return self._receive_offer(transfer_id, *fields)
+        if kind in (FILE_CHUNK, FILE_CANCEL):
+            transfer = self.receiving.get(transfer_id)
+            if transfer is None:
+                return None  # Already closed, e.g. chunks that were in flight
+            try:
+                reply = transfer.write(*fields) if kind == FILE_CHUNK else transfer.cancel(*fields)
+            except OSError as e:
+                reply = transfer.fail(e)  # Ends this transfer only; chat and other transfers go on
+            if reply is not None:
+                self._send(self._file_record, reply)
+            if transfer.result is None:
+                return None
+            del self.receiving[transfer_id]
+            return transfer.summary()
+        transfer = self.sending.get(transfer_id)
+        if transfer is None:
+            return None
+        if kind == FILE_ACCEPT:
+            transfer.accept(*fields)
+        elif kind == FILE_CREDIT:
+            transfer.credit += fields[0]
+        else:
+            transfer.close(*fields)
+        messages = transfer.chunks()
+        while True:
+            try:
+                message = next(messages, None)
+            except OSError as e:
+                message = transfer.fail(e)  # Ends this transfer only; the generator is done after raising
+            if message is None:
+                break
+            self._send(self._file_record, message)
+        if transfer.result is None:
+            return None
+        del self.sending[transfer_id]
+        return transfer.summary()
+
+    def _receive_offer(self, transfer_id, size, digest, sender, name):
+        if self.downloads is None:
+            self._send(self._file_record, encode_close(transfer_id, "Not accepting files"))
+            return f"{sender} offered you {name}; connect with a downloads directory to accept files"
+        if any(transfer.digest == digest for transfer in self.receiving.values()):
+            self._send(self._file_record, encode_close(transfer_id, "Already receiving this file"))
+            return None
+        try:
+            os.makedirs(self.downloads, exist_ok=True)
+            transfer = IncomingFile(transfer_id, self.downloads, size, digest, sender, name, self.window)
+        except OSError as e:
+            self._send(self._file_record, encode_close(transfer_id, f"Could not save the file: {e.strerror}"))
+            return f"Could not save {name} from {sender}: {e}"
+        try:
+            reply = transfer.start()
+        except OSError as e:
+            reply = transfer.fail(e)
+        self._send(self._file_record, reply)
+        if transfer.result is None:
+            self.receiving[transfer_id] = transfer
+        return transfer.summary()
+
+    # Chat text carried by a record, or a line about a file transfer; None for control records such as group keys
+    def _open_record(self, frame):
+        kind, body = split_record(frame)
+        if kind == MSG_FILE:
+            return self._on_file(self.cipher.open(body))
+        if kind == MSG_GROUP_KEY:
+            self.group_keys.add(body, self.cipher)
+            return None
+        if kind == MSG_TICKET:
+            self.ticket = (self.cipher.open(body), resumption_secret(self.cipher.key))
+            return None
+        if kind & ~COMPRESSED == MSG_GROUP_CHAT:
+            return open_body(kind, body, self.group_keys.open, self.codec).decode()
+        return open_body(kind, body, self.cipher.open, self.codec).decode()
+
+    # Queue the chat text carried by a frame; a batch record from a coalescing server carries several records,
+    # and a history record replays many earlier messages of the room just entered
+    def _open_frame(self, frame):
+        kind, body = split_record(frame)
+        for record in split_batch(body) if kind == MSG_BATCH else (frame,):
+            kind, body = split_record(record)
+            if kind & ~COMPRESSED == MSG_HISTORY:
+                history = open_body(kind, body, self.cipher.open, self.codec)
+                self.inbox.extend(message.decode() for message in split_batch(history))
+                continue
+            message = self._open_record(record)
+            if message is not None:
+                self.inbox.append(message)
+
+class ChatClient(_Session):
+    """Headless chat client over a blocking socket."""
+
+    def __init__(self, host="192.168.20.29", port=5555, server_keys=None, ticket=None, codec=None, downloads=None):
+        super().__init__(host, port, server_keys, ticket, codec, downloads)
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.reader = FrameReader(self.client)  # Reassembles length-prefixed frames from the stream
+        self.send_lock = threading.Lock()
+
+    # Connect and run the key exchange; returns the server's username prompt
+    def connect(self):
+        self.client.connect((self.host, self.port))
+        send_frame(self.client, self._hello())
+        ciphertext = self._handshake(self.reader.recv_frame())
+        if ciphertext is not None:
+            send_frame(self.client, ciphertext)
+        return self.receive_message()
+
+    def join(self, username):
+        self.send_message(username)
+
+    def send_message(self, message):
+        self._send(self._chat_record, message)
+
+    # Offer a file after hashing it; returns the OutgoingFile, whose result is set once the transfer ends.
+    # The chunks are sent by whichever thread is in receive_message
+    def send_file(self, username, path):
+        return self._offer_file(username, path, file_digest(path))
+
+    # Seal and send under one lock, so records sent from the receiving thread, such as file chunks and credit,
+    # and from any other thread still leave in the order of their nonces
+    def _send(self, seal, message):
+        with self.send_lock:
+            self.client.sendall(seal(message))
+
+    # Block until the next chat message arrives; None once the server has closed the connection
+    def receive_message(self):
+        while not self.inbox:
+            frame = self.reader.recv_frame()
+            if frame is None:
+                return None
+            self._open_frame(frame)
+        return self.inbox.popleft()
+
+    def close(self):
+        self.client.close()
+
+class AsyncChatClient(_Session):
+    """Headless chat client on asyncio streams, for driving many sessions from one process."""
+
+    def __init__(self, host="192.168.20.29", port=5555, server_keys=None, ticket=None, codec=None, downloads=None):
+        super().__init__(host, port, server_keys, ticket, codec, downloads)
+        self.reader = None
+        self.writer = None
+
+    # Connect and run the key exchange; returns the server's username prompt
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(encode_frame(self._hello()))
+        ciphertext = self._handshake(await read_frame(self.reader))
+        if ciphertext is not None:
+            self.writer.write(encode_frame(ciphertext))
+        return await self.receive_message()
+
+    def join(self, username):
+        self.send_message(username)
+
+    # Queue a message on the stream; await drain() to wait for the socket to catch up
+    def send_message(self, message):
+        self._send(self._chat_record, message)
+
+    # Offer a file after hashing it off the loop; returns the OutgoingFile, whose result is set once the
+    # transfer ends. The chunks are written while receive_message runs
+    async def send_file(self, username, path):
+        digest = await asyncio.get_running_loop().run_in_executor(None, file_digest, path)
+        return self._offer_file(username, path, digest)
+
+    def _send(self, seal, message):
+        self.writer.write(seal(message))
+
+    async def drain(self):
+        await self.writer.drain()
+
+    # Wait for the next chat message; None once the server has closed the connection
+    async def receive_message(self):
+        while not self.inbox:
+            frame = await read_frame(self.reader)
+            if frame is None:
+                return None
+            self._open_frame(frame)
+        return self.inbox.popleft()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
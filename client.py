@@ -1,42 +1,32 @@
-import socket
+import argparse
+import os
+import queue
 import threading
 import tkinter as tk
 from tkinter.scrolledtext import ScrolledText
-from AES import encrypt_message, decrypt_message
-from Kyber_Toy_Implementation.kyberKEM import encapsulate
-from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
-
-class Client:
-    def __init__(self, host="192.168.20.29", port=5555):
-        self.host = host
-        self.port = port
-        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sharedKey = None
-        self.params = KYBER_PARAMS["kyber1024"]
-
-    def connect(self):
-        self.client.connect((self.host, self.port))
-        self.key_exchange()
-        username_prompt = decrypt_message(self.client.recv(4096), self.sharedKey)
-        username = input(username_prompt + " ")
-        self.client.sendall(encrypt_message(username, self.sharedKey))
-
-    def send_message(self, message):
-        encrypted_message = encrypt_message(message, self.sharedKey)
-        self.client.sendall(encrypted_message)
-
-    def key_exchange(self):
-        serverPublicKey = self.client.recv(4096)
-        ciphertext, self.sharedKey = encapsulate(serverPublicKey, self.params)
-        self.client.sendall(ciphertext)
+from chat_client import ChatClient
+from compression import DEFAULT_DICTIONARY, Codec, load_dictionary
+from transfer import file_command
+
+SCROLLBACK_LINES = 5000
+REFRESH_MS = 50
+
+class Client(ChatClient):
+    """Tkinter front end on top of the headless ChatClient."""
+
+    def __init__(self, host="192.168.20.29", port=5555, scrollback=SCROLLBACK_LINES, codec=None, downloads=None):
+        super().__init__(host, port, codec=codec, downloads=downloads)
+        # Lines waiting for the Tk thread; Tk widgets may only be touched from the thread running mainloop
+        self.incoming = queue.SimpleQueue()
+        self.scrollback = scrollback  # Oldest lines are trimmed past this many
+        self.chat_display = None
 
     def receive_messages(self):
         while True:
             try:
-                encrypted_message = self.client.recv(4096)
-                if not encrypted_message:
+                message = self.receive_message()
+                if message is None:
                     break
-                message = decrypt_message(encrypted_message, self.sharedKey)
                 self.display_message(message)
             except Exception as e:
                 error_message = f"Error receiving message or disconnected: {e}"
@@ -44,19 +34,52 @@ class Client:
                 self.display_message(error_message)
                 break
 
+    # Hash and offer a file off the Tk thread; the receiving thread then sends its chunks and reports how it ends
+    def offer_file(self, username, path):
+        try:
+            transfer = self.send_file(username, os.path.expanduser(path))
+        except OSError as e:
+            self.display_message(f"Could not send {path}: {e.strerror}")
+            return
+        self.display_message(transfer.summary())
+
+    # Safe to call from any thread; the line appears on the next refresh
     def display_message(self, message):
-        self.chat_display.configure(state=tk.NORMAL)
-        self.chat_display.insert(tk.END, message + "\n")
-        self.chat_display.configure(state=tk.DISABLED)
-        self.chat_display.see(tk.END)
+        self.incoming.put(message)
+
+    # Runs on the Tk thread every REFRESH_MS and inserts everything queued since the last run in one go
+    def refresh_display(self):
+        lines = []
+        try:
+            while True:
+                lines.append(self.incoming.get_nowait())
+        except queue.Empty:
+            pass
+        if lines:
+            lines = lines[-self.scrollback:]  # Lines that would be trimmed straight away are never inserted
+            at_bottom = self.chat_display.yview()[1] >= 1.0  # Don't yank the view away from someone scrolled back
+            self.chat_display.configure(state=tk.NORMAL)
+            self.chat_display.insert(tk.END, "\n".join(lines) + "\n")
+            excess = int(self.chat_display.index("end-1c").split(".")[0]) - 1 - self.scrollback
+            if excess > 0:
+                self.chat_display.delete("1.0", f"{excess + 1}.0")
+            self.chat_display.configure(state=tk.DISABLED)
+            if at_bottom:
+                self.chat_display.see(tk.END)
+        self.chat_display.after(REFRESH_MS, self.refresh_display)
 
     def start_gui(self):
 
         def send_message(event=None):
             message = input_field.get()
             if message.strip():
-                self.send_message(message)
-                self.display_message(f"You: {message}")
+                command = file_command(message)
+                if command is not None:
+                    thread = threading.Thread(target=self.offer_file, args=command, daemon=True)
+                    thread.start()
+                else:
+                    self.send_message(message)
+                    self.display_message(f"You: {message}")
                 input_field.delete(0, tk.END)
 
         root = tk.Tk()
@@ -89,14 +112,33 @@ class Client:
                                 font=("Helvetica", 10, "bold"), activebackground="#D64343", bd=0)
         exit_button.place(x=420, y=20)
 
+        self.refresh_display()
         thread = threading.Thread(target=self.receive_messages, daemon=True)
         thread.start()
 
         root.mainloop()
 
     def start(self):
-        self.connect()
+        username_prompt = self.connect()
+        self.join(input(username_prompt + " "))
         self.start_gui()
 
-client = Client()
-client.start()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encrypted chat client")
+    parser.add_argument("--host", default="192.168.20.29")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--scrollback", type=int, default=SCROLLBACK_LINES,
+                        help="chat lines kept in the window before the oldest are trimmed")
+    parser.add_argument("--compress", action="store_true",
+                        help="offer to deflate chat with the built-in dictionary")
+    parser.add_argument("--compress-dictionary",
+                        help="offer to deflate chat with this dictionary; it must match the server's")
+    parser.add_argument("--downloads",
+                        help="save files other users send with /send in this directory; without it they are declined")
+    args = parser.parse_args()
+
+    codec = None
+    if args.compress or args.compress_dictionary:
+        codec = Codec(load_dictionary(args.compress_dictionary) if args.compress_dictionary else DEFAULT_DICTIONARY)
+    client = Client(args.host, args.port, args.scrollback, codec, args.downloads)
+    client.start()
@@ -0,0 +1,167 @@
+import argparse
+import collections
+import hashlib
+import os
+import zlib
+from framing import COMPRESSED, HELLO_COMPRESS, MAX_FRAME_SIZE, encode_record
+from history import read_messages
+
+MIN_SIZE = 24  # Shorter payloads are sent raw; deflate rarely saves more than it costs on them
+LEVEL = 6
+MEM_LEVEL = 1  # A new compressor per message; a small hash table makes it several times cheaper to set up
+BULK_SIZE = 4096  # From this size on, e.g. history replays, a full hash table pays for itself in speed and ratio
+BULK_MEM_LEVEL = 8
+WBITS = -15  # Raw deflate: GCM already authenticates, so the zlib header and checksum are dead weight
+DICTIONARY_SIZE = 4 * 1024  # Past this, setting up each message's compressor costs more than the bytes it saves
+DICTIONARY_ID_SIZE = 4
+
+# Phrases every server sends and common chat words, for sessions without a trained dictionary;
+# deflate reaches the end of a dictionary most cheaply, so the most common text comes last
+DEFAULT_DICTIONARY = (
+    b"Room names are 1 to 32 letters, digits, - or _ Enter your username: "
+    b"thanks sorry please maybe tomorrow today tonight morning meeting everyone anyone someone something "
+    b"really actually probably should would could about after before again still already never always "
+    b"where which there their these those other because though through right think thing going doing "
+    b"what when with from have this that they them then than will just like know good time work here "
+    b"yeah okay sure lol haha nice cool great thank you are the and for not but can get see has left "
+    b"has joined the chat! has left the chat. has joined lobby. has left lobby. : "
+)
+
+def dictionary_id(dictionary):
+    return hashlib.sha256(dictionary).digest()[:DICTIONARY_ID_SIZE]
+
+def load_dictionary(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """Builds a preset deflate dictionary from sample messages, e.g. a room's history.
+
+    Words and runs of up to three words are scored by how many bytes their repeats would
+    save, and the best are packed until the dictionary is full, best last.
+
+    Args:
+        samples (list): Messages as bytes.
+        size (int): Most bytes in the dictionary.
+
+    Returns:
+        bytes: The dictionary.
+    """
+    counts = collections.Counter()
+    for sample in samples:
+        words = sample.split(b" ")
+        for n in (1, 2, 3):
+            for i in range(len(words) - n + 1):
+                gram = b" ".join(words[i:i + n]) + b" "
+                if len(gram) > 3:
+                    counts[gram] += 1
+    chosen = []
+    packed = bytearray()
+    for gram, count in sorted(counts.items(), key=lambda item: (item[1] - 1) * len(item[0]), reverse=True):
+        if count < 2 or len(packed) + len(gram) > size or gram in packed:
+            continue  # Rare, too big for what is left, or already inside a longer run
+        chosen.append(gram)
+        packed += gram
+    return b"".join(reversed(chosen))
+
+class Codec:
+    """Deflate with a preset dictionary, one independent stream per message.
+
+    Independent streams keep every record self-contained, so one compressed broadcast can
+    be sealed for every member and dropped records never break the ones after them. The
+    dictionary stands in for the context a single short message lacks.
+    """
+
+    def __init__(self, dictionary=DEFAULT_DICTIONARY, min_size=MIN_SIZE, level=LEVEL):
+        self.dictionary = bytes(dictionary[-32 * 1024:])  # Deflate only looks 32 KiB back
+        self.dictionary_id = dictionary_id(self.dictionary)
+        self.min_size = min_size
+        self.level = level
+
+    # The deflated form of data, or None if it is too short or would not shrink
+    def compress(self, data):
+        if len(data) < self.min_size:
+            return None
+        memLevel = MEM_LEVEL if len(data) < BULK_SIZE else BULK_MEM_LEVEL
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, WBITS, memLevel, zdict=self.dictionary)
+        packed = compressor.compress(data) + compressor.flush()
+        return packed if len(packed) < len(data) else None
+
+    def decompress(self, packed, max_size=MAX_FRAME_SIZE):
+        """Inflates the output of compress.
+
+        Raises:
+            ValueError: If the data is not one complete stream or inflates past max_size.
+        """
+        decompressor = zlib.decompressobj(WBITS, zdict=self.dictionary)
+        try:
+            data = decompressor.decompress(packed, max_size)
+        except zlib.error as e:
+            raise ValueError(f"Bad compressed payload: {e}") from None
+        if not decompressor.eof or decompressor.unconsumed_tail or decompressor.unused_data:
+            raise ValueError("Compressed payload is truncated, too large or has trailing data")
+        return data
+
+# Split a client hello's compression offer off; returns (hello kind, rest of the hello, codec or None to send raw)
+def accept_offer(kind, hello, codec):
+    if not kind & HELLO_COMPRESS:
+        return kind, hello, None
+    offered, hello = bytes(hello[:DICTIONARY_ID_SIZE]), hello[DICTIONARY_ID_SIZE:]
+    accepted = codec if codec is not None and offered == codec.dictionary_id else None
+    return kind & ~HELLO_COMPRESS, hello, accepted
+
+# The flag is authenticated as associated data, so a flipped bit fails to open instead of inflating raw text
+def associated_data(kind):
+    return bytes([kind]) if kind & COMPRESSED else b""
+
+# A record of kind sealed with cipher, flagged and holding packed instead if the data was compressed
+def seal_record(kind, cipher, data, packed=None):
+    if packed is not None:
+        kind |= COMPRESSED
+        data = packed
+    return encode_record(kind, cipher.seal(data, associated_data(kind)))
+
+# Seal several (data, packed or None) pairs for one client as seal_record would, with one counter reservation
+def seal_records(kind, cipher, pairs):
+    kinds = [kind | COMPRESSED if packed is not None else kind for _, packed in pairs]
+    sealed = cipher.seal_many([data if packed is None else packed for data, packed in pairs],
+                              [associated_data(k) for k in kinds])
+    return [encode_record(k, body) for k, body in zip(kinds, sealed)]
+
+def open_body(kind, body, open_sealed, codec):
+    """Opens the body of a record as received, inflating it if its type is flagged.
+
+    Args:
+        kind (int): The record type byte, flag included.
+        body (bytes): The sealed body.
+        open_sealed (callable): Opens a sealed body given the associated data, e.g. SessionCipher.open.
+        codec (Codec): The session's codec, or None if it did not negotiate compression.
+
+    Raises:
+        ValueError: If the body fails to open or inflate, or is compressed without a codec.
+    """
+    data = open_sealed(body, associated_data(kind))
+    if not kind & COMPRESSED:
+        return data
+    if codec is None:
+        raise ValueError("Compressed record on a session without compression")
+    return codec.decompress(data)
+
+# Train a dictionary from a server's history log, for --compress-dictionary on the server and clients
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a chat compression dictionary from history logs")
+    parser.add_argument("--history-dir", required=True, help="a server's --history-dir, or one worker's")
+    parser.add_argument("--out", required=True, help="write the dictionary here")
+    parser.add_argument("--size", type=int, default=DICTIONARY_SIZE, help="most bytes in the dictionary")
+    parser.add_argument("--messages", type=int, default=20000, help="latest messages used from each room")
+    args = parser.parse_args()
+
+    samples = []
+    for room in sorted(os.listdir(args.history_dir)):
+        directory = os.path.join(args.history_dir, room)
+        if os.path.isdir(directory):
+            samples.extend(collections.deque(read_messages(directory), maxlen=args.messages))
+    dictionary = train_dictionary(samples, args.size)
+    with open(args.out, "wb") as f:
+        f.write(dictionary)
+    print(f"Wrote a {len(dictionary)} byte dictionary trained on {len(samples)} messages to {args.out}")
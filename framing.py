@@ -0,0 +1,122 @@
+import asyncio
+import struct
+from collections import deque
+
+# Every record on the wire is a 4-byte big-endian length followed by the payload
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+RECV_SIZE = 65536
+
+# After the Kyber handshake every frame starts with one of these record types
+MSG_CHAT = 0         # UTF-8 text sealed with the pairwise SessionCipher
+MSG_GROUP_KEY = 1    # 4-byte key id and 32-byte group key sealed with the pairwise SessionCipher
+MSG_GROUP_CHAT = 2   # 4-byte key id followed by UTF-8 text sealed with that group key
+MSG_BATCH = 3        # Several complete frames of the types above, packed by a coalescing writer
+MSG_TICKET = 4       # Resumption ticket sealed with the pairwise SessionCipher
+MSG_HISTORY = 5      # Earlier messages of a room as frames of UTF-8 text, sealed together with the SessionCipher
+MSG_FILE = 6         # A file transfer message sealed with the pairwise SessionCipher, see transfer.py
+COMPRESSED = 0x80    # Flag on a chat, group chat or history type: the sealed body is deflated, see compression.py
+
+# The handshake opens with a client hello and the server's reply, each starting with one of these
+HELLO_KEM = 0     # Client: no ticket. Server: the Kyber public key follows, answer with a ciphertext
+HELLO_RESUME = 1  # Client: nonce and ticket follow. Server: ticket accepted, its nonce follows
+HELLO_COMPRESS = 0x80  # Flag on either hello. Client: a 4-byte dictionary id comes first. Server: compression is on
+
+class FrameError(Exception):
+    pass
+
+def encode_frame(payload):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return HEADER.pack(len(payload)) + payload
+
+def send_frame(sock, payload):
+    sock.sendall(encode_frame(payload))
+
+def encode_record(kind, body):
+    return encode_frame(bytes([kind]) + body)
+
+def send_record(sock, kind, body):
+    sock.sendall(encode_record(kind, body))
+
+# Split a post-handshake frame into its record type and body
+def split_record(frame):
+    if not frame:
+        raise FrameError("Empty record")
+    return frame[0], frame[1:]
+
+# Pack encoded records into as few batch records as fit in max_bytes each; a lone record is left as it is
+def encode_batches(records, max_bytes):
+    max_bytes = min(max_bytes, MAX_FRAME_SIZE - 1)
+    batches = []
+    group = []
+    size = 0
+    for record in records:
+        if group and size + len(record) > max_bytes:
+            batches.append(group[0] if len(group) == 1 else encode_record(MSG_BATCH, b"".join(group)))
+            group = []
+            size = 0
+        group.append(record)
+        size += len(record)
+    if group:
+        batches.append(group[0] if len(group) == 1 else encode_record(MSG_BATCH, b"".join(group)))
+    return batches
+
+# Split the body of a batch record back into the frames it carries
+def split_batch(body):
+    decoder = FrameDecoder()
+    frames = decoder.feed(body)
+    if decoder.buffer:
+        raise FrameError("Batch record ends in a partial frame")
+    return frames
+
+class FrameDecoder:
+    """Incrementally reassembles frames from arbitrarily split or coalesced chunks."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    # Add received bytes and return every frame they complete
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                raise FrameError(f"Incoming frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+            end = offset + HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            frames.append(bytes(self.buffer[offset + HEADER.size:end]))
+            offset = end
+        del self.buffer[:offset]
+        return frames
+
+class FrameReader:
+    """Reads whole frames from a blocking socket; one recv may yield many frames."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.frames = deque()
+
+    # Return the next frame, or None once the peer has closed the connection
+    def recv_frame(self):
+        while not self.frames:
+            data = self.sock.recv(RECV_SIZE)
+            if not data:
+                return None
+            self.frames.extend(self.decoder.feed(data))
+        return self.frames.popleft()
+
+async def read_frame(reader):
+    """Reads the next frame from an asyncio StreamReader, or None at end of stream."""
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        if length > MAX_FRAME_SIZE:
+            raise FrameError(f"Incoming frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
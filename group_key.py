@@ -0,0 +1,56 @@
+import itertools
+import os
+from AES import SERVER, SessionCipher
+from compression import associated_data
+from framing import COMPRESSED, MSG_GROUP_KEY, MSG_GROUP_CHAT, encode_record
+
+KEY_ID_SIZE = 4
+
+# Shared by every room's key, so a client moving between rooms never holds two keys with one id
+_key_ids = itertools.count(1)
+
+class GroupKey:
+    """Server side of the shared room key used to encrypt each broadcast once."""
+
+    def __init__(self):
+        self.key_id = 0
+        self.key = None
+        self.cipher = None
+        self.rotate()
+
+    # Replace the room key, e.g. whenever someone joins or leaves
+    def rotate(self):
+        self.key_id = next(_key_ids) % 2**32
+        self.key = os.urandom(32)
+        self.cipher = SessionCipher(self.key, SERVER)
+
+    # The current key, sealed for one client with its pairwise session cipher
+    def key_record(self, cipher):
+        return encode_record(MSG_GROUP_KEY, cipher.seal(self.key_id.to_bytes(KEY_ID_SIZE, "big") + self.key))
+
+    # Encrypt a broadcast once; the same record is sent to every member. Flag it if the message is compressed
+    def seal(self, message, compressed=False):
+        kind = MSG_GROUP_CHAT | COMPRESSED if compressed else MSG_GROUP_CHAT
+        return encode_record(kind, self.key_id.to_bytes(KEY_ID_SIZE, "big") +
+                             self.cipher.seal(message, associated_data(kind)))
+
+class GroupKeyring:
+    """Client side: keeps ciphers for the most recent room keys received from the server."""
+
+    def __init__(self, role, keep=4):
+        self.ciphers = {}
+        self.role = role
+        self.keep = keep
+
+    def add(self, body, cipher):
+        data = cipher.open(body)
+        key_id = int.from_bytes(data[:KEY_ID_SIZE], "big")
+        self.ciphers[key_id] = SessionCipher(data[KEY_ID_SIZE:], self.role)
+        while len(self.ciphers) > self.keep:
+            del self.ciphers[next(iter(self.ciphers))]
+
+    def open(self, body, associated_data=b""):
+        key_id = int.from_bytes(body[:KEY_ID_SIZE], "big")
+        if key_id not in self.ciphers:
+            raise KeyError(f"Unknown group key {key_id}")
+        return self.ciphers[key_id].open(body[KEY_ID_SIZE:], associated_data)
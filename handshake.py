@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from Kyber_Toy_Implementation.kyberKEM import decapsulate, decapsulateBatch, prepareKey
+from Kyber_Toy_Implementation.kyberPKE import getBackend, setBackend
+
+# Workers start from a fresh forkserver (or spawned) process, never by forking a server whose threads may hold locks
+_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                                       else "spawn")
+
+# Per-worker server key, prepared once when the worker process starts
+_worker_key = None
+_worker_params = None
+
+def _init_worker(publicKey, privateKey, params, backend):
+    global _worker_key, _worker_params
+    setBackend(backend)
+    _worker_key = prepareKey(params, publicKey, privateKey)
+    _worker_params = params
+
+def _ready():
+    pass
+
+def _decapsulate(ciphertext):
+    return decapsulate(ciphertext, _worker_key, _worker_params)
+
+class HandshakePool:
+    """Runs Kyber decapsulations in worker processes that each hold the server key, using this process's backend."""
+
+    def __init__(self, publicKey, privateKey, params, workers=None):
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=_CONTEXT, initializer=_init_worker,
+                                            initargs=(publicKey, privateKey, params, getBackend()))
+        # Start every worker now, so the first handshakes don't wait for fresh interpreters to start and a worker
+        # that cannot load the key fails the server at startup
+        for future in [self.executor.submit(_ready) for _ in range(workers or os.cpu_count() or 1)]:
+            future.result()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    # Queue a ciphertext without blocking; the future resolves to its shared key
+    def submit(self, ciphertext):
+        start = time.perf_counter()
+        with self.lock:
+            self.pending += 1
+        future = self.executor.submit(_decapsulate, ciphertext)
+        future.add_done_callback(lambda _: self._record(time.perf_counter() - start))
+        return future
+
+    # Block the calling thread until a worker has decapsulated the ciphertext
+    def decapsulate(self, ciphertext):
+        return self.submit(ciphertext).result()
+
+    def _record(self, latency):
+        with self.lock:
+            self.pending -= 1
+            self.completed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.pending,
+                "completed": self.completed,
+                "avg_latency": self.total_latency / self.completed if self.completed else 0.0,
+                "max_latency": self.max_latency,
+            }
+
+    # Stop the worker processes; handshakes still queued fail rather than hold up the exit
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+class HandshakeBatcher:
+    """Collects pending handshake ciphertexts and decapsulates them in batches."""
+
+    def __init__(self, key, params, max_batch=32, max_wait=0.005):
+        self.key = key
+        self.params = params
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+
+    # Queue a ciphertext; the future resolves to its shared key
+    def submit(self, ciphertext):
+        future = Future()
+        self.pending.put((ciphertext, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                sharedKeys = decapsulateBatch([ciphertext for ciphertext, _ in batch], self.key, self.params)
+            except Exception:
+                # Redo the batch one at a time, so a bad ciphertext fails only its own handshake
+                for ciphertext, future in batch:
+                    try:
+                        future.set_result(decapsulate(ciphertext, self.key, self.params))
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            for (_, future), sharedKey in zip(batch, sharedKeys):
+                future.set_result(sharedKey)
@@ -0,0 +1,217 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from framing import HEADER, FrameDecoder, encode_frame
+
+SEGMENT_BYTES = 4 * 1024 * 1024  # A room's log moves on to a new segment once its current one is this big
+MAX_SEGMENTS = 8  # Segments kept per room; older ones are deleted
+CHUNK_BYTES = 64 * 1024  # Most log bytes replayed in one history record
+CATCH_UP_READS = 3  # Replay top-ups read before a server catches up on a busy room with its lock held
+ENTRY = struct.Struct("!QQ")  # Index entry: offset of the message's frame in the log, and its time in milliseconds
+
+def _map(path, length):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ)
+
+class _Segment:
+    """A log of length-prefixed messages and an index with one fixed-size entry per message."""
+
+    def __init__(self, base, first):
+        self.first = first  # Sequence number of the first message
+        self.log_path = base + ".log"
+        self.index_path = base + ".idx"
+        self.size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        self.count = os.path.getsize(self.index_path) // ENTRY.size if os.path.exists(self.index_path) else 0
+        self.log = None  # Unbuffered append handles, open on a room's newest segment only
+        self.index = None
+
+    # Drop a message whose write was cut short, e.g. by a crash, then open for appending
+    def open_for_append(self):
+        if not self.size:
+            self.count = 0
+        if self.count:
+            index, log = _map(self.index_path, self.count * ENTRY.size), _map(self.log_path, self.size)
+            end = 0
+            while self.count:
+                offset, _ = ENTRY.unpack_from(index, (self.count - 1) * ENTRY.size)
+                if offset + HEADER.size <= self.size:
+                    end = offset + HEADER.size + HEADER.unpack_from(log, offset)[0]
+                    if end <= self.size:
+                        break
+                self.count -= 1
+                end = 0
+            index.close()
+            log.close()
+            self.size = end
+        self.log = open(self.log_path, "ab", buffering=0)
+        self.index = open(self.index_path, "ab", buffering=0)
+        self.log.truncate(self.size)
+        self.index.truncate(self.count * ENTRY.size)
+
+    def append(self, message, millis):
+        frame = encode_frame(message)
+        self.log.write(frame)  # The log first, so an index entry never points past the end of the log
+        self.index.write(ENTRY.pack(self.size, millis))
+        self.size += len(frame)
+        self.count += 1
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.index.close()
+            self.log = self.index = None
+
+    def remove(self):
+        self.close()
+        os.remove(self.log_path)
+        os.remove(self.index_path)
+
+    # Slices of the log holding messages lo to hi of this segment, each at most max_bytes unless one message is larger
+    def read(self, lo, hi, max_bytes):
+        index, log = _map(self.index_path, self.count * ENTRY.size), _map(self.log_path, self.size)
+
+        # Where message i starts; the one past the last message starts at the end of the log
+        def offset(i):
+            return ENTRY.unpack_from(index, i * ENTRY.size)[0] if i < self.count else self.size
+
+        offsets = range(self.count + 1)
+        chunks = []
+        while lo < hi:
+            start = offset(lo)
+            cut = bisect.bisect_right(offsets, start + max_bytes, lo + 1, hi + 1, key=offset) - 1
+            cut = max(cut, lo + 1)
+            chunks.append(log[start:offset(cut)])
+            lo = cut
+        index.close()
+        log.close()
+        return chunks
+
+    # Index of the first message at or after millis, or count if there is none
+    def find_time(self, millis):
+        index = _map(self.index_path, self.count * ENTRY.size)
+        found = bisect.bisect_left(range(self.count), millis,
+                                   key=lambda i: ENTRY.unpack_from(index, i * ENTRY.size)[1])
+        index.close()
+        return found
+
+class _RoomLog:
+    """One room's messages in numbered segments, named by the sequence number of their first message."""
+
+    def __init__(self, directory, segment_bytes, max_segments):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+        self.segments = [_Segment(os.path.join(directory, name[:-4]), int(name[:-4])) for name in names]
+        if not self.segments:
+            self.segments.append(self._segment(0))
+        self.segments[-1].open_for_append()
+
+    def _segment(self, first):
+        return _Segment(os.path.join(self.directory, f"{first:020d}"), first)
+
+    # Sequence number the next message will get
+    def end(self):
+        tail = self.segments[-1]
+        return tail.first + tail.count
+
+    # Append a message; returns its sequence number
+    def append(self, message, millis):
+        tail = self.segments[-1]
+        if tail.size >= self.segment_bytes:
+            tail.close()
+            tail = self._segment(self.end())
+            tail.open_for_append()
+            self.segments.append(tail)
+            while len(self.segments) > self.max_segments:
+                self.segments.pop(0).remove()
+        tail.append(message, millis)
+        return tail.first + tail.count - 1
+
+    # Sequence number of the first message at or after millis
+    def find_time(self, millis):
+        for segment in self.segments:
+            found = segment.find_time(millis) if segment.count else 0
+            if found < segment.count:
+                return segment.first + found
+        return self.end()
+
+    def read(self, start, end, max_bytes):
+        chunks = []
+        for segment in self.segments:
+            lo, hi = max(start - segment.first, 0), min(end - segment.first, segment.count)
+            if lo < hi:
+                chunks.extend(segment.read(lo, hi, max_bytes))
+        return chunks
+
+class History:
+    """Every room's broadcasts in an append-only log on disk, for replaying to whoever enters the room.
+
+    Each room has a directory of segments. A segment is a log of messages, each stored as the
+    length-prefixed frame it is replayed in, and an index of (offset, time) entries. Both are read
+    through mmap and the index is binary searched, so a replay costs a few slices of the log,
+    however many messages it holds, and the server keeps no messages in memory. Disk use is
+    bounded by segment_bytes and max_segments per room.
+    """
+
+    def __init__(self, directory, messages=100, max_age=0, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.messages = messages  # Most messages replayed
+        self.max_age = max_age  # Seconds back that replays reach, or 0 for no limit
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.logs = {}  # Room name -> its _RoomLog, opened on first use
+        self.lock = threading.Lock()
+
+    # The room's log, or None if it has none and create is False
+    def _log(self, room, create):
+        log = self.logs.get(room)
+        if log is None:
+            directory = os.path.join(self.directory, room)
+            if not create and not os.path.isdir(directory):
+                return None
+            os.makedirs(directory, exist_ok=True)
+            log = self.logs[room] = _RoomLog(directory, self.segment_bytes, self.max_segments)
+        return log
+
+    # Append a broadcast (UTF-8 bytes) to its room's log; returns its position in the log, as counted by backlog
+    def append(self, room, message):
+        with self.lock:
+            return self._log(room, True).append(message, int(time.time() * 1000))
+
+    def backlog(self, room, start=None, max_bytes=CHUNK_BYTES):
+        """Returns a room's latest messages within the limits, or those of them logged from a position on.
+
+        Args:
+            room (str): The room name.
+            start (int): The end position returned by an earlier call, to get only what was logged since.
+            max_bytes (int): Most bytes per slice, unless one message is larger.
+
+        Returns:
+            tuple: Slices of concatenated frames, the position of the first message in them, and the position
+            after the last. The first position is past start if the limits leave out some of what was logged since.
+        """
+        with self.lock:
+            log = self._log(room, False)
+            if log is None:
+                return [], 0, 0
+            end = log.end()
+            first = max(end - self.messages, log.segments[0].first)
+            if self.max_age:
+                first = max(first, log.find_time(int((time.time() - self.max_age) * 1000)))
+            if start is not None:
+                first = max(first, start)
+            return log.read(first, end, max_bytes), first, end
+
+def read_messages(directory):
+    """Yields every message in one room's log directory, oldest first, without writing to it.
+
+    Safe to run against a live server's log; a message still being written is skipped.
+    """
+    for name in sorted(name for name in os.listdir(directory) if name.endswith(".log")):
+        with open(os.path.join(directory, name), "rb") as f:
+            yield from FrameDecoder().feed(f.read())
@@ -0,0 +1,127 @@
+import bisect
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds: 50 µs doubling up to about 26 s
+BUCKETS = [0.00005 * 2**i for i in range(20)]
+
+class Histogram:
+    """Fixed log-spaced buckets, so recording is one bisect and percentiles are approximate."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Upper bound of the bucket holding the p-th percentile, in milliseconds
+    def _percentile(self, p):
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max) * 1000
+        return self.max * 1000
+
+    def snapshot(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000,
+            "p50_ms": self._percentile(50),
+            "p90_ms": self._percentile(90),
+            "p99_ms": self._percentile(99),
+            "max_ms": self.max * 1000,
+        }
+
+class Metrics:
+    """Counters and latency histograms shared by every connection of one server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            }
+
+# Depth of every outbound queue summarized, so the report stays small with many clients
+def queue_gauges(queues):
+    depths = [queue.depth() for queue in queues]
+    return {
+        "connections": len(depths),
+        "queued_records": sum(depths),
+        "max_queue_depth": max(depths, default=0),
+        "dropped_records": sum(queue.dropped() for queue in queues),
+    }
+
+# Each client's outbound backlog keyed by username, to tell which clients are slow; a name shared by several
+# clients gets " #2", " #3" and so on. Clients drop out as they disconnect
+def client_queue_gauges(queues):
+    gauges = {}
+    for username, queue in queues:
+        name, n = username, 1
+        while name in gauges:
+            n += 1
+            name = f"{username} #{n}"
+        gauges[name] = {
+            "queued_records": queue.depth(),
+            "queued_bytes": queue.queued_bytes(),
+            "dropped_records": queue.dropped(),
+        }
+    return gauges
+
+# Serve snapshot() as JSON on 127.0.0.1:port and/or print it to stdout every interval seconds
+def start_reporting(snapshot, port=None, interval=0):
+    if port is not None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(snapshot(), sort_keys=True).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        print(f"Metrics are served on http://127.0.0.1:{port}/")
+
+    if interval:
+        def dump():
+            while True:
+                time.sleep(interval)
+                print(json.dumps(snapshot(), sort_keys=True), file=sys.stdout, flush=True)
+
+        threading.Thread(target=dump, daemon=True).start()
@@ -0,0 +1,217 @@
+import asyncio
+import socket
+import threading
+import time
+from collections import deque
+from framing import encode_batches
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+POLICIES = (DROP_OLDEST, DISCONNECT)
+MAX_QUEUE_BYTES = 16 * 1024 * 1024  # Bytes a client's queue may hold, alongside its record limit
+
+class _BoundedRecords:
+    """Pending records for one client plus the policy applied past the high-water mark.
+
+    The mark is max_queue records or max_bytes bytes, whichever comes first. One record larger
+    than max_bytes is still queued when nothing else is, so a big backlog slice always gets through.
+    """
+
+    def __init__(self, max_queue, policy, max_bytes=MAX_QUEUE_BYTES):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow client policy: {policy}")
+        self.records = deque()  # (record, droppable) pairs
+        self.size = 0  # Bytes queued
+        self.max_queue = max_queue
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.dropped = 0
+
+    def _full(self, length):
+        return len(self.records) >= self.max_queue or (bool(self.records) and self.size + length > self.max_bytes)
+
+    # Queue a record; returns False if the client should be disconnected instead
+    def push(self, record, droppable):
+        while self._full(len(record)):
+            if self.policy == DISCONNECT:
+                return False
+            # Drop the oldest record that may be lost; group keys and the like never are
+            for i, (oldRecord, oldDroppable) in enumerate(self.records):
+                if oldDroppable:
+                    del self.records[i]
+                    self.size -= len(oldRecord)
+                    self.dropped += 1
+                    break
+            else:
+                # Nothing queued may be lost, so the queue never grows past its limit: lose the new record
+                # if it may be lost, otherwise give up on the client as the disconnect policy would
+                if not droppable:
+                    return False
+                self.dropped += 1
+                return True
+        self.records.append((record, droppable))
+        self.size += len(record)
+        return True
+
+    def pop_all(self):
+        records = [record for record, _ in self.records]
+        self.records.clear()
+        self.size = 0
+        return records
+
+# Coalescing holds a client's records for up to coalesce_window seconds, or until coalesce_bytes are queued,
+# then packs them into batch records so a burst of broadcasts costs that client one send instead of one each
+COALESCE_BYTES = 64 * 1024
+
+def _pack(records, coalesce_window, coalesce_bytes):
+    if coalesce_window and len(records) > 1:
+        records = encode_batches(records, coalesce_bytes)
+    return b"".join(records)
+
+class OutboundQueue:
+    """Bounded per-client send queue drained by its own writer thread."""
+
+    def __init__(self, sock, max_queue=1024, policy=DROP_OLDEST, coalesce_window=0, coalesce_bytes=COALESCE_BYTES,
+                 metrics=None, max_bytes=MAX_QUEUE_BYTES):
+        self.sock = sock
+        self.metrics = metrics  # Counts bytes and sends if given
+        self.pending = _BoundedRecords(max_queue, policy, max_bytes)
+        self.coalesce_window = coalesce_window
+        self.coalesce_bytes = coalesce_bytes
+        self.condition = threading.Condition()
+        self.closed = False
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+
+    # Never blocks on the network; a client past its limit is dropped from or disconnected
+    def put(self, record, droppable=True):
+        with self.condition:
+            if self.closed:
+                return
+            if not self.pending.push(record, droppable):
+                print("Disconnecting a client whose outbound queue is full")
+                self._abort()
+                return
+            self.condition.notify()
+
+    def depth(self):
+        with self.condition:
+            return len(self.pending.records)
+
+    def queued_bytes(self):
+        with self.condition:
+            return self.pending.size
+
+    def dropped(self):
+        with self.condition:
+            return self.pending.dropped
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    # Shut the socket down so the client's reader thread notices and cleans up
+    def _abort(self):
+        self.closed = True
+        self.condition.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending.records and not self.closed:
+                    self.condition.wait()
+                # Wait out the coalescing window from the first queued record, unless the byte budget fills first
+                deadline = time.monotonic() + self.coalesce_window
+                while not self.closed and self.pending.size < self.coalesce_bytes:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.closed:
+                    return
+                records = self.pending.pop_all()
+            data = _pack(records, self.coalesce_window, self.coalesce_bytes)
+            if self.metrics is not None:
+                self.metrics.count("bytes_out", len(data))
+                self.metrics.count("sends")
+            try:
+                self.sock.sendall(data)
+            except Exception as e:
+                print(f"Error sending message to a client: {e}")
+                with self.condition:
+                    self._abort()
+                return
+
+class AsyncOutboundQueue:
+    """Bounded per-client send queue drained by its own writer task."""
+
+    def __init__(self, writer, max_queue=1024, policy=DROP_OLDEST, coalesce_window=0,
+                 coalesce_bytes=COALESCE_BYTES, metrics=None, max_bytes=MAX_QUEUE_BYTES):
+        self.writer = writer
+        self.metrics = metrics  # Counts bytes and sends if given
+        self.pending = _BoundedRecords(max_queue, policy, max_bytes)
+        self.coalesce_window = coalesce_window
+        self.coalesce_bytes = coalesce_bytes
+        self.ready = asyncio.Event()
+        self.full = asyncio.Event()  # Set once the byte budget is reached, ending the window early
+        self.closed = False
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def put(self, record, droppable=True):
+        if self.closed:
+            return
+        if not self.pending.push(record, droppable):
+            print("Disconnecting a client whose outbound queue is full")
+            self._abort()
+            return
+        self.ready.set()
+        if self.pending.size >= self.coalesce_bytes:
+            self.full.set()
+
+    def depth(self):
+        return len(self.pending.records)
+
+    def queued_bytes(self):
+        return self.pending.size
+
+    def dropped(self):
+        return self.pending.dropped
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+        self.full.set()
+
+    # Abort the transport so the client's reader task sees the connection end
+    def _abort(self):
+        self.close()
+        self.writer.transport.abort()
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            if self.coalesce_window and not self.full.is_set():
+                try:
+                    await asyncio.wait_for(self.full.wait(), self.coalesce_window)
+                except asyncio.TimeoutError:
+                    pass
+            self.ready.clear()
+            self.full.clear()
+            if self.closed:
+                return
+            data = _pack(self.pending.pop_all(), self.coalesce_window, self.coalesce_bytes)
+            if self.metrics is not None:
+                self.metrics.count("bytes_out", len(data))
+                self.metrics.count("sends")
+            try:
+                self.writer.write(data)
+                await self.writer.drain()  # Waits while the socket's send buffer is full
+            except Exception as e:
+                print(f"Error sending message to a client: {e}")
+                self._abort()
+                return
@@ -0,0 +1,67 @@
+import heapq
+import os
+import struct
+import threading
+import time
+from AES import open_random_nonce, seal_random_nonce
+from Kyber_Toy_Implementation.optimization import KDF
+
+NONCE_SIZE = 16
+EXPIRY = struct.Struct("!Q")
+
+# The secret a ticket carries, derived so the ticket never holds the session key itself
+def resumption_secret(session_key):
+    return KDF(b"chat resumption" + session_key, 32)
+
+# The key of a resumed session; both nonces are fresh, so no two sessions get the same key
+def resumed_session_key(secret, client_nonce, server_nonce):
+    return KDF(secret + client_nonce + server_nonce, 32)
+
+class TicketIssuer:
+    """Server side of session resumption: issues tickets and redeems each one at most once.
+
+    A ticket is the expiry time and the resumption secret sealed under a key that never
+    leaves the server, so tickets stop working when it restarts. Sharded workers are
+    given one shared key so any of them can redeem a ticket, but each has its own replay
+    cache; a replayed ticket is useless without the secret it was issued with. Redeemed
+    tickets are remembered until they expire; once cache_size of them are remembered,
+    further resumptions are refused and clients fall back to a full Kyber handshake.
+    """
+
+    def __init__(self, lifetime=3600, cache_size=10000, key=None):
+        self.key = key if key is not None else os.urandom(32)
+        self.lifetime = lifetime
+        self.cache_size = cache_size
+        self.redeemed = set()  # Nonces of redeemed tickets
+        self.expiries = []  # Heap of (expiry, nonce) for dropping them from redeemed once expired
+        self.lock = threading.Lock()
+
+    # A ticket for a new session; a resumed session passes on its ticket's expiry so chains of resumptions end
+    def issue(self, session_key, expiry=None):
+        if expiry is None:
+            expiry = int(time.time()) + self.lifetime
+        return seal_random_nonce(self.key, EXPIRY.pack(expiry) + resumption_secret(session_key))
+
+    # Redeem a client's resume hello; returns (server nonce, session key, expiry), or None to run the full handshake
+    def redeem(self, hello):
+        client_nonce, ticket = bytes(hello[:NONCE_SIZE]), bytes(hello[NONCE_SIZE:])
+        if len(client_nonce) != NONCE_SIZE:
+            return None
+        try:
+            plaintext = open_random_nonce(self.key, ticket)
+        except ValueError:
+            return None
+        (expiry,) = EXPIRY.unpack_from(plaintext)
+        now = time.time()
+        if expiry <= now:
+            return None
+        ticket_id = ticket[:12]  # The ticket's own random nonce, authenticated by the open above
+        with self.lock:
+            while self.expiries and self.expiries[0][0] <= now:
+                self.redeemed.discard(heapq.heappop(self.expiries)[1])
+            if ticket_id in self.redeemed or len(self.redeemed) >= self.cache_size:
+                return None
+            self.redeemed.add(ticket_id)
+            heapq.heappush(self.expiries, (expiry, ticket_id))
+        server_nonce = os.urandom(NONCE_SIZE)
+        return server_nonce, resumed_session_key(plaintext[EXPIRY.size:], client_nonce, server_nonce), expiry
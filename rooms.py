@@ -0,0 +1,56 @@
+import re
+
+DEFAULT_ROOM = "lobby"
+ROOM_NAME = re.compile(r"[A-Za-z0-9_-]{1,32}")
+
+# The room a chat line asks to move to: "/join NAME", or "/leave" to go back to the lobby; None for ordinary chat
+def room_command(message):
+    if message.strip() == "/leave":
+        return DEFAULT_ROOM
+    if message.startswith("/join "):
+        return message[len("/join "):].strip()
+    return None
+
+def valid_room(name):
+    return ROOM_NAME.fullmatch(name) is not None
+
+class RoomIndex:
+    """The room every session is in, and the members of every room.
+
+    Sessions are keyed by any hashable handle, such as a socket or stream writer. Adding,
+    moving and removing a session are O(1), and a room's members are found without
+    looking at anyone else, so fan-out cost depends only on the size of the room.
+    """
+
+    def __init__(self):
+        self.room_of = {}  # Session -> room name
+        self.members = {}  # Room name -> its sessions, as an insertion-ordered dict used as a set
+
+    def __len__(self):
+        return len(self.room_of)
+
+    def __contains__(self, session):
+        return session in self.room_of
+
+    def add(self, session, room=DEFAULT_ROOM):
+        self.room_of[session] = room
+        self.members.setdefault(room, {})[session] = None
+
+    # Take a session out of its room; returns that room, or None if the session was not registered
+    def remove(self, session):
+        room = self.room_of.pop(session, None)
+        if room is not None:
+            members = self.members[room]
+            del members[session]
+            if not members:
+                del self.members[room]  # Rooms exist only while someone is in them
+        return room
+
+    # Move a session to another room; returns the room it left
+    def move(self, session, room):
+        old = self.remove(session)
+        self.add(session, room)
+        return old
+
+    def room_members(self, room):
+        return self.members.get(room, {})
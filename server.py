@@ -1,85 +1,472 @@
+import argparse
+import itertools
+import signal
 import socket
+import sys
 import threading
-from AES import encrypt_message, decrypt_message
-from Kyber_Toy_Implementation.kyberKEM import keygenKEM, decapsulate
+import time
+from AES import SERVER, SessionCipher
+from compression import (DEFAULT_DICTIONARY, Codec, accept_offer, load_dictionary, open_body, seal_record,
+                         seal_records)
+from framing import (COMPRESSED, HEADER, HELLO_COMPRESS, HELLO_KEM, HELLO_RESUME, MSG_CHAT, MSG_FILE, MSG_HISTORY,
+                     MSG_TICKET, FrameReader, encode_record, send_frame, send_record, split_record)
+from group_key import GroupKey
+from history import CATCH_UP_READS, History
+from outbound import COALESCE_BYTES, DROP_OLDEST, MAX_QUEUE_BYTES, POLICIES, OutboundQueue
+from handshake import HandshakeBatcher, HandshakePool
+from metrics import Metrics, client_queue_gauges, queue_gauges, start_reporting
+from resumption import TicketIssuer
+from rooms import DEFAULT_ROOM, RoomIndex, room_command, valid_room
+from sharding import BusLink, lost_bus
+from server_keys import KeyPool, load_server_key
+from transfer import FILE_CHUNK, TransferRelay
+from Kyber_Toy_Implementation.kyberKEM import ciphertextSize, decapsulate
+from Kyber_Toy_Implementation.kyberPKE import setBackend
 from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
+from Kyber_Toy_Implementation.profiling import enableProfiling, stageTimings
 
 class Server:
-    def __init__(self, host="192.168.20.29", port=5555):
+    def __init__(self, host="192.168.20.29", port=5555, batch_handshakes=False, handshake_workers=0,
+                 group_key=False, max_queue=1024, slow_client_policy=DROP_OLDEST, key_file=None,
+                 rotate_key_every=0, key_pool=4, backlog=1024, coalesce_window=0, coalesce_bytes=COALESCE_BYTES,
+                 ticket_lifetime=3600, ticket_cache=10000, metrics_port=None, metrics_interval=0, reuse_port=False,
+                 bus_path=None, ticket_key=None, history_dir=None, history_messages=100, history_age=0,
+                 compress=False, compress_dictionary=None, backend="python",
+                 max_queue_bytes=MAX_QUEUE_BYTES):
+        if rotate_key_every and (batch_handshakes or handshake_workers):
+            raise ValueError("Server key rotation needs in-thread handshakes; batcher and workers hold a fixed key")
         self.host = host
         self.port = port
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Restart without waiting out TIME_WAIT
+        if reuse_port:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)  # Sharded workers share the port
         self.server.bind((host, port))
-        self.server.listen(5)
-        self.clients = []
+        self.backlog = backlog
+        self.rooms = RoomIndex()  # Every connected client and the room it is in
         self.clients_lock = threading.Lock()
         self.params = KYBER_PARAMS["kyber1024"]
-        self.serverPublicKey, self.serverPrivateKey = keygenKEM(self.params)
-        self.client_keys = {}
+        # Every key below is prepared with the polynomial backend selected here, so select it before loading one
+        setBackend(backend)
+        # Loaded already prepared from key_file if it exists, so restarts keep the key clients know
+        self.serverPublicKey, self.serverPrivateKey, self.serverKey = load_server_key(self.params, key_file)
+        # Optionally switch to a pre-generated key every rotate_key_every handshakes (1 for per-session keys)
+        self.rotate_key_every = rotate_key_every
+        self.key_pool = KeyPool(self.params, key_pool) if rotate_key_every else None
+        self.handshakes = itertools.count(1)
+        self.client_ciphers = {}
+        self.client_codecs = {}  # Each client's compression codec, or None if it sends and receives raw
+        # Each client gets a bounded send queue and writer thread so a slow socket never stalls a broadcast
+        self.outbound = {}
+        self.max_queue = max_queue
+        self.max_queue_bytes = max_queue_bytes
+        self.slow_client_policy = slow_client_policy
+        # Optionally hold each client's records for up to coalesce_window seconds and send them as one batch
+        self.coalesce_window = coalesce_window
+        self.coalesce_bytes = coalesce_bytes
+        # Optionally drain concurrent handshakes through one batched decapsulation
+        self.handshake_batcher = HandshakeBatcher(self.serverKey, self.params) if batch_handshakes else None
+        # Optionally run decapsulation in worker processes so it never holds this process's GIL
+        self.handshake_pool = None
+        if handshake_workers:
+            self.handshake_pool = HandshakePool(self.serverPublicKey, self.serverPrivateKey, self.params,
+                                                workers=handshake_workers)
+        # Optionally encrypt each broadcast once under its room's key, which rotates whenever someone enters or leaves
+        self.group_keys = {} if group_key else None
+        # Tickets let a reconnecting client skip Kyber for ticket_lifetime seconds after its full handshake
+        self.tickets = TicketIssuer(ticket_lifetime, ticket_cache, ticket_key) if ticket_lifetime else None
+        # As a sharded worker, broadcasts are also published to the other workers over the bus at bus_path
+        self.bus_path = bus_path
+        self.bus = None
+        # Optionally log every broadcast under history_dir and replay a room's latest messages to whoever enters it
+        self.history = History(history_dir, history_messages, history_age) if history_dir else None
+        self.replayed = {}  # Client -> the history positions (first, end) its replay of its room covered
+        self.sent_live = {}  # Room -> the history position after the last broadcast sent out live in it
+        # Optionally deflate chat for clients offering the same preset dictionary in their hello
+        self.codec = None
+        if compress or compress_dictionary:
+            self.codec = Codec(load_dictionary(compress_dictionary) if compress_dictionary else DEFAULT_DICTIONARY)
+        # File transfers between connected users, relayed a chunk at a time under credit from the recipient
+        self.transfers = TransferRelay()
+        # Counters, histograms and Kyber stage timings, only collected if something reports them
+        self.metrics = None
+        self.metrics_port = metrics_port
+        self.metrics_interval = metrics_interval
+        if metrics_port is not None or metrics_interval:
+            self.metrics = Metrics()
+            enableProfiling()
 
-    # Broadcast a message to all clients
-    def broadcast_message(self, message, sender=None):
+    # Broadcast a message (text or UTF-8 bytes) to a room, including other workers' clients unless it came from them
+    def broadcast_message(self, message, sender=None, room=DEFAULT_ROOM, relay=True):
+        start = time.perf_counter()
+        if isinstance(message, str):
+            message = message.encode()  # Once, not per recipient
+        if relay and self.bus is not None:
+            self.bus.publish(room, message)
+        packed = self.codec.compress(message) if self.codec is not None else None  # Also once, for every member
+        # Logged before taking clients_lock, so disk writes never hold up other broadcasts; a client that entered
+        # the room in between with the message in its replay is skipped below
+        position = self.history.append(room, message) if self.history is not None else None
         with self.clients_lock:
-            for client in self.clients:
-                if client != sender:
-                    try:
-                        sharedKey = self.client_keys[client]  # Get the shared key
-                        if isinstance(message, bytes):
-                            encrypted_message = message
-                        else:
-                            encrypted_message = encrypt_message(message, sharedKey)
-                        client.sendall(encrypted_message)
-                    except Exception as e:
-                        print(f"Error sending message to a client: {e}")
-                        self.clients.remove(client)
-                        del self.client_keys[client]  # Remove the shared key
+            if position is not None:
+                self.sent_live[room] = max(self.sent_live.get(room, 0), position + 1)
+            group_records = None
+            if self.group_keys is not None and room in self.group_keys:
+                group_key = self.group_keys[room]  # One encryption for every member, and one more if compressed
+                raw = group_key.seal(message)
+                group_records = (raw, group_key.seal(packed, compressed=True) if packed is not None else raw)
+            for client in self.rooms.room_members(room):
+                if client != sender and not (position is not None and self.was_replayed(client, position)):
+                    compressing = self.client_codecs[client] is not None
+                    if group_records is not None:
+                        record = group_records[compressing]
+                    else:
+                        record = seal_record(MSG_CHAT, self.client_ciphers[client], message,
+                                             packed if compressing else None)
+                    self.outbound[client].put(record)  # Only enqueues; the client's writer sends it
+        if self.metrics is not None:
+            self.metrics.observe("broadcast", time.perf_counter() - start)
+
+    # Add a client that finished its handshake to the lobby; call with clients_lock held
+    def add_client(self, client, username, cipher, codec=None):
+        self.rooms.add(client)
+        self.transfers.join(client, username)
+        self.client_ciphers[client] = cipher  # Store the session cipher
+        self.client_codecs[client] = codec
+        self.outbound[client] = OutboundQueue(client, self.max_queue, self.slow_client_policy,
+                                              self.coalesce_window, self.coalesce_bytes, self.metrics,
+                                              self.max_queue_bytes)
+        if self.group_keys is not None:
+            self.rotate_group_key(DEFAULT_ROOM)
+
+    # Remove a client and its session cipher; returns the room it was in. Call with clients_lock held
+    def remove_client(self, client):
+        room = self.rooms.remove(client)
+        if room is None:
+            return None
+        del self.client_ciphers[client]  # Remove the session cipher
+        del self.client_codecs[client]
+        self.replayed.pop(client, None)
+        self.outbound.pop(client).close()
+        for peer, message in self.transfers.leave(client):
+            self.send_file_message(peer, message)
+        if self.group_keys is not None:
+            self.rotate_group_key(room)
+        return room
+
+    # Move a client to another room and announce it in both; runs on the client's own thread
+    def change_room(self, client, username, room):
+        if not valid_room(room):
+            self.send_notice(client, "Room names are 1 to 32 letters, digits, - or _")
+            return
+        old = self.rooms.room_of[client]  # Only this thread moves the client
+        if room == old:
+            return
+        def move():
+            self.rooms.move(client, room)
+            if self.group_keys is not None:
+                self.rotate_group_key(old)
+                self.rotate_group_key(room)
+        self.enter_room(client, room, self.client_codecs[client], move)
+        self.broadcast_message(f"{username} has left {old}.", room=old)
+        self.broadcast_message(f"{username} has joined {room}.", room=room)
+
+    # Send a line to one client only
+    def send_notice(self, client, text):
+        with self.clients_lock:
+            record = encode_record(MSG_CHAT, self.client_ciphers[client].seal(text.encode()))
+            self.outbound[client].put(record, droppable=False)
+
+    # A room's backlog as ((slice, compressed slice or None) pairs, first position, end position), or None without
+    # history. Given an earlier backlog, tops it up with what was logged since, or replaces it if that alone fills
+    # the limits
+    def read_backlog(self, room, codec, backlog=None):
+        if self.history is None:
+            return None
+        chunks, first, end = self.history.backlog(room, backlog[2] if backlog is not None else None)
+        pairs = [(chunk, codec.compress(chunk) if codec is not None else None) for chunk in chunks]
+        if backlog is not None and first == backlog[2]:
+            return backlog[0] + pairs, backlog[1], end
+        return pairs, first, end
+
+    # Call enter (which puts the client in room) and queue the room's backlog for it, both under clients_lock. The
+    # backlog is read beforehand and topped up until no broadcast logged since has been sent out live, so disk reads
+    # never hold up broadcasts and the client misses none of them; ones it was replayed are not also sent live
+    def enter_room(self, client, room, codec, enter):
+        backlog = self.read_backlog(room, codec)
+        for _ in range(CATCH_UP_READS):
+            with self.clients_lock:
+                if backlog is None or backlog[2] >= self.sent_live.get(room, 0):
+                    enter()
+                    self.send_backlog(client, backlog)
+                    return
+            backlog = self.read_backlog(room, codec, backlog)
+        with self.clients_lock:
+            backlog = self.read_backlog(room, codec, backlog)  # Still behind a busy room; catch up under the lock
+            enter()
+            self.send_backlog(client, backlog)
+
+    # Queue a backlog for a client that just entered its room; call with clients_lock held
+    def send_backlog(self, client, backlog):
+        if backlog is None:
+            return
+        pairs, first, end = backlog
+        self.replayed[client] = (first, end)
+        for record in seal_records(MSG_HISTORY, self.client_ciphers[client], pairs):
+            self.outbound[client].put(record)
+
+    # Whether a client already got the broadcast logged at position in its replay; call with clients_lock held
+    def was_replayed(self, client, position):
+        first, end = self.replayed.get(client, (0, 0))
+        return first <= position < end
+
+    # Pass a file transfer message from a client on to the other end, resealed for it; no file data stays behind
+    def relay_file(self, client, message):
+        with self.clients_lock:
+            for peer, forward in self.transfers.route(client, message):
+                self.send_file_message(peer, forward)
+
+    # Queue a file transfer message for a client; call with clients_lock held. Only chunks may be dropped
+    # for a slow client, which its end notices from the offsets and can resume from
+    def send_file_message(self, client, message):
+        record = encode_record(MSG_FILE, self.client_ciphers[client].seal(message))
+        self.outbound[client].put(record, droppable=message[0] == FILE_CHUNK)
+
+    # Rotate a room's key and hand it to every member over its session cipher; call with clients_lock held
+    def rotate_group_key(self, room):
+        members = self.rooms.room_members(room)
+        if not members:
+            self.group_keys.pop(room, None)
+            return
+        group_key = self.group_keys.get(room)
+        if group_key is None:
+            group_key = self.group_keys[room] = GroupKey()
+        else:
+            group_key.rotate()
+        for client in members:
+            # Key records are never dropped, or the client could not read what follows
+            self.outbound[client].put(group_key.key_record(self.client_ciphers[client]), droppable=False)
 
     # Handle each client in a separate thread
     def handle_client(self, client, addr):
         print(f"Client {addr} connected.")
-        
-        sharedKey = self.key_exchange(client)
-        self.client_keys[client] = sharedKey  # Store the shared key
-        
-        client.sendall(encrypt_message("Enter your username: ", sharedKey))
-        username = decrypt_message(client.recv(4096), sharedKey)
-        print(f"{username} has joined the chat.")
-        self.broadcast_message(f"{username} has joined the chat!")
+        reader = FrameReader(client)  # Reassembles length-prefixed frames from the stream
+        username = None
 
-        while True:
-            try:
-                encrypted_message = client.recv(4096)
-                if not encrypted_message:
+        try:
+            start = time.perf_counter()
+            sessionKey, expiry, codec = self.key_exchange(client, reader)
+            if self.metrics is not None:
+                # Only resumed sessions carry their ticket's expiry over
+                name = "handshake_full" if expiry is None else "handshake_resumed"
+                self.metrics.observe(name, time.perf_counter() - start)
+            cipher = SessionCipher(sessionKey, SERVER)  # One cipher for the whole session
+            if self.tickets is not None:
+                send_record(client, MSG_TICKET, cipher.seal(self.tickets.issue(sessionKey, expiry)))
+
+            send_record(client, MSG_CHAT, cipher.seal(b"Enter your username: "))
+            kind, body = split_record(reader.recv_frame())
+            username = open_body(kind, body, cipher.open, codec).decode()
+            self.enter_room(client, DEFAULT_ROOM, codec, lambda: self.add_client(client, username, cipher, codec))
+            print(f"{username} has joined the chat.")
+            self.broadcast_message(f"{username} has joined the chat!")
+
+            while True:
+                frame = reader.recv_frame()
+                if frame is None:
                     break
-                message = decrypt_message(encrypted_message, sharedKey)
+                if self.metrics is not None:
+                    self.metrics.count("bytes_in", HEADER.size + len(frame))
+                kind, encrypted_message = split_record(frame)
+                if kind == MSG_FILE:
+                    self.relay_file(client, cipher.open(encrypted_message))
+                    continue
+                if kind & ~COMPRESSED != MSG_CHAT:
+                    continue
+                message = open_body(kind, encrypted_message, cipher.open, codec).decode()
+                room = room_command(message)
+                if room is not None:
+                    self.change_room(client, username, room)
+                    continue
                 print(f"{username}: {message}")  # Debug print
-                self.broadcast_message(f"{username}: {message}", sender=client)
-            except Exception as e:
-                print(f"Error with client {username}: {e}")
-                break
+                # Only this thread moves the client, so its room cannot change underneath
+                self.broadcast_message(f"{username}: {message}", sender=client, room=self.rooms.room_of[client])
+        except Exception as e:
+            # Also clients that hang up or send garbage before finishing the handshake
+            print(f"Error with client {username or addr}: {e}")
+            if self.metrics is not None:
+                self.metrics.count("client_errors")
+        finally:
+            with self.clients_lock:
+                room = self.remove_client(client)
+            if room is not None:
+                print(f"{username} has left the chat.")
+                self.broadcast_message(f"{username} has left the chat.", room=room)
+            client.close()
+
+    # Resume from the client's ticket if it has a valid one, otherwise run Kyber, and settle on compression;
+    # returns (session key, ticket expiry, codec or None)
+    def key_exchange(self, client, reader):
+        kind, hello = split_record(reader.recv_frame())
+        kind, hello, codec = accept_offer(kind, hello, self.codec)
+        compressed = HELLO_COMPRESS if codec is not None else 0  # Tells the client its offer was taken
+        if kind == HELLO_RESUME and self.tickets is not None:
+            resumed = self.tickets.redeem(hello)
+            if resumed is not None:
+                serverNonce, sessionKey, expiry = resumed
+                send_frame(client, bytes([HELLO_RESUME | compressed]) + serverNonce)
+                return sessionKey, expiry, codec
+
+        key = self.serverKey  # The key this handshake uses even if another thread rotates it
+        send_frame(client, bytes([HELLO_KEM | compressed]) + key.pk)
+        if self.key_pool is not None and next(self.handshakes) % self.rotate_key_every == 0:
+            self.rotate_server_key()
+        ciphertext = reader.recv_frame()
+        if ciphertext is None or len(ciphertext) != ciphertextSize(self.params):
+            raise ValueError("Client hung up or sent a malformed Kyber ciphertext")  # Before it reaches a batch
+        if self.handshake_pool is not None:
+            sharedKey = self.handshake_pool.decapsulate(ciphertext)
+        elif self.handshake_batcher is not None:
+            sharedKey = self.handshake_batcher.submit(ciphertext).result()
+        else:
+            sharedKey = decapsulate(ciphertext, key, self.params)
+        return sharedKey, None, codec
+
+    # Switch to the next pre-generated key pair; keeps the current one if the pool has run dry
+    def rotate_server_key(self):
+        fresh = self.key_pool.take()
+        if fresh is None:
+            print("Server key pool is empty; keeping the current key")
+            return
+        self.serverPublicKey, self.serverPrivateKey, self.serverKey = fresh
 
-        print(f"{username} has left the chat.")
-        self.broadcast_message(f"{username} has left the chat.")
+    # Handshake latency and queue depth of the process pool, if enabled
+    def handshake_stats(self):
+        if self.handshake_pool is None:
+            return None
+        return self.handshake_pool.stats()
+
+    # Counters and histograms so far plus current gauges; only available with metrics enabled
+    def metrics_snapshot(self):
+        snapshot = self.metrics.snapshot()
         with self.clients_lock:
-            if client in self.clients:
-                self.clients.remove(client)
-                del self.client_keys[client]  # Remove the shared key
-        client.close()
-
-    def key_exchange(self, client):
-        client.sendall(self.serverPublicKey)
-        ciphertext = client.recv(4096)
-        sharedKey = decapsulate(ciphertext, self.serverPrivateKey, self.params)
-        return sharedKey
-    
-    def start(self):
-        print(f"Server is listening on {self.host}:{self.port}...")
+            queues = [(self.transfers.usernames[client], queue) for client, queue in self.outbound.items()]
+        snapshot["gauges"] = queue_gauges([queue for _, queue in queues])
+        snapshot["client_queues"] = client_queue_gauges(queues)
+        snapshot["gauges"]["rooms"] = len(self.rooms.members)
+        if self.key_pool is not None:
+            snapshot["gauges"]["key_pool_available"] = self.key_pool.available()
+        snapshot["handshake_pool"] = self.handshake_stats()
+        snapshot["kem_stages"] = stageTimings()  # In-process handshakes only; workers time their own
+        return snapshot
+
+    # Deliver broadcasts published by the other workers to this worker's clients in the same room
+    def relay_bus(self):
         while True:
-            client, addr = self.server.accept()
-            with self.clients_lock:
-                self.clients.append(client)
-            thread = threading.Thread(target=self.handle_client, args=(client, addr))
+            try:
+                received = self.bus.receive()
+            except OSError:
+                received = None
+            if received is None:
+                lost_bus(self.shutdown)
+            room, message = received
+            self.broadcast_message(message, room=room, relay=False)
+
+    def start(self):
+        if self.metrics is not None:
+            start_reporting(self.metrics_snapshot, self.metrics_port, self.metrics_interval)
+        if self.bus_path is not None:
+            self.bus = BusLink(self.bus_path)
+            thread = threading.Thread(target=self.relay_bus, daemon=True)
             thread.start()
+        # Listen only now, so no connection waits while the constructor starts handshake workers
+        self.server.listen(self.backlog)  # Room for bursts of connects while accept() threads are busy
+        print(f"Server is listening on {self.host}:{self.port}...")
+        try:
+            while True:
+                client, addr = self.server.accept()
+                # A daemon, so clients still connected never keep a stopped server running
+                thread = threading.Thread(target=self.handle_client, args=(client, addr), daemon=True)
+                thread.start()
+        finally:
+            self.shutdown()
+
+    # Stop accepting and stop the handshake worker processes, so none are left behind
+    def shutdown(self):
+        self.server.close()
+        if self.handshake_pool is not None:
+            self.handshake_pool.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encrypted chat server")
+    parser.add_argument("--host", default="192.168.20.29")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--engine", choices=["threaded", "async"], default="threaded",
+                        help="thread-per-client Server or single-threaded asyncio AsyncServer")
+    parser.add_argument("--handshake-workers", type=int, default=0,
+                        help="decapsulate in this many worker processes (0 to disable)")
+    parser.add_argument("--batch-handshakes", action="store_true",
+                        help="decapsulate concurrent handshakes together on one thread")
+    parser.add_argument("--group-key", action="store_true",
+                        help="encrypt each broadcast once under a rotating room key")
+    parser.add_argument("--max-queue", type=int, default=1024,
+                        help="outbound records buffered per client before the slow client policy applies")
+    parser.add_argument("--max-queue-bytes", type=int, default=MAX_QUEUE_BYTES,
+                        help="outbound bytes buffered per client before the slow client policy applies")
+    parser.add_argument("--slow-client-policy", choices=POLICIES, default=DROP_OLDEST)
+    parser.add_argument("--key-file",
+                        help="load the server key pair from this file, creating it on first start")
+    parser.add_argument("--rotate-key-every", type=int, default=0,
+                        help="switch to a pre-generated server key every N handshakes (0 to disable)")
+    parser.add_argument("--key-pool", type=int, default=4,
+                        help="server key pairs generated ahead of time when rotating")
+    parser.add_argument("--coalesce-ms", type=float, default=0,
+                        help="hold each client's outbound records this long and send them together (0 to disable)")
+    parser.add_argument("--coalesce-bytes", type=int, default=COALESCE_BYTES,
+                        help="send a client's batch early once this many bytes are queued")
+    parser.add_argument("--ticket-lifetime", type=int, default=3600,
+                        help="seconds after a full handshake that clients may resume without one (0 to disable)")
+    parser.add_argument("--ticket-cache", type=int, default=10000,
+                        help="redeemed tickets remembered to refuse replays")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve metrics as JSON on http://127.0.0.1:PORT/")
+    parser.add_argument("--metrics-interval", type=float, default=0,
+                        help="print metrics as a JSON line every this many seconds (0 to disable)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="server processes sharing the port, relaying broadcasts to each other")
+    parser.add_argument("--history-dir",
+                        help="log every room's messages in this directory and replay them to clients entering it")
+    parser.add_argument("--history-messages", type=int, default=100,
+                        help="most earlier messages replayed to a client entering a room")
+    parser.add_argument("--history-minutes", type=float, default=0,
+                        help="only replay messages sent this many minutes back (0 for no limit)")
+    parser.add_argument("--compress", action="store_true",
+                        help="deflate chat with the built-in dictionary for clients that offer it")
+    parser.add_argument("--compress-dictionary",
+                        help="deflate chat with this dictionary, e.g. one trained by compression.py")
+    parser.add_argument("--backend", choices=["python", "numpy"], default="python",
+                        help="polynomial arithmetic for Kyber (numpy needs NumPy installed)")
+    args = parser.parse_args()
+
+    options = dict(handshake_workers=args.handshake_workers, batch_handshakes=args.batch_handshakes,
+                   group_key=args.group_key, max_queue=args.max_queue, max_queue_bytes=args.max_queue_bytes,
+                   slow_client_policy=args.slow_client_policy, key_file=args.key_file,
+                   rotate_key_every=args.rotate_key_every, key_pool=args.key_pool,
+                   coalesce_window=args.coalesce_ms / 1000, coalesce_bytes=args.coalesce_bytes,
+                   ticket_lifetime=args.ticket_lifetime, ticket_cache=args.ticket_cache,
+                   metrics_port=args.metrics_port, metrics_interval=args.metrics_interval,
+                   history_dir=args.history_dir, history_messages=args.history_messages,
+                   history_age=args.history_minutes * 60, compress=args.compress,
+                   compress_dictionary=args.compress_dictionary, backend=args.backend)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # Unwind through start(), which stops handshake workers
+    if args.workers > 1:
+        from sharding import run_sharded
+        run_sharded(args.workers, args.engine, args.host, args.port, **options)
+        sys.exit()
 
-server=Server()
-server.start()
\ No newline at end of file
+    if args.engine == "async":
+        from async_server import AsyncServer
+        server = AsyncServer(args.host, args.port, **options)
+    else:
+        server = Server(args.host, args.port, **options)
+    server.start()
\ No newline at end of file
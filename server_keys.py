@@ -0,0 +1,39 @@
+import os
+import queue
+import threading
+from Kyber_Toy_Implementation.kyberKEM import keygenKEM, prepareKey
+from Kyber_Toy_Implementation.keyStore import saveKeyPair, loadKeyPair
+
+# Load the server key pair from key_file, or generate one (and save it there if a path is given)
+def load_server_key(params, key_file=None):
+    if key_file is not None and os.path.exists(key_file):
+        return loadKeyPair(key_file, params)
+    publicKey, privateKey = keygenKEM(params)
+    key = prepareKey(params, publicKey, privateKey)
+    if key_file is not None:
+        saveKeyPair(key_file, params, publicKey, privateKey, key)
+    return publicKey, privateKey, key
+
+class KeyPool:
+    """Keeps a few prepared server key pairs generated ahead of time by a background thread."""
+
+    def __init__(self, params, size=4):
+        self.params = params
+        self.ready = queue.Queue(maxsize=size)
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+
+    # A fresh (publicKey, privateKey, key) triple, or None if none is ready yet; never blocks
+    def take(self):
+        try:
+            return self.ready.get_nowait()
+        except queue.Empty:
+            return None
+
+    def available(self):
+        return self.ready.qsize()
+
+    def run(self):
+        while True:
+            publicKey, privateKey = keygenKEM(self.params)
+            self.ready.put((publicKey, privateKey, prepareKey(self.params, publicKey, privateKey)))  # Waits while full
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+from framing import FrameReader, encode_frame
+from server_keys import load_server_key
+from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
+
+# Bus frames carry the room name, so each worker delivers a broadcast only to that room's members
+def encode_bus_message(room, message):
+    name = room.encode()
+    return bytes([len(name)]) + name + message
+
+def decode_bus_message(frame):
+    end = 1 + frame[0]
+    return frame[1:end].decode(), frame[end:]
+
+class BusHub:
+    """Relays every broadcast one worker publishes to all the other workers over Unix sockets."""
+
+    def __init__(self, path):
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.links = []
+        self.lock = threading.Lock()  # Guards links and keeps frames from interleaving
+
+    def start(self):
+        thread = threading.Thread(target=self.accept, daemon=True)
+        thread.start()
+
+    def accept(self):
+        while True:
+            link, _ = self.server.accept()
+            with self.lock:
+                self.links.append(link)
+            thread = threading.Thread(target=self.relay, args=(link,), daemon=True)
+            thread.start()
+
+    def relay(self, link):
+        reader = FrameReader(link)
+        while True:
+            try:
+                frame = reader.recv_frame()
+            except OSError:
+                frame = None
+            if frame is None:
+                break
+            data = encode_frame(frame)
+            with self.lock:
+                for other in self.links:
+                    if other is not link:
+                        try:
+                            other.sendall(data)  # Blocks while that worker is behind, which slows the publisher too
+                        except OSError:
+                            pass
+        with self.lock:
+            self.links.remove(link)
+        link.close()
+
+class BusLink:
+    """A blocking worker's connection to the hub."""
+
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.reader = FrameReader(self.sock)
+        self.lock = threading.Lock()
+
+    # Hand a broadcast (UTF-8 bytes) to the other workers; several client threads may publish at once
+    def publish(self, room, message):
+        with self.lock:
+            self.sock.sendall(encode_frame(encode_bus_message(room, message)))
+
+    # The next (room, broadcast) from another worker, or None once the hub is gone
+    def receive(self):
+        frame = self.reader.recv_frame()
+        return None if frame is None else decode_bus_message(frame)
+
+# Without the hub this worker's users would silently stop seeing everyone else, so the worker stops instead;
+# shutdown is the server's, so its handshake workers stop with it
+def lost_bus(shutdown):
+    print("Lost the connection to the broadcast bus; stopping this worker")
+    shutdown()
+    os._exit(1)
+
+def _run_worker(index, engine, host, port, bus_path, options):
+    # Unwind through the server's start(), which stops its handshake workers; client threads are daemons
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if options.get("metrics_port") is not None:
+        options["metrics_port"] += index  # One endpoint per worker
+    if options.get("history_dir") is not None:
+        # Every worker sees every broadcast over the bus, so each keeps a complete log of its own
+        options["history_dir"] = os.path.join(options["history_dir"], f"worker{index}")
+    if engine == "async":
+        from async_server import AsyncServer as serverClass
+    else:
+        from server import Server as serverClass
+    server = serverClass(host, port, reuse_port=True, bus_path=bus_path, **options)
+    server.start()
+
+def run_sharded(workers, engine, host, port, **options):
+    """Runs workers server processes on one port, joined by a broadcast bus, until terminated.
+
+    The kernel spreads incoming connections over the workers with SO_REUSEPORT. Every
+    worker serves the same Kyber key, from key_file or a temporary key file, and seals
+    tickets with the same key, so a client can reconnect and resume on any worker.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Sharding needs SO_REUSEPORT, which this platform does not have")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # Run the cleanup below when terminated
+    with tempfile.TemporaryDirectory(prefix="chat-bus-") as directory:
+        if options.get("key_file") is None:
+            options["key_file"] = os.path.join(directory, "server.key")
+        load_server_key(KYBER_PARAMS["kyber1024"], options["key_file"])  # Created once here, loaded by every worker
+        options["ticket_key"] = os.urandom(32)
+
+        bus_path = os.path.join(directory, "bus.sock")
+        hub = BusHub(bus_path)
+        # Start the workers before any hub thread, so nothing is mid-operation when they fork
+        processes = [multiprocessing.Process(target=_run_worker, args=(i, engine, host, port, bus_path, options))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        hub.start()
+        print(f"Started {workers} {engine} workers on {host}:{port}")
+        try:
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
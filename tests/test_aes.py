@@ -0,0 +1,24 @@
+import pytest
+from AES import CLIENT, SERVER, SessionCipher
+
+KEY = bytes(range(32))
+
+def test_seal_many_matches_seal_order():
+    sender, receiver = SessionCipher(KEY, SERVER), SessionCipher(KEY, CLIENT)
+    sealed = [sender.seal(b"first")] + sender.seal_many([b"second", b"third"]) + [sender.seal(b"fourth")]
+    assert [receiver.open(body) for body in sealed] == [b"first", b"second", b"third", b"fourth"]
+
+def test_seal_many_with_associated_data_per_message():
+    sender, receiver = SessionCipher(KEY, SERVER), SessionCipher(KEY, CLIENT)
+    sealed = sender.seal_many([b"raw", memoryview(b"packed")], [b"\x05", b"\x85"])
+    assert receiver.open(sealed[0], b"\x05") == b"raw"
+    with pytest.raises(ValueError):
+        receiver.open(sealed[1], b"\x05")
+    assert receiver.open(sealed[1], b"\x85") == b"packed"
+
+def test_open_rejects_replayed_records():
+    sender, receiver = SessionCipher(KEY, SERVER), SessionCipher(KEY, CLIENT)
+    first, second = sender.seal_many([b"a", b"b"])
+    receiver.open(second)
+    with pytest.raises(ValueError):
+        receiver.open(first)
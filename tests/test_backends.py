@@ -0,0 +1,52 @@
+import contextlib
+import random
+import types
+import pytest
+from Kyber_Toy_Implementation import kyberKEM, kyberPKE
+from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
+
+pytest.importorskip("numpy")
+
+# Select a backend and draw every random byte from seed until the block ends
+@contextlib.contextmanager
+def seeded(monkeypatch, backend, seed):
+    fakeOs = types.SimpleNamespace(urandom=random.Random(seed).randbytes)
+    monkeypatch.setattr(kyberKEM, "os", fakeOs)
+    monkeypatch.setattr(kyberPKE, "os", fakeOs)
+    previous = kyberPKE.getBackend()
+    kyberPKE.setBackend(backend)
+    try:
+        yield
+    finally:
+        kyberPKE.setBackend(previous)
+
+@pytest.mark.parametrize("name", KYBER_PARAMS)
+@pytest.mark.parametrize("seed", [0, 1])
+def test_kem_outputs_match_between_backends(monkeypatch, name, seed):
+    params = KYBER_PARAMS[name]
+    results = []
+    for backend in ("python", "numpy"):
+        with seeded(monkeypatch, backend, seed):
+            pk, sk = kyberKEM.keygenKEM(params)
+            c, sharedSecret = kyberKEM.encapsulate(pk, params)
+            prepared = kyberKEM.prepareKey(params, pk, sk)
+            results.append((pk, sk, c, sharedSecret, kyberKEM.decapsulate(c, sk, params),
+                            kyberKEM.decapsulate(c, prepared, params)))
+    assert results[0] == results[1]
+    _, _, _, sharedSecret, decapsulated, decapsulatedPrepared = results[0]
+    assert decapsulated == decapsulatedPrepared == sharedSecret
+
+@pytest.mark.parametrize("name", KYBER_PARAMS)
+def test_batches_match_between_backends(monkeypatch, name):
+    params = KYBER_PARAMS[name]
+    results = []
+    for backend in ("python", "numpy"):
+        with seeded(monkeypatch, backend, name):
+            keyPairs = kyberKEM.keygenKEMBatch(params, 2)
+            pk, sk = keyPairs[0]
+            encapsulated = kyberKEM.encapsulateBatch([pk, pk, keyPairs[1][0]], params)
+            decapsulated = kyberKEM.decapsulateBatch([c for c, _ in encapsulated[:2]], sk, params)
+            results.append((keyPairs, encapsulated, decapsulated))
+    assert results[0] == results[1]
+    _, encapsulated, decapsulated = results[0]
+    assert decapsulated == [sharedSecret for _, sharedSecret in encapsulated[:2]]
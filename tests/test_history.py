@@ -0,0 +1,18 @@
+from history import History
+
+def test_backlog_of_a_room_without_a_log(tmp_path):
+    assert History(str(tmp_path)).backlog("lobby") == ([], 0, 0)
+
+def test_backlog_from_a_position_keeps_the_limit(tmp_path):
+    history = History(str(tmp_path), messages=50)
+    for i in range(200):
+        history.append("lobby", f"m {i}".encode())
+    assert history.backlog("lobby")[1:] == (150, 200)
+    assert history.backlog("lobby", 0)[1:] == (150, 200)  # Read while the room had no log yet
+    assert history.backlog("lobby", 180)[1:] == (180, 200)
+
+def test_backlog_without_replay(tmp_path):
+    history = History(str(tmp_path), messages=0)
+    history.append("lobby", b"m")
+    chunks, first, end = history.backlog("lobby", 0)
+    assert (chunks, first, end) == ([], 1, 1)
@@ -0,0 +1,51 @@
+import pytest
+from Kyber_Toy_Implementation import poly
+from Kyber_Toy_Implementation.kyberParams import KYBER_PARAMS
+from Kyber_Toy_Implementation.optimization import (compress, compressPoly, decompress, decompressPoly, mods, roundQ,
+                                                   roundQPoly, roundUpTies)
+
+try:
+    from Kyber_Toy_Implementation import polyArray
+except ImportError:  # NumPy is not installed
+    polyArray = None
+
+Q = 3329
+DS = sorted({params[name] for params in KYBER_PARAMS.values() for name in ("du", "dv")} | {1})
+BACKENDS = [poly, pytest.param(polyArray, marks=pytest.mark.skipif(polyArray is None, reason="NumPy is not installed"))]
+
+# The float versions the integer ones replaced
+def floatCompress(x, q, d):
+    return roundUpTies((2**d / q) * x) % (2**d)
+
+def floatDecompress(y, q, d):
+    return roundUpTies((q / 2**d) * y) % q
+
+def floatRoundQ(value, q):
+    return 0 if -q / 4 < mods(value, q) < q / 4 else 1
+
+@pytest.mark.parametrize("d", DS)
+def test_compress_matches_float(d):
+    for x in range(Q):
+        assert compress(x, Q, d) == floatCompress(x, Q, d), x
+
+@pytest.mark.parametrize("d", DS)
+def test_decompress_matches_float(d):
+    for y in range(2**d):
+        assert decompress(y, Q, d) == floatDecompress(y, Q, d), y
+
+def test_round_q_matches_float():
+    for x in range(Q):
+        assert roundQ(x, Q) == floatRoundQ(x, Q), x
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("d", DS)
+def test_poly_versions_match_float(backend, d):
+    values = backend.Polynomial(list(range(Q)), Q)
+    compressed = compressPoly(values, Q, d)
+    assert [int(c) % 2**d for c in compressed.coefficients] == [floatCompress(x, Q, d) for x in range(Q)]
+    decompressed = decompressPoly(backend.Polynomial(list(range(2**d)), 2**d), Q, d)
+    assert [int(c) % Q for c in decompressed.coefficients] == [floatDecompress(y, Q, d) for y in range(2**d)]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_round_q_poly_matches_float(backend):
+    assert roundQPoly(backend.Polynomial(list(range(Q)), Q), Q) == [floatRoundQ(x, Q) for x in range(Q)]
@@ -0,0 +1,382 @@
+import hashlib
+import itertools
+import os
+import struct
+
+CHUNK_SIZE = 64 * 1024  # File bytes per chunk message
+WINDOW = 1024 * 1024  # Bytes a recipient lets a sender have in flight; credit goes back a quarter of this at a time
+MAX_WINDOW = 8 * 1024 * 1024  # Most credit the relay lets a recipient grant, which bounds what it queues per transfer
+MAX_TRANSFERS = 16  # Transfers one session may be sending at once
+READ_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+
+# Every file transfer message, sealed in a MSG_FILE record, starts with one of these and the transfer id.
+# Offers and chunks flow from sender to recipient, accepts and credit back; either end may stop the transfer
+FILE_OFFER = 0   # Size, SHA-256, a username and the file name; the sender names the recipient, the relay the sender
+FILE_ACCEPT = 1  # Offset to start from, i.e. what the recipient already has, and the first credit in bytes
+FILE_CREDIT = 2  # More bytes the sender may send
+FILE_CHUNK = 3   # Offset of the file data that follows
+FILE_CLOSE = 4   # Recipient: why it stopped, in UTF-8; empty once it has the whole file and its SHA-256 matched
+FILE_CANCEL = 5  # Sender: why it stopped, in UTF-8
+
+PREFIX = struct.Struct("!BI")
+OFFER = struct.Struct("!BIQ32sH")  # Then the username, of the length given, and the file name
+ACCEPT = struct.Struct("!BIQI")
+CREDIT = struct.Struct("!BII")
+CHUNK = struct.Struct("!BIQ")
+
+def encode_offer(transfer_id, size, digest, username, name):
+    username = username.encode()
+    return OFFER.pack(FILE_OFFER, transfer_id, size, digest, len(username)) + username + name.encode()
+
+def encode_accept(transfer_id, offset, credit):
+    return ACCEPT.pack(FILE_ACCEPT, transfer_id, offset, credit)
+
+def encode_credit(transfer_id, credit):
+    return CREDIT.pack(FILE_CREDIT, transfer_id, credit)
+
+# One copy of the data; a memoryview of a received chunk works as well as bytes
+def encode_chunk(transfer_id, offset, data):
+    return CHUNK.pack(FILE_CHUNK, transfer_id, offset) + data
+
+def encode_close(transfer_id, reason=""):
+    return PREFIX.pack(FILE_CLOSE, transfer_id) + reason.encode()
+
+def encode_cancel(transfer_id, reason):
+    return PREFIX.pack(FILE_CANCEL, transfer_id) + reason.encode()
+
+def parse(data):
+    """Splits a file transfer message into its type, transfer id and fields.
+
+    Returns:
+        tuple: (type, transfer id, fields). The fields are (size, digest, username, name) for an
+        offer, (offset, credit) for an accept, (credit,) for credit, (offset, data) for a chunk,
+        with data a memoryview, and (reason,) for a close or cancel.
+
+    Raises:
+        ValueError: If the message is malformed or of an unknown type.
+    """
+    try:
+        kind, transfer_id = PREFIX.unpack_from(data)
+        if kind == FILE_OFFER:
+            size, digest, length = OFFER.unpack_from(data)[2:]
+            end = OFFER.size + length
+            fields = (size, digest, bytes(data[OFFER.size:end]).decode(), bytes(data[end:]).decode())
+        elif kind == FILE_ACCEPT:
+            fields = ACCEPT.unpack_from(data)[2:]
+        elif kind == FILE_CREDIT:
+            fields = CREDIT.unpack_from(data)[2:]
+        elif kind == FILE_CHUNK:
+            fields = (CHUNK.unpack_from(data)[2], memoryview(data)[CHUNK.size:])
+        elif kind in (FILE_CLOSE, FILE_CANCEL):
+            fields = (bytes(data[PREFIX.size:]).decode(),)
+        else:
+            raise ValueError(f"Unknown file transfer message type {kind}")
+    except struct.error as e:
+        raise ValueError(f"Malformed file transfer message: {e}") from None
+    return kind, transfer_id, fields
+
+# The username and path a chat line asks to send a file to: "/send NAME PATH"; None for anything else
+def file_command(message):
+    if not message.startswith("/send "):
+        return None
+    parts = message[len("/send "):].strip().split(" ", 1)
+    if len(parts) < 2 or not parts[1].strip():
+        return None
+    return parts[0], parts[1].strip()
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while data := f.read(READ_SIZE):
+            digest.update(data)
+    return digest.digest()
+
+def format_size(size):
+    for unit in ("bytes", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+# A file name from another user made safe to save: no directories, hidden names or NULs
+def _safe_name(name):
+    name = os.path.basename(name.replace("\\", "/").replace("\0", "")).strip().lstrip(".")
+    return name or "file"
+
+# name in directory, or "stem (n).ext" for the first n that is free
+def _free_path(directory, name):
+    stem, extension = os.path.splitext(name)
+    path = os.path.join(directory, name)
+    for n in itertools.count(1):
+        if not os.path.exists(path):
+            return path
+        path = os.path.join(directory, f"{stem} ({n}){extension}")
+
+class OutgoingFile:
+    """Sender side of one transfer: reads the file a chunk at a time as the recipient grants credit."""
+
+    def __init__(self, transfer_id, path, digest, recipient):
+        self.id = transfer_id
+        self.name = os.path.basename(path)
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.digest = digest
+        self.recipient = recipient
+        self.offset = 0
+        self.credit = 0
+        self.result = None  # Why the transfer ended; "" once the recipient verified the whole file
+
+    def offer(self):
+        return encode_offer(self.id, self.size, self.digest, self.recipient, self.name)
+
+    # Start from offset, where an earlier attempt left off if the recipient kept it
+    def accept(self, offset, credit):
+        self.offset = min(offset, self.size)
+        self.credit = credit
+
+    # Chunk messages for as much of the file as the credit allows, read only as each is taken.
+    # Raises OSError if the file cannot be read; fail() then gives the cancel to send
+    def chunks(self):
+        while self.credit > 0 and self.offset < self.size and self.result is None:
+            if self.file.tell() != self.offset:
+                self.file.seek(self.offset)
+            data = self.file.read(min(CHUNK_SIZE, self.credit, self.size - self.offset))
+            if not data:
+                self.close("The file got shorter while it was being sent")
+                yield encode_cancel(self.id, self.result)
+                return
+            yield encode_chunk(self.id, self.offset, data)
+            self.offset += len(data)
+            self.credit -= len(data)
+
+    def close(self, reason):
+        self.result = reason
+        self.file.close()
+
+    # End the transfer after a local error, e.g. the file was deleted; returns the cancel to send
+    def fail(self, error):
+        self.close(f"Could not read the file: {error.strerror or error}")
+        return encode_cancel(self.id, self.result)
+
+    def summary(self):
+        if self.result is None:
+            return f"Offering {self.name} ({format_size(self.size)}) to {self.recipient}"
+        if self.result:
+            return f"Sending {self.name} to {self.recipient} failed: {self.result}"
+        return f"Sent {self.name} to {self.recipient}"
+
+class IncomingFile:
+    """Recipient side of one transfer: appends chunks to a partial file and checks the SHA-256 at the end.
+
+    The partial file is named after the SHA-256 and kept if the transfer breaks off, so
+    when the same file is offered again it resumes from what was already written.
+    """
+
+    def __init__(self, transfer_id, directory, size, digest, sender, name, window=WINDOW):
+        self.id = transfer_id
+        self.directory = directory
+        self.size = size
+        self.digest = digest
+        self.sender = sender
+        self.name = _safe_name(name)
+        self.window = window
+        self.part_path = os.path.join(directory, digest.hex() + PART_SUFFIX)
+        self.path = None  # Where the file was saved, once verified
+        self.hash = hashlib.sha256()
+        self.file = open(self.part_path, "ab+")
+        # Hash what an earlier attempt wrote, so the running hash covers the whole file at the end
+        if self.file.tell() > size:
+            self.file.truncate(0)
+        self.file.seek(0)
+        while data := self.file.read(READ_SIZE):
+            self.hash.update(data)
+        self.offset = self.resumed_from = self.file.tell()
+        self.unacknowledged = 0
+        self.result = None  # Why the transfer ended; "" once the file was verified and saved
+
+    # The reply to the offer: where to start, or the close if an earlier attempt already got the whole file.
+    # Like write(), raises OSError if the file cannot be written or saved; fail() then gives the close to send
+    def start(self):
+        if self.offset == self.size:
+            return self._complete()
+        return encode_accept(self.id, self.offset, self.window)
+
+    # Append a chunk; returns credit or the close to send back, or None
+    def write(self, offset, data):
+        if offset != self.offset or offset + len(data) > self.size:
+            # A chunk went missing, e.g. dropped from a full queue; what was written so far is kept for a resend
+            return self._finish("Part of the file went missing; send it again to resume")
+        self.file.write(data)
+        self.hash.update(data)
+        self.offset += len(data)
+        if self.offset == self.size:
+            return self._complete()
+        self.unacknowledged += len(data)
+        if self.unacknowledged < self.window // 4:
+            return None
+        credit, self.unacknowledged = self.unacknowledged, 0
+        return encode_credit(self.id, credit)
+
+    # The sender stopped; the partial file stays for a resend
+    def cancel(self, reason):
+        self.result = reason or "Cancelled"
+        self.file.close()
+
+    def _complete(self):
+        self.file.close()
+        if self.hash.digest() != self.digest:
+            os.remove(self.part_path)
+            return self._finish("SHA-256 mismatch; the file was discarded")
+        self.path = _free_path(self.directory, self.name)
+        os.replace(self.part_path, self.path)
+        return self._finish("")
+
+    # End the transfer after a local error, e.g. a full disk; what reached the partial file stays for a resend
+    def fail(self, error):
+        try:
+            self.file.close()
+        except OSError:
+            pass  # Flushing the last write failed the same way
+        return self._finish(f"Could not save the file: {error.strerror or error}")
+
+    def _finish(self, reason):
+        self.result = reason
+        self.file.close()
+        return encode_close(self.id, reason)
+
+    def summary(self):
+        if self.result is None:
+            resuming = f", resuming at {format_size(self.offset)}" if self.resumed_from else ""
+            return f"{self.sender} is sending {self.name} ({format_size(self.size)}{resuming})"
+        if self.result:
+            return f"Receiving {self.name} from {self.sender} failed: {self.result}"
+        return f"Saved {self.name} from {self.sender} as {self.path}"
+
+class _Route:
+    """What the relay keeps of one transfer: who is at each end and how far the sender may go."""
+
+    __slots__ = ("sender", "sender_id", "recipient", "recipient_id", "size", "accepted", "offset", "credit")
+
+    def __init__(self, sender, sender_id, recipient, recipient_id, size):
+        self.sender = sender
+        self.sender_id = sender_id
+        self.recipient = recipient
+        self.recipient_id = recipient_id
+        self.size = size
+        self.accepted = False
+        self.offset = 0
+        self.credit = 0
+
+class TransferRelay:
+    """Server side: routes file transfers between sessions by username, a message at a time.
+
+    The relay keeps a few numbers per transfer and never file data. It checks that every
+    chunk follows the last and fits in the credit the recipient granted, so however large
+    the file, at most MAX_WINDOW bytes of a transfer are queued on the server. Sessions are
+    keyed by any hashable handle, such as a socket or stream writer.
+    """
+
+    def __init__(self):
+        self.sessions = {}  # Username -> the session that joined under it last
+        self.usernames = {}  # Session -> username
+        self.sending = {}  # Session -> {transfer id it chose -> _Route}
+        self.receiving = {}  # Session -> {transfer id the relay gave it -> _Route}
+        self.ids = itertools.count(1)
+
+    def join(self, session, username):
+        self.sessions[username] = session
+        self.usernames[session] = username
+        self.sending[session] = {}
+        self.receiving[session] = {}
+
+    # Forget a session; returns (session, message) pairs telling the other ends of its transfers
+    def leave(self, session):
+        username = self.usernames.pop(session, None)
+        if username is None:
+            return []
+        if self.sessions.get(username) is session:
+            del self.sessions[username]
+        reason = f"{username} disconnected"
+        messages = []
+        for route in self.sending.pop(session).values():
+            del self.receiving[route.recipient][route.recipient_id]
+            messages.append((route.recipient, encode_cancel(route.recipient_id, reason)))
+        for route in self.receiving.pop(session).values():
+            del self.sending[route.sender][route.sender_id]
+            messages.append((route.sender, encode_close(route.sender_id, reason)))
+        return messages
+
+    def route(self, session, data):
+        """Checks a file transfer message from a session and works out what to pass on.
+
+        Args:
+            session: The session the message came from.
+            data (bytes): The opened message.
+
+        Returns:
+            list: (session, message) pairs to seal and send, in order.
+
+        Raises:
+            ValueError: If the message is malformed.
+        """
+        kind, transfer_id, fields = parse(data)
+        if kind == FILE_OFFER:
+            return self._offer(session, transfer_id, *fields)
+        routes = self.sending if kind in (FILE_CHUNK, FILE_CANCEL) else self.receiving
+        route = routes[session].get(transfer_id)
+        if route is None:
+            return []  # Already over, e.g. chunks still in flight when the recipient closed
+        if kind == FILE_CHUNK:
+            offset, chunk = fields
+            if offset != route.offset or len(chunk) > route.credit or offset + len(chunk) > route.size:
+                return self._end(route, "The sender went past its credit")
+            route.offset += len(chunk)
+            route.credit -= len(chunk)
+            return [(route.recipient, encode_chunk(route.recipient_id, offset, chunk))]
+        if kind == FILE_ACCEPT:
+            offset, credit = fields
+            if route.accepted or offset > route.size or credit > MAX_WINDOW:
+                return self._end(route, "The recipient sent a bad accept")
+            route.accepted = True
+            route.offset = offset
+            route.credit = credit
+            return [(route.sender, encode_accept(route.sender_id, offset, credit))]
+        if kind == FILE_CREDIT:
+            (credit,) = fields
+            if not route.accepted or route.credit + credit > MAX_WINDOW:
+                return self._end(route, "The recipient granted too much credit")
+            route.credit += credit
+            return [(route.sender, encode_credit(route.sender_id, credit))]
+        self._forget(route)
+        if kind == FILE_CLOSE:
+            return [(route.sender, encode_close(route.sender_id, *fields))]
+        return [(route.recipient, encode_cancel(route.recipient_id, *fields))]
+
+    def _offer(self, session, transfer_id, size, digest, username, name):
+        recipient = self.sessions.get(username)
+        if recipient is None or recipient is session:
+            reason = f"No other user named {username} is connected to this server"
+        elif transfer_id in self.sending[session]:
+            reason = "Transfer id already in use"
+        elif len(self.sending[session]) >= MAX_TRANSFERS:
+            reason = f"At most {MAX_TRANSFERS} files can be sent at once"
+        else:
+            reason = None
+        if reason is not None:
+            return [(session, encode_close(transfer_id, reason))]
+        recipient_id = next(self.ids) % 2**32
+        route = _Route(session, transfer_id, recipient, recipient_id, size)
+        self.sending[session][transfer_id] = route
+        self.receiving[recipient][recipient_id] = route
+        return [(recipient, encode_offer(recipient_id, size, digest, self.usernames[session], name))]
+
+    def _forget(self, route):
+        del self.sending[route.sender][route.sender_id]
+        del self.receiving[route.recipient][route.recipient_id]
+
+    # Stop a transfer that broke the rules, telling both ends
+    def _end(self, route, reason):
+        self._forget(route)
+        return [(route.sender, encode_close(route.sender_id, reason)),
+                (route.recipient, encode_cancel(route.recipient_id, reason))]